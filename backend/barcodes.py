@@ -0,0 +1,167 @@
+"""
+Scan code -> product resolution for /api/product/barcode.
+
+A scanned value is reduced to candidate codes (the decoded input plus the code
+embedded in a printed QR URL) and looked up in the catalog snapshot's code map.
+Codes the snapshot does not know are checked once against the product_codes table
+(primary-key lookup, kept current by triggers): a hit means the snapshot is behind
+and triggers a catalog refresh, a miss is remembered for BARCODE_NEGATIVE_TTL
+seconds so repeated scans of unknown codes never reach the database.
+"""
+from collections import OrderedDict
+from contextlib import closing
+import threading
+import time
+from typing import List
+from urllib.parse import parse_qs, unquote, urlparse
+
+from catalog import catalog_index
+from config import barcode_negative_ttl
+from db import get_db_connection
+
+# Upper bound on remembered unknown codes (oldest are dropped first)
+NEGATIVE_CACHE_SIZE = 10000
+
+
+def barcode_search_values(barcode: str) -> List[str]:
+    """
+    Candidate codes for a scanned barcode: the URL-decoded input plus codes embedded
+    in printed QR URLs (query value or last path segment). Duplicates/empties removed.
+    """
+    # Decode URL-encoded barcode
+    decoded_barcode = unquote(barcode)
+
+    # If barcode looks like a URL, try to extract the actual code
+    # Handle formats like: http://65.1.12.120/qr?xF2kd3A84m or http://65.1.12.120/qr?code=xF2kd3A84m
+    search_barcodes = [decoded_barcode]
+
+    if 'http://' in decoded_barcode or 'https://' in decoded_barcode:
+        try:
+            parsed = urlparse(decoded_barcode)
+            # Extract from query parameters
+            if parsed.query:
+                params = parse_qs(parsed.query)
+                # If query has no '=' (no key-value pairs), use the query string itself
+                if '=' not in parsed.query:
+                    search_barcodes.append(parsed.query)
+                else:
+                    # Try common parameter names
+                    for param_name in ['code', 'id', 'qr', 'barcode']:
+                        if param_name in params and params[param_name]:
+                            search_barcodes.append(params[param_name][0])
+                    # If no named params, get first value
+                    if not any('code' in str(k).lower() or 'id' in str(k).lower() or 'qr' in str(k).lower() for k in params.keys()):
+                        for values in params.values():
+                            if values:
+                                search_barcodes.append(values[0])
+                                break
+            # Extract from path (e.g., /qr/xF2kd3A84m)
+            if parsed.path and len(parsed.path) > 1:
+                path_parts = [p for p in parsed.path.split('/') if p]
+                if path_parts:
+                    search_barcodes.append(path_parts[-1])
+        except Exception as e:
+            print(f"Warning: Could not parse URL from barcode: {e}")
+
+    # Remove duplicates and empty strings
+    search_barcodes = list(dict.fromkeys([b for b in search_barcodes if b and b.strip()]))
+    return search_barcodes
+
+
+class CodeResolver:
+    def __init__(self, index, negative_ttl: float = None):
+        self._index = index
+        self._negative_ttl = negative_ttl
+        # raw scanned value -> (catalog version, expires_at)
+        self._unknown = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "db_lookups": 0, "misses": 0}
+
+    @property
+    def negative_ttl(self) -> float:
+        if self._negative_ttl is None:
+            self._negative_ttl = barcode_negative_ttl()
+        return self._negative_ttl
+
+    def resolve(self, barcode: str, codes: List[str] = None):
+        """CatalogEntry for a scanned value, or None if no active product has the code."""
+        snapshot = self._index.snapshot()
+        entry = snapshot.by_code.get(barcode)
+        if entry is None:
+            codes = codes if codes is not None else barcode_search_values(barcode)
+            entry = snapshot.find_by_code(codes)
+        if entry is not None:
+            self._count("hits")
+            return entry
+
+        if self._is_known_unknown(barcode, snapshot.version):
+            return None
+
+        product_id = self._lookup(codes)
+        if product_id is not None:
+            # The code exists but the snapshot predates it
+            self._index.invalidate()
+            snapshot = self._index.refresh()
+            entry = snapshot.get(product_id)
+            if entry is not None:
+                self._count("hits")
+                return entry
+
+        self._count("misses")
+        self._remember_unknown(barcode, snapshot.version)
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._unknown.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            status = dict(self._stats)
+            status["unknown_codes"] = len(self._unknown)
+        status["negative_ttl"] = self.negative_ttl
+        return status
+
+    def _count(self, stat: str):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _lookup(self, codes: List[str]):
+        """product_id for the first of the codes present in product_codes."""
+        self._count("db_lookups")
+        with closing(get_db_connection()) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT code, product_id FROM product_codes WHERE code = ANY(%s)",
+                    (list(codes),),
+                )
+                found = dict(cursor.fetchall())
+        for code in codes:
+            if code in found:
+                return found[code]
+        return None
+
+    def _is_known_unknown(self, barcode: str, version: int) -> bool:
+        with self._lock:
+            cached = self._unknown.get(barcode)
+            if cached is None:
+                return False
+            cached_version, expires_at = cached
+            if cached_version == version and time.monotonic() < expires_at:
+                self._stats["negative_hits"] += 1
+                return True
+            # A newer catalog may know the code now
+            del self._unknown[barcode]
+            return False
+
+    def _remember_unknown(self, barcode: str, version: int):
+        if self.negative_ttl <= 0:
+            return
+        with self._lock:
+            self._unknown[barcode] = (version, time.monotonic() + self.negative_ttl)
+            self._unknown.move_to_end(barcode)
+            while len(self._unknown) > NEGATIVE_CACHE_SIZE:
+                self._unknown.popitem(last=False)
+
+
+code_resolver = CodeResolver(catalog_index)
@@ -0,0 +1,97 @@
+"""
+Benchmark for writing challan line items.
+
+Compares the old per-row INSERT ... RETURNING loop with insert_challan_items
+(one unnest-based INSERT) for challans of 10, 100 and 1000 items. Everything runs
+inside a transaction that is rolled back, so no data is left behind.
+
+Usage:
+    python bench_challan_items.py --sizes 10 100 1000 --repeat 5
+"""
+import argparse
+import time
+
+import psycopg  # type: ignore
+from psycopg.rows import dict_row  # type: ignore
+
+from config import get_db_connection_params
+from main import insert_challan_items
+
+_ROW_INSERT_SQL = """
+    INSERT INTO challan_items (
+        challan_id, product_id, product_name, size_id, size_text,
+        quantity, unit_price, total_price, qr_code, unit, gst
+    )
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING *
+"""
+
+
+def insert_row_by_row(cursor, challan_id, prepared_items):
+    rows = []
+    for p in prepared_items:
+        cursor.execute(_ROW_INSERT_SQL, (
+            challan_id, p["product_id"], p["product_name"], p["size_id"], p["size_text"],
+            p["quantity"], p["unit_price"], p["total_price"], p["qr_code"], p["unit"], p["gst"],
+        ))
+        rows.append(cursor.fetchone())
+    return rows
+
+
+def make_items(count):
+    return [
+        {
+            "product_id": None,
+            "product_name": f"Bench product {i}",
+            "size_id": None,
+            "size_text": "2.4",
+            "quantity": 2.0,
+            "unit_price": 150.0,
+            "total_price": 300.0,
+            "qr_code": None,
+            "unit": "piece",
+            "gst": 9,
+        }
+        for i in range(count)
+    ]
+
+
+def time_insert(conn, insert, items, repeat):
+    best = None
+    for _ in range(repeat):
+        with conn.cursor(row_factory=dict_row) as cursor:
+            cursor.execute("""
+                INSERT INTO challans (challan_number, party_name, station_name, status)
+                VALUES ('BENCH-ITEMS', 'BENCH', 'BENCH', 'draft')
+                RETURNING id
+            """)
+            challan_id = cursor.fetchone()["id"]
+            started = time.perf_counter()
+            rows = insert(cursor, challan_id, items)
+            elapsed = time.perf_counter() - started
+        conn.rollback()
+        assert [r["product_name"] for r in rows] == [p["product_name"] for p in items]
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark challan item inserts")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = psycopg.connect(**get_db_connection_params())
+    try:
+        print(f"{'items':>6} {'row-by-row ms':>14} {'bulk ms':>10} {'speedup':>8}")
+        for size in args.sizes:
+            items = make_items(size)
+            legacy = time_insert(conn, insert_row_by_row, items, args.repeat)
+            bulk = time_insert(conn, insert_challan_items, items, args.repeat)
+            print(f"{size:>6} {legacy * 1000:>14.1f} {bulk * 1000:>10.1f} {legacy / bulk:>7.1f}x")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Concurrency benchmark for challan creation / number allocation.
+
+Each worker thread uses its own connection and repeatedly creates a challan the way
+create_challan does (generate_challan_number + INSERT + COMMIT) for a fixed duration.
+Reports creates/sec and checks that no DC number was handed out twice.
+Benchmark rows use a dedicated party name and station and are deleted at the end,
+together with what the challan triggers derived from them (dictionary values, the
+stored party profile).
+
+Usage:
+    python bench_challan_numbers.py --workers 8 --seconds 10
+"""
+import argparse
+import threading
+import time
+
+import psycopg  # type: ignore
+from psycopg.rows import dict_row  # type: ignore
+
+from config import get_db_connection_params
+from main import generate_challan_number
+
+BENCH_PARTY = "ZZ BENCHMARK PARTY"
+BENCH_STATION = "ZZ BENCHMARK STATION"
+
+# Dictionary values (migrations/0015, 0019) the benchmark challans added, unless real
+# challans or orders use them as well
+_CLEANUP_OPTIONS_SQL = """
+    DELETE FROM challan_option_values v
+    WHERE (v.kind, v.value_key) IN (
+        ('party_names', challan_option_key('party_names', %(party)s)),
+        ('station_names', challan_option_key('station_names', %(station)s))
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM challans c
+        WHERE challan_option_key('party_names', c.party_name) = v.value_key AND v.kind = 'party_names'
+           OR challan_option_key('station_names', c.station_name) = v.value_key AND v.kind = 'station_names'
+    )
+    AND NOT EXISTS (
+        SELECT 1 FROM orders o
+        WHERE challan_option_key('party_names', o.party_name) = v.value_key AND v.kind = 'party_names'
+           OR challan_option_key('station_names', o.station) = v.value_key AND v.kind = 'station_names'
+    )
+"""
+
+
+def _worker(deadline, results, index):
+    conn = psycopg.connect(**get_db_connection_params())
+    created = []
+    errors = 0
+    try:
+        with conn.cursor(row_factory=dict_row) as cursor:
+            while time.perf_counter() < deadline:
+                try:
+                    number = generate_challan_number(cursor, BENCH_PARTY)
+                    cursor.execute("""
+                        INSERT INTO challans (challan_number, party_name, station_name, status)
+                        VALUES (%s, %s, %s, 'draft')
+                    """, (number, BENCH_PARTY, BENCH_STATION))
+                    conn.commit()
+                    created.append(number)
+                except Exception as e:
+                    conn.rollback()
+                    errors += 1
+                    print(f"Worker {index}: {e}")
+    finally:
+        conn.close()
+    results[index] = (created, errors)
+
+
+def run(workers: int, seconds: float):
+    results = [None] * workers
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=_worker, args=(deadline, results, i))
+        for i in range(workers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    numbers = [n for created, _errors in results for n in created]
+    errors = sum(e for _created, e in results)
+    print(f"workers={workers} duration={elapsed:.2f}s")
+    print(f"created={len(numbers)} errors={errors} creates/sec={len(numbers) / elapsed:.1f}")
+    print(f"duplicate numbers: {len(numbers) - len(set(numbers))}")
+
+
+def cleanup():
+    conn = psycopg.connect(**get_db_connection_params())
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM challans WHERE party_name = %s", (BENCH_PARTY,))
+            print(f"Removed {cursor.rowcount} benchmark challans")
+            cursor.execute(_CLEANUP_OPTIONS_SQL, {"party": BENCH_PARTY, "station": BENCH_STATION})
+            print(f"Removed {cursor.rowcount} benchmark dictionary values")
+            cursor.execute(
+                "DELETE FROM party_profiles WHERE name_key = cache_party_key(%s)", (BENCH_PARTY,)
+            )
+            cursor.execute("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'parties' AND column_name = 'shop_name'
+            """)
+            if cursor.fetchone():
+                cursor.execute("DELETE FROM parties WHERE shop_name = %s", (BENCH_PARTY,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark concurrent challan creation")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--keep", action="store_true", help="Keep benchmark challans")
+    args = parser.parse_args()
+    try:
+        run(args.workers, args.seconds)
+    finally:
+        if not args.keep:
+            cleanup()
@@ -0,0 +1,88 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Triggers from migrations/0017 NOTIFY the cache_invalidation channel when challans,
+challan items, orders, parties or the challan option dictionaries change, with a
+JSON payload {"cache": name, "key": key}. Postgres delivers it when the writing
+transaction commits. Every worker runs one CacheInvalidationListener thread on its
+own (non-pooled) connection that evicts the named entry from the local cache (a null
+key clears the whole cache). Notifications sent while the listener is disconnected
+are lost, so it clears every cache each time it (re)connects.
+"""
+import json
+import threading
+
+import psycopg  # type: ignore
+
+from caches import clear_caches, invalidate_cache
+from config import get_db_connection_params
+
+CHANNEL = "cache_invalidation"
+RECONNECT_DELAY = 5  # seconds between reconnect attempts
+POLL_TIMEOUT = 1.0  # seconds between stop checks while idle
+
+
+def apply_invalidation(payload: str) -> bool:
+    """Evict the cache entry named by a notification payload. False if it is unusable."""
+    try:
+        message = json.loads(payload)
+        name = message["cache"]
+    except (ValueError, TypeError, KeyError):
+        print(f"Warning: ignoring cache invalidation payload {payload!r}")
+        return False
+    return invalidate_cache(name, message.get("key"))
+
+
+class CacheInvalidationListener:
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self._thread = None
+        self._stop = threading.Event()
+        self._connected = False
+        self._stats = {"connects": 0, "received": 0, "applied": 0, "errors": 0}
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="cache-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def status(self) -> dict:
+        status = dict(self._stats)
+        status["channel"] = self.channel
+        status["running"] = self._thread is not None and self._thread.is_alive()
+        status["connected"] = self._connected
+        return status
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self._listen()
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Warning: cache invalidation listener disconnected: {e}")
+            self._connected = False
+            self._stop.wait(RECONNECT_DELAY)
+
+    def _listen(self):
+        with psycopg.connect(**get_db_connection_params(), autocommit=True) as conn:
+            conn.execute(f"LISTEN {self.channel}")
+            self._connected = True
+            self._stats["connects"] += 1
+            # Anything invalidated before LISTEN took effect was missed
+            clear_caches()
+            while not self._stop.is_set():
+                for notify in conn.notifies(timeout=POLL_TIMEOUT):
+                    self._stats["received"] += 1
+                    if apply_invalidation(notify.payload):
+                        self._stats["applied"] += 1
+
+
+cache_listener = CacheInvalidationListener()
@@ -0,0 +1,253 @@
+"""
+Bounded in-process response caches.
+
+TTLCache keeps entries for a fixed time-to-live and evicts the least recently used
+ones once the namespace holds more than max_entries entries or (approximately)
+max_bytes of payload. All operations take a lock, so sync handlers running in the
+threadpool and async handlers can share one cache. Every cache registers itself by
+name; cache_stats() reports hits, misses, evictions and size per namespace for
+/api/health.
+
+get_or_load() / get_or_load_async() are single-flight: concurrent misses for one key
+wait for a single loader call instead of each querying the database. A result whose
+load started before an invalidation is returned to its callers but not cached.
+"""
+import asyncio
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+from config import cache_max_bytes
+
+_caches = {}
+_MISSING = object()
+
+
+def approximate_size(value) -> int:
+    """Rough payload size in bytes (containers walked recursively)."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key) + approximate_size(item)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += approximate_size(item)
+    return size
+
+
+class _Flight:
+    """One in-progress load that concurrent threads wait on."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, max_entries: int = 1024, max_bytes: int = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._max_bytes = max_bytes
+        # key -> (value, expires_at, size), least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; loads that started earlier are not cached
+        self._generation = 0
+        # key -> _Flight (threads) / asyncio.Future (event loop) for loads in progress
+        self._flights = {}
+        self._async_flights = {}
+        self._stats = {
+            "hits": 0, "misses": 0, "sets": 0, "loads": 0, "coalesced": 0,
+            "expired": 0, "evictions": 0, "invalidations": 0,
+        }
+        _caches[name] = self
+
+    @property
+    def max_bytes(self) -> int:
+        if self._max_bytes is None:
+            self._max_bytes = cache_max_bytes()
+        return self._max_bytes
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._lookup(key)
+            if value is _MISSING:
+                self._stats["misses"] += 1
+                return default
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        self._store(key, value, ttl)
+
+    def get_or_load(self, key, load):
+        """Cached value for key, else load() - called once for all concurrent callers."""
+        with self._lock:
+            value = self._lookup(key)
+            if value is not _MISSING:
+                self._stats["hits"] += 1
+                return value
+            self._stats["misses"] += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self._generation
+                self._stats["loads"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = load()
+            # Cache before releasing the flight so no new load starts in between
+            self._store(key, flight.value, generation=generation)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.value
+
+    async def get_or_load_async(self, key, load):
+        """Async get_or_load: load is a coroutine function awaited once per key."""
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self._stats["hits"] += 1
+                    return value
+                self._stats["misses"] += 1
+                future = self._async_flights.get(key)
+                leader = future is None
+                if leader:
+                    future = self._async_flights[key] = asyncio.get_running_loop().create_future()
+                    generation = self._generation
+                    self._stats["loads"] += 1
+                else:
+                    self._stats["coalesced"] += 1
+            if leader:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leading request was cancelled; take over the load
+
+        try:
+            value = await load()
+            self._store(key, value, generation=generation)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters re-raise it, no "never retrieved" log
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            with self._lock:
+                self._async_flights.pop(key, None)
+        return value
+
+    def invalidate(self, key):
+        """Drop one key (no-op if it is not cached)."""
+        with self._lock:
+            self._generation += 1
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._remove(key, cached[2])
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            if self._entries:
+                self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+
+    def status(self) -> dict:
+        with self._lock:
+            status = dict(self._stats)
+            status["entries"] = len(self._entries)
+            status["bytes"] = self._bytes
+        lookups = status["hits"] + status["misses"]
+        status["hit_ratio"] = round(status["hits"] / lookups, 3) if lookups else None
+        status["ttl"] = self.ttl
+        status["max_entries"] = self.max_entries
+        status["max_bytes"] = self.max_bytes
+        return status
+
+    def _lookup(self, key):
+        """Live value for key or _MISSING (caller holds the lock)."""
+        cached = self._entries.get(key)
+        if cached is None:
+            return _MISSING
+        value, expires_at, size = cached
+        if time.monotonic() >= expires_at:
+            self._remove(key, size)
+            self._stats["expired"] += 1
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl: float = None, generation: int = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Invalidated while loading: the value may predate the write
+                return
+            if key in self._entries:
+                self._remove(key, self._entries[key][2])
+            self._entries[key] = (value, time.monotonic() + ttl, size)
+            self._bytes += size
+            self._stats["sets"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest, (_value, _expires_at, oldest_size) = next(iter(self._entries.items()))
+                self._remove(oldest, oldest_size)
+                self._stats["evictions"] += 1
+
+    def _remove(self, key, size: int):
+        del self._entries[key]
+        self._bytes -= size
+
+
+def cache_stats() -> dict:
+    """Per-namespace statistics for every cache created in this process."""
+    return {name: cache.status() for name, cache in _caches.items()}
+
+
+def invalidate_cache(name: str, key=None) -> bool:
+    """Drop `key` from the named cache, or clear it when key is None. False if unknown."""
+    cache = _caches.get(name)
+    if cache is None:
+        return False
+    if key is None:
+        cache.clear()
+    else:
+        cache.invalidate(key)
+    return True
+
+
+def clear_caches():
+    for cache in list(_caches.values()):
+        cache.clear()
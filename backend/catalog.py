@@ -0,0 +1,626 @@
+"""
+In-process product catalog index.
+
+Active products_master rows (joined with product_catalog for qr_code) are loaded
+together with their resolved sizes in one query (json_agg over LATERAL joins) and
+kept in memory with prices already converted to float and the response shapes of the
+product endpoints prebuilt. Lookups by id, external_id and qr_code are
+dict hits, so product reads no longer re-run the join and size queries per request.
+
+Refresh is incremental: when the newest updated_at across products_master,
+product_catalog and product_sizes (or the newest catalog_deletions tombstone) moves
+past the snapshot's watermark, only the products touched since then, minus
+SYNC_OVERLAP, are reloaded. A snapshot is re-checked on the first read
+after CATALOG_MAX_STALENESS seconds; refresh() forces a reload (manual hook) and
+invalidate() makes the next read re-check.
+"""
+import base64
+from bisect import bisect_left, bisect_right
+from contextlib import closing
+from datetime import timedelta
+import json
+import re
+import threading
+import time
+
+from psycopg.rows import class_row, dict_row  # type: ignore
+
+from config import catalog_max_staleness
+from db import get_db_connection
+
+# Full reload at least this often, to pick up changes that did not bump updated_at
+FULL_RELOAD_INTERVAL = 3600
+
+# size JSON object for json_agg; keys match CatalogSize
+_SIZE_JSON = """
+    json_build_object(
+        'id', ps.id,
+        'size_id', ps.size_id,
+        'size_text', ps.size_text,
+        'price_a', ps.price_a,
+        'price_b', ps.price_b,
+        'price_c', ps.price_c,
+        'price_d', ps.price_d,
+        'price_e', ps.price_e,
+        'price_r', ps.price_r,
+        'is_active', ps.is_active
+    )
+"""
+
+# products_master columns (plus product_catalog.qr_code) kept on each CatalogEntry,
+# in the key order of the products-master payload
+_PRODUCT_COLUMNS = (
+    "id", "external_id", "name", "category", "category_id", "type", "unit", "description",
+    "image", "video", "hsn_code", "gst", "gst_applicable", "is_active", "created_on",
+    "updated_at", "has_consumption", "external_created_on", "designs", "qr_code",
+)
+
+# Active products with both size sources resolved in one round trip:
+#   direct_sizes  - product_sizes linked to products_master (product_type = 'master'), by id
+#   catalog_sizes - product_sizes of the product_catalog row sharing the external_id, by size_id
+_PRODUCTS_SQL = f"""
+    SELECT
+        pm.id,
+        pm.external_id,
+        pm.name,
+        pm.category,
+        pm.category_id,
+        pm.type,
+        pm.unit,
+        pm.description,
+        pm.image,
+        pm.video,
+        pm.hsn_code,
+        pm.gst,
+        pm.gst_applicable,
+        pm.is_active,
+        pm.created_on,
+        pm.updated_at,
+        pm.has_consumption,
+        pm.external_created_on,
+        pm.designs,
+        pc.qr_code,
+        pm.design_names AS design_list,
+        COALESCE(direct.sizes, '[]'::json) AS direct_sizes,
+        COALESCE(via_catalog.sizes, '[]'::json) AS catalog_sizes
+    FROM products_master pm
+    LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
+    LEFT JOIN LATERAL (
+        SELECT json_agg({_SIZE_JSON} ORDER BY ps.id) AS sizes
+        FROM product_sizes ps
+        WHERE ps.product_type = 'master' AND ps.product_id = pm.id AND ps.is_active = true
+    ) direct ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg({_SIZE_JSON} ORDER BY ps.size_id) AS sizes
+        FROM product_sizes ps
+        WHERE ps.product_id = pc.id AND ps.is_active = true
+    ) via_catalog ON true
+    WHERE pm.is_active = true
+"""
+
+_CHANGE_PROBE_SQL = """
+    SELECT
+        GREATEST(
+            (SELECT MAX(updated_at) FROM products_master),
+            (SELECT MAX(updated_at) FROM product_catalog),
+            (SELECT MAX(updated_at) FROM product_sizes),
+            (SELECT MAX(deleted_at) FROM catalog_deletions)
+        ) AS watermark,
+        (SELECT COUNT(*) FROM products_master WHERE is_active = true) AS active_count
+"""
+
+# Re-read this much before a watermark or sync token (late commits of long transactions)
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# products_master ids touched since a watermark (directly, via their catalog row or via
+# sizes) or hard-deleted since then (catalog_deletions tombstones, migrations/0011)
+_CHANGED_IDS_SQL = """
+    SELECT pm.id FROM products_master pm WHERE pm.updated_at >= %(since)s
+    UNION
+    SELECT ps.product_id FROM product_sizes ps
+    WHERE ps.product_type = 'master' AND ps.updated_at >= %(since)s
+    UNION
+    SELECT pm.id
+    FROM products_master pm
+    JOIN product_catalog pc ON pc.external_id = pm.external_id
+    WHERE pc.updated_at >= %(since)s
+       OR EXISTS (
+           SELECT 1 FROM product_sizes ps
+           WHERE ps.product_id = pc.id AND ps.updated_at >= %(since)s
+       )
+    UNION
+    SELECT cd.product_id FROM catalog_deletions cd
+    WHERE cd.deleted_at >= %(since)s AND cd.product_id IS NOT NULL
+"""
+
+
+def listing_key(name, product_id) -> tuple:
+    """
+    Sort key of the product listings and their pagination cursors: (name, id) in
+    codepoint order, products without a name last. Snapshots sort with it in Python
+    rather than taking the database's collation order, so cursor seeks and page
+    boundaries always agree with the listing order.
+    """
+    return (name is None, name or "", product_id)
+
+# Page size for paginated product listings (default / cap)
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Same extraction as product_qr_code_variants() in migrations/0009_product_codes.sql
+_QR_URL_RE = re.compile(r"^https?://", re.IGNORECASE)
+_QR_BARE_QUERY_RE = re.compile(r"\?([^=&#]+)$")
+_QR_NAMED_PARAM_RE = re.compile(r"[?&](?:code|id|qr|barcode)=([^&#]+)")
+_QR_PATH_CODE_RE = re.compile(r"^https?://[^/?#]+[^?#]*/([^/?#]+)$", re.IGNORECASE)
+
+_PRICE_COLUMNS = ("price_a", "price_b", "price_c", "price_d", "price_e", "price_r")
+
+
+def process_designs_field(designs_data):
+    """
+    Process designs field from database to extract design names/codes as a list of strings.
+    Handles various formats: dict with 'designs' key, JSON string, list of objects, list of strings.
+    """
+    if designs_data is None:
+        return []
+
+    try:
+        # If it's a dict, check for 'designs' key first (most common case from database)
+        if isinstance(designs_data, dict):
+            if 'designs' in designs_data:
+                designs_list = designs_data['designs']
+                if isinstance(designs_list, list) and len(designs_list) > 0:
+                    # If it's a list of dicts, extract design_name or design_code
+                    if isinstance(designs_list[0], dict):
+                        result = []
+                        for d in designs_list:
+                            if isinstance(d, dict):
+                                design_name = d.get('design_name') or d.get('design_code') or d.get('name')
+                                if design_name:
+                                    result.append(str(design_name))
+                        return result
+                    # If it's a list of strings, return as is
+                    elif isinstance(designs_list[0], str):
+                        return designs_list
+                elif isinstance(designs_list, list):
+                    return []
+            # If dict doesn't have 'designs' key, try to extract values
+            if 'design' in designs_data:
+                design_val = designs_data['design']
+                if isinstance(design_val, list):
+                    return [str(d) for d in design_val]
+                return [str(design_val)]
+
+        # If it's already a list
+        if isinstance(designs_data, list):
+            if len(designs_data) == 0:
+                return []
+            # Check if it's a list of strings
+            if isinstance(designs_data[0], str):
+                return designs_data
+            # If it's a list of dicts, extract design_name or design_code
+            if isinstance(designs_data[0], dict):
+                result = []
+                for d in designs_data:
+                    if isinstance(d, dict):
+                        design_name = d.get('design_name') or d.get('design_code') or d.get('name')
+                        if design_name:
+                            result.append(str(design_name))
+                return result
+
+        # If it's a string, try to parse as JSON
+        if isinstance(designs_data, str):
+            try:
+                parsed = json.loads(designs_data)
+                return process_designs_field(parsed)  # Recursively process parsed JSON
+            except (json.JSONDecodeError, TypeError):
+                # If parsing fails, treat as comma-separated string
+                return [d.strip() for d in designs_data.split(',') if d.strip()]
+
+        # Fallback: convert to string
+        return [str(designs_data)]
+    except Exception as e:
+        print(f"Error processing designs field: {e}, type: {type(designs_data)}, value: {designs_data}")
+        import traceback
+        traceback.print_exc()
+        return []
+
+
+def design_names(designs_raw) -> list:
+    """
+    Design names for the products-master endpoints ({"designs": [{design_name...}]} -> [names]).
+    Read path fallback only: products_master.design_names is kept normalized by a trigger
+    (normalize_design_names() in migrations/0012 mirrors this function).
+    """
+    if designs_raw is None:
+        return []
+    try:
+        if isinstance(designs_raw, str):
+            designs_raw = json.loads(designs_raw)
+        if isinstance(designs_raw, dict) and 'designs' in designs_raw:
+            designs_list = designs_raw['designs']
+            if not isinstance(designs_list, list):
+                return []
+            names = []
+            for d in designs_list:
+                if isinstance(d, dict):
+                    design_name = d.get('design_name') or d.get('design_code') or d.get('name')
+                    if design_name:
+                        names.append(str(design_name))
+            return names
+        return process_designs_field(designs_raw)
+    except Exception as e:
+        print(f"Error processing designs: {e}")
+        return []
+
+
+class CatalogSize:
+    """
+    One product_sizes row. Prices are converted from NUMERIC to float once, when the
+    catalog is loaded; as_dict() is the API shape.
+    """
+
+    __slots__ = ("id", "size_id", "size_text") + _PRICE_COLUMNS + ("is_active",)
+
+    def __init__(self, size):
+        self.id = size['id']
+        self.size_id = size['size_id']
+        self.size_text = size['size_text']
+        for column in _PRICE_COLUMNS:
+            value = size[column]
+            setattr(self, column, float(value) if value is not None else None)
+        self.is_active = size['is_active']
+
+    def as_dict(self) -> dict:
+        return {column: getattr(self, column) for column in self.__slots__}
+
+
+def qr_code_variants(qr_code) -> list:
+    """
+    Codes a stored qr_code answers to: the value itself plus, for printed QR URLs,
+    the embedded code (http://host/qr?CODE, ?code=CODE, or /qr/CODE without a query).
+    """
+    if not qr_code:
+        return []
+    variants = [qr_code]
+    if _QR_URL_RE.match(qr_code):
+        for pattern in (_QR_BARE_QUERY_RE, _QR_NAMED_PARAM_RE):
+            match = pattern.search(qr_code)
+            if match:
+                variants.append(match.group(1))
+        if not any(c in qr_code for c in "?#"):
+            match = _QR_PATH_CODE_RE.match(qr_code)
+            if match:
+                variants.append(match.group(1))
+    return list(dict.fromkeys(variants))
+
+
+def _isoformat(value):
+    if not value:
+        return value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class CatalogEntry:
+    """
+    One active product: the _PRODUCTS_SQL columns plus its sizes, in slots (built by the
+    cursor's class_row factory). Endpoint payloads are assembled on demand; the full
+    listings are serialized once per snapshot (CatalogSnapshot.rendered).
+    """
+
+    __slots__ = _PRODUCT_COLUMNS + ("design_list", "sizes", "catalog_sizes")
+
+    def __init__(self, direct_sizes=(), catalog_sizes=(), design_list=None, **row):
+        for column in _PRODUCT_COLUMNS:
+            setattr(self, column, row[column])
+        # products_master.design_names, normalized on write (migrations/0012)
+        self.design_list = design_list
+        self.catalog_sizes = tuple(CatalogSize(size) for size in catalog_sizes)
+        # Direct (products_master) sizes win; otherwise sizes via product_catalog
+        self.sizes = tuple(CatalogSize(size) for size in direct_sizes) or self.catalog_sizes
+
+    @property
+    def detail(self) -> dict:
+        """/api/product/{id} and /api/product/barcode/{code}"""
+        return {
+            'id': self.id,
+            'external_id': self.external_id,
+            'name': self.name,
+            'category_id': self.category_id,
+            'category_name': self.category,
+            'image_url': self.image,
+            'video_url': self.video,
+            'qr_code': self.qr_code,
+            'is_active': self.is_active,
+            'created_at': self.created_on,
+            'updated_at': self.updated_at,
+            'designs': self.designs,
+            'sizes': [size.as_dict() for size in self.sizes],
+        }
+
+    @property
+    def summary(self) -> dict:
+        """/api/products (catalog sizes only)"""
+        return {
+            'id': self.id,
+            'external_id': self.external_id,
+            'name': self.name,
+            'category_id': self.category_id,
+            'category_name': self.category,
+            'image_url': self.image,
+            'video_url': self.video,
+            'qr_code': self.qr_code,
+            'is_active': self.is_active,
+            'created_at': self.created_on,
+            'updated_at': self.updated_at,
+            'sizes': [size.as_dict() for size in self.catalog_sizes],
+        }
+
+    @property
+    def master(self) -> dict:
+        """/api/v1/products-master/ and /api/v1/products-master/{id}"""
+        master = {column: getattr(self, column) for column in _PRODUCT_COLUMNS}
+        master['category_name'] = self.category
+        master['image_url'] = self.image
+        master['video_url'] = self.video
+        master['designs'] = (
+            list(self.design_list) if self.design_list is not None else design_names(self.designs)
+        )
+        master['sizes'] = [size.as_dict() for size in self.sizes]
+        for column in ('created_on', 'updated_at', 'external_created_on'):
+            master[column] = _isoformat(master[column])
+        return master
+
+    def sizes_payload(self) -> dict:
+        """/api/v1/products-master/{id}/sizes"""
+        return {
+            'product_id': self.id,
+            'product_name': self.name,
+            'external_id': self.external_id,
+            'sizes': [size.as_dict() for size in self.sizes],
+            'count': len(self.sizes),
+        }
+
+
+class CatalogSnapshot:
+    """Immutable view of the catalog; refreshes build a new snapshot and swap it in."""
+
+    def __init__(self, by_id: dict, watermark, version: int, loaded_at: float):
+        self.by_id = by_id
+        self.order = sorted(by_id, key=lambda product_id: listing_key(by_id[product_id].name, product_id))
+        self.watermark = watermark
+        self.version = version
+        self.loaded_at = loaded_at
+        # Serialized responses built from this snapshot (see rendered())
+        self._rendered = {}
+        # code -> entry, mirroring the product_codes table (qr_code values win over
+        # external_ids)
+        self.by_code = {}
+        entries = self.entries()
+        for entry in entries:
+            for code in qr_code_variants(entry.qr_code):
+                self.by_code.setdefault(code, entry)
+        for entry in entries:
+            if entry.external_id is not None:
+                self.by_code.setdefault(str(entry.external_id), entry)
+
+    def get(self, product_id: int):
+        return self.by_id.get(product_id)
+
+    def find_by_code(self, codes):
+        """Product for the first of the codes that is a known qr_code/external_id code."""
+        by_code = self.by_code
+        for code in codes:
+            entry = by_code.get(code)
+            if entry is not None:
+                return entry
+        return None
+
+    def entries(self):
+        """Active products in listing order (listing_key)."""
+        by_id = self.by_id
+        return [by_id[product_id] for product_id in self.order]
+
+    def page(self, limit: int, after=None, category_id: int = None, product_type: str = None):
+        """
+        Keyset page of active products in (name, id) order, optionally filtered by
+        category_id / type. `after` is the (name, id) of the last product of the previous
+        page. Returns (entries, has_more).
+        """
+        positions = self._filtered_positions(category_id, product_type)
+        start = 0
+        if after is not None:
+            start = bisect_left(positions, self._seek_position(after))
+        selected = positions[start:start + limit + 1]
+        by_id, order = self.by_id, self.order
+        entries = [by_id[order[position]] for position in selected[:limit]]
+        return entries, len(selected) > limit
+
+    def _seek_position(self, after) -> int:
+        """
+        First position in self.order that sorts after the (name, id) key `after`; also
+        right when that product has since been renamed or removed.
+        """
+        name, product_id = after
+        by_id = self.by_id
+        keys = self.rendered(
+            "order_keys", lambda: [listing_key(by_id[pid].name, pid) for pid in self.order]
+        )
+        return bisect_right(keys, listing_key(name, product_id))
+
+    def _filtered_positions(self, category_id, product_type) -> list:
+        """Positions (in self.order) of products matching the filters, built once per snapshot."""
+        key = f"positions:{category_id}:{product_type}"
+        if category_id is None and product_type is None:
+            return self.rendered(key, lambda: list(range(len(self.order))))
+
+        def build():
+            by_id = self.by_id
+            return [
+                position for position, product_id in enumerate(self.order)
+                if (category_id is None or by_id[product_id].category_id == category_id)
+                and (product_type is None or by_id[product_id].type == product_type)
+            ]
+
+        # Filter values come from query strings; stop memoizing past a sane number of combinations
+        return self.rendered(key, build) if len(self._rendered) < 256 else build()
+
+    def rendered(self, key: str, build):
+        """
+        build() once per snapshot and key, e.g. a serialized listing and its ETag.
+        Snapshots are never modified, so the result stays valid until the next refresh.
+        """
+        value = self._rendered.get(key)
+        if value is None:
+            value = self._rendered.setdefault(key, build())
+        return value
+
+
+def encode_cursor(entry) -> str:
+    """Opaque pagination cursor for the (name, id) key of the last entry on a page."""
+    raw = json.dumps([entry.name, entry.id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(name, id) from encode_cursor(); raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        name, product_id = json.loads(raw.decode("utf-8"))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(product_id, int) or not (name is None or isinstance(name, str)):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return name, product_id
+
+
+def changed_product_ids(cursor, since) -> set:
+    """products_master ids touched or hard-deleted at or after `since` (directly, via
+    product_catalog or sizes)."""
+    cursor.execute(_CHANGED_IDS_SQL, {"since": since})
+    return {row["id"] for row in cursor.fetchall()}
+
+
+def load_entries(cursor, product_ids=None) -> dict:
+    """Build CatalogEntry objects for all active products (or only the given ids), one query."""
+    row_factory = cursor.row_factory
+    cursor.row_factory = class_row(CatalogEntry)
+    try:
+        if product_ids is not None:
+            cursor.execute(_PRODUCTS_SQL + " AND pm.id = ANY(%s)", (list(product_ids),))
+        else:
+            cursor.execute(_PRODUCTS_SQL)
+        return {entry.id: entry for entry in cursor.fetchall()}
+    finally:
+        cursor.row_factory = row_factory
+
+
+class CatalogIndex:
+    def __init__(self, max_staleness: float = None):
+        self._max_staleness = max_staleness
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"full_loads": 0, "incremental_refreshes": 0, "products_reloaded": 0, "errors": 0}
+
+    @property
+    def max_staleness(self) -> float:
+        if self._max_staleness is None:
+            self._max_staleness = catalog_max_staleness()
+        return self._max_staleness
+
+    def snapshot(self) -> CatalogSnapshot:
+        """
+        Current snapshot. The first call loads the catalog; afterwards a read that finds
+        the snapshot older than max_staleness checks for changes, while concurrent readers
+        keep using the current snapshot.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.refresh()
+        if time.monotonic() - self._checked_at >= self.max_staleness and self._lock.acquire(blocking=False):
+            try:
+                self._refresh_locked(full=False)
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"Warning: Catalog refresh failed, serving previous snapshot: {e}")
+            finally:
+                self._lock.release()
+        return self._snapshot
+
+    def needs_check(self) -> bool:
+        return self._snapshot is None or time.monotonic() - self._checked_at >= self.max_staleness
+
+    def refresh(self, full: bool = False) -> CatalogSnapshot:
+        """Check for changes now (full=True rebuilds everything). Manual refresh hook."""
+        with self._lock:
+            if not full and self._snapshot is not None and not self.needs_check():
+                return self._snapshot
+            self._refresh_locked(full=full)
+            return self._snapshot
+
+    def invalidate(self):
+        """Make the next read check the database (call after writing products)."""
+        self._checked_at = 0.0
+
+    def status(self) -> dict:
+        snapshot = self._snapshot
+        status = dict(self._stats)
+        status["max_staleness"] = self.max_staleness
+        if snapshot is None:
+            status["loaded"] = False
+            return status
+        status.update({
+            "loaded": True,
+            "version": snapshot.version,
+            "products": len(snapshot.by_id),
+            "watermark": snapshot.watermark.isoformat() if snapshot.watermark else None,
+            "age_seconds": round(time.monotonic() - snapshot.loaded_at, 1),
+        })
+        return status
+
+    def _refresh_locked(self, full: bool):
+        with closing(get_db_connection()) as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                cursor.execute(_CHANGE_PROBE_SQL)
+                probe = cursor.fetchone()
+                current = self._snapshot
+                if (
+                    full
+                    or current is None
+                    or current.watermark is None
+                    or time.monotonic() - current.loaded_at >= FULL_RELOAD_INTERVAL
+                ):
+                    self._snapshot = self._full_load(cursor, probe["watermark"])
+                elif probe["watermark"] != current.watermark or probe["active_count"] != len(current.by_id):
+                    snapshot = self._incremental(cursor, current, probe["watermark"])
+                    if len(snapshot.by_id) != probe["active_count"]:
+                        # Rows deactivated/deleted without an updated_at bump: rebuild
+                        snapshot = self._full_load(cursor, probe["watermark"])
+                    self._snapshot = snapshot
+        self._checked_at = time.monotonic()
+
+    def _next_version(self) -> int:
+        return self._snapshot.version + 1 if self._snapshot is not None else 1
+
+    def _full_load(self, cursor, watermark) -> CatalogSnapshot:
+        by_id = load_entries(cursor)
+        self._stats["full_loads"] += 1
+        self._stats["products_reloaded"] += len(by_id)
+        print(f"Catalog index loaded: {len(by_id)} products")
+        return CatalogSnapshot(by_id, watermark, self._next_version(), time.monotonic())
+
+    def _incremental(self, cursor, current: CatalogSnapshot, watermark) -> CatalogSnapshot:
+        changed = changed_product_ids(cursor, current.watermark - SYNC_OVERLAP)
+        by_id = dict(current.by_id)
+        for product_id in changed:
+            by_id.pop(product_id, None)
+        if changed:
+            by_id.update(load_entries(cursor, changed))
+        self._stats["incremental_refreshes"] += 1
+        self._stats["products_reloaded"] += len(changed)
+        # Keep the original load time so FULL_RELOAD_INTERVAL still applies
+        return CatalogSnapshot(by_id, watermark, self._next_version(), current.loaded_at)
+
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,80 @@
+"""
+Delta sync for the product catalog (/api/v1/products-master/changes).
+
+A sync token records the database time of the previous sync. A request with a token
+returns every product touched since then (its products_master row, product_catalog
+row or any of its product_sizes rows was inserted, updated or deleted) in the
+products-master shape with its sizes embedded, plus the ids of products that were
+deactivated or deleted. Clients replace those records in their local copy.
+
+Rows are matched on updated_at (bumped by triggers, see migrations/0011) with a small
+overlap so rows committed by transactions that were still running at the previous
+sync are not missed; clients must treat repeated records as upserts. Hard deletes
+of products_master, product_catalog and product_sizes rows come from the
+catalog_deletions tombstones (migrations/0011, 0021). A missing or expired token gets the full
+active catalog with full=true.
+"""
+import base64
+from datetime import datetime, timedelta
+
+from catalog import SYNC_OVERLAP, changed_product_ids, load_entries
+
+# Tombstones are kept this long; older tokens get a full resync
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+_TOKEN_PREFIX = "v1|"
+
+
+def encode_sync_token(synced_at: datetime) -> str:
+    raw = (_TOKEN_PREFIX + synced_at.isoformat()).encode("ascii")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_sync_token(token: str) -> datetime:
+    """Timestamp from encode_sync_token(); raises ValueError for malformed tokens."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode("ascii")
+        if not raw.startswith(_TOKEN_PREFIX):
+            raise ValueError("unknown token version")
+        return datetime.fromisoformat(raw[len(_TOKEN_PREFIX):])
+    except Exception as e:
+        raise ValueError(f"Invalid sync token: {token}") from e
+
+
+def catalog_changes(cursor, since: datetime = None) -> dict:
+    """
+    {"token", "full", "products", "removed"} for changes since `since` (a decoded token).
+    Run in a single (read-only) transaction so the token matches the rows returned.
+    """
+    cursor.execute("SELECT LOCALTIMESTAMP AS synced_at")
+    synced_at = cursor.fetchone()["synced_at"]
+
+    if since is None or synced_at - since > TOMBSTONE_RETENTION:
+        entries = load_entries(cursor)
+        return {
+            "token": encode_sync_token(synced_at),
+            "full": True,
+            "products": [entries[product_id].master for product_id in sorted(entries)],
+            "removed": [],
+        }
+
+    # Includes products hard-deleted since then (catalog_deletions)
+    product_ids = changed_product_ids(cursor, since - SYNC_OVERLAP)
+
+    entries = load_entries(cursor, product_ids) if product_ids else {}
+    return {
+        "token": encode_sync_token(synced_at),
+        "full": False,
+        "products": [entries[product_id].master for product_id in sorted(entries)],
+        # Touched but no longer active (deactivated) or gone (deleted)
+        "removed": sorted(product_id for product_id in product_ids if product_id not in entries),
+    }
+
+
+def prune_catalog_deletions(cursor) -> int:
+    """Drop tombstones older than TOMBSTONE_RETENTION; returns the number removed."""
+    cursor.execute(
+        "DELETE FROM catalog_deletions WHERE deleted_at < LOCALTIMESTAMP - %s",
+        (TOMBSTONE_RETENTION,),
+    )
+    return cursor.rowcount
@@ -0,0 +1,134 @@
+"""
+Dropdown dictionaries for the challan/order forms.
+
+challan_option_values (migrations/0015) holds every distinct party, station,
+transport, price category, customer name and phone used by challans, orders and
+parties, deduplicated by a per-kind key. Triggers on those tables only add values
+that are not listed yet (migrations/0019), so writes never contend on a shared row;
+recount_option_values() removes values nothing uses any more and refreshes the usage
+counts (`refs`), and the app runs it every RECOUNT_INTERVAL seconds. Reading the
+options is one scan of that table; `version` only moves when a value appears or
+disappears, so clients can tell whether their copy is current.
+search_option_values() serves typeahead lookups from the same table.
+"""
+
+OPTION_KINDS = (
+    "party_names",
+    "station_names",
+    "transport_names",
+    "price_categories",
+    "customer_names",
+    "customer_phones",
+)
+
+# Seconds between dictionary recounts (one worker runs it; the others skip)
+RECOUNT_INTERVAL = 3600
+
+# The recount row carries the version of the last removal
+_OPTION_VALUES_SQL = """
+    SELECT kind, value, refs, version
+    FROM challan_option_values
+    UNION ALL
+    SELECT NULL, NULL, 0, version
+    FROM challan_option_recounts
+    ORDER BY kind, value
+"""
+
+
+def option_values_from_rows(rows) -> tuple:
+    """({kind: [value, ...]}, version) from challan_option_values rows."""
+    values = {kind: [] for kind in OPTION_KINDS}
+    version = 0
+    for row in rows:
+        version = max(version, row["version"])
+        if row["kind"] is not None and row["refs"] > 0:
+            values.setdefault(row["kind"], []).append(row["value"])
+    return values, version
+
+
+def load_option_values(cursor) -> tuple:
+    cursor.execute(_OPTION_VALUES_SQL)
+    return option_values_from_rows(cursor.fetchall())
+
+
+async def load_option_values_async(cursor) -> tuple:
+    await cursor.execute(_OPTION_VALUES_SQL)
+    return option_values_from_rows(await cursor.fetchall())
+
+
+def recount_option_values(cursor, min_interval: float = 0) -> int:
+    """
+    Rebuild the dictionary from challans/orders/parties: add missing values, refresh
+    usage counts and delete unused ones. Returns the number of values added or removed,
+    or -1 when skipped (another recount is running, or the last one ran less than
+    min_interval seconds ago). The caller commits.
+    """
+    cursor.execute(
+        "SELECT recount_challan_options(make_interval(secs => %s)) AS changed",
+        (min_interval,),
+    )
+    return cursor.fetchone()["changed"]
+
+
+# Kinds the typeahead endpoint serves (price categories are a short fixed list)
+SEARCH_KINDS = ("party_names", "station_names", "transport_names", "customer_names", "customer_phones")
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+# Typeahead ranking: exact, prefix, word prefix, then any substring; ties go to the
+# most used value. Substring matching on value_key uses the trigram index (0016).
+_OPTION_SEARCH_SQL = """
+    SELECT value
+    FROM challan_option_values
+    WHERE kind = %(kind)s AND refs > 0 AND value_key LIKE %(contains)s
+    ORDER BY
+        CASE
+            WHEN value_key = %(key)s THEN 0
+            WHEN value_key LIKE %(prefix)s THEN 1
+            WHEN value_key LIKE %(word_prefix)s THEN 2
+            ELSE 3
+        END,
+        refs DESC,
+        value
+    LIMIT %(limit)s
+"""
+_OPTION_TOP_SQL = """
+    SELECT value
+    FROM challan_option_values
+    WHERE kind = %(kind)s AND refs > 0
+    ORDER BY refs DESC, value
+    LIMIT %(limit)s
+"""
+
+
+def _like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def option_search_query(kind: str, q: str, limit: int) -> tuple:
+    """(sql, params) for a typeahead search; an empty query returns the most used values."""
+    if kind == "customer_phones":
+        key = "".join(filter(str.isdigit, q or ""))
+    else:
+        key = (q or "").strip().lower()
+    if not key:
+        return _OPTION_TOP_SQL, {"kind": kind, "limit": limit}
+    escaped = _like_escape(key)
+    return _OPTION_SEARCH_SQL, {
+        "kind": kind,
+        "key": key,
+        "contains": f"%{escaped}%",
+        "prefix": f"{escaped}%",
+        "word_prefix": f"% {escaped}%",
+        "limit": limit,
+    }
+
+
+def search_option_values(cursor, kind: str, q: str, limit: int = SEARCH_DEFAULT_LIMIT) -> list:
+    cursor.execute(*option_search_query(kind, q, limit))
+    return [row["value"] for row in cursor.fetchall()]
+
+
+async def search_option_values_async(cursor, kind: str, q: str, limit: int = SEARCH_DEFAULT_LIMIT) -> list:
+    await cursor.execute(*option_search_query(kind, q, limit))
+    return [row["value"] for row in await cursor.fetchall()]
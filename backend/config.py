@@ -184,3 +184,95 @@ def get_db_connection_params():
         "password": unquote(parsed.password) if parsed.password else None,
         "sslmode": ssl_mode,
     }
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Warning: {name}={value!r} is not an integer, using {default}")
+        return default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Warning: {name}={value!r} is not a number, using {default}")
+        return default
+
+
+def _env_bool(name, default=False):
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def async_reads_enabled():
+    """DB_ASYNC_READS=1 serves the read-heavy endpoints from the asyncio data path."""
+    return _env_bool("DB_ASYNC_READS")
+
+
+def auto_migrate_enabled():
+    """DB_AUTO_MIGRATE (default on) applies pending migrations at startup."""
+    return _env_bool("DB_AUTO_MIGRATE", True)
+
+
+def get_db_pool_settings():
+    """
+    Connection pool sizing, read from the environment.
+    Lifetimes and timeouts are in seconds.
+    """
+    min_size = max(_env_int("DB_POOL_MIN_SIZE", 2), 0)
+    max_size = max(_env_int("DB_POOL_MAX_SIZE", 20), min_size, 1)
+    return {
+        "min_size": min_size,
+        "max_size": max_size,
+        "max_lifetime": _env_float("DB_POOL_MAX_LIFETIME", 1800.0),
+        "max_idle": _env_float("DB_POOL_MAX_IDLE", 300.0),
+        "timeout": _env_float("DB_POOL_TIMEOUT", 10.0),
+    }
+
+
+def catalog_max_staleness():
+    """
+    CATALOG_MAX_STALENESS: seconds a product catalog snapshot is served before the next
+    read checks the database for changes (default 30).
+    """
+    return max(_env_float("CATALOG_MAX_STALENESS", 30.0), 0.0)
+
+
+def barcode_negative_ttl():
+    """
+    BARCODE_NEGATIVE_TTL: seconds an unknown scan code is answered "not found" from
+    memory before the product_codes table is consulted again (default 60).
+    """
+    return max(_env_float("BARCODE_NEGATIVE_TTL", 60.0), 0.0)
+
+
+def fast_json_enabled():
+    """API_FAST_JSON=1 encodes responses with responses.FastJSONResponse (orjson if installed)."""
+    return _env_bool("API_FAST_JSON")
+
+
+def cache_max_bytes():
+    """
+    CACHE_MAX_MB: approximate memory cap per in-process response cache namespace
+    (caches.TTLCache); least recently used entries are evicted beyond it (default 32).
+    """
+    return int(max(_env_float("CACHE_MAX_MB", 32.0), 0.0) * 1024 * 1024)
+
+
+def cache_notify_enabled():
+    """
+    CACHE_NOTIFY (default on) runs a LISTEN connection per worker that evicts cache
+    entries other workers' writes invalidated (cache_bus.py).
+    """
+    return _env_bool("CACHE_NOTIFY", True)
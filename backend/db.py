@@ -0,0 +1,180 @@
+"""
+Process-wide PostgreSQL connection pool.
+
+Endpoints keep calling get_db_connection() / conn.close() as before; the
+returned connection is borrowed from a shared pool and close() hands it back
+instead of tearing down the TLS session.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+import threading
+
+from psycopg import AsyncConnection, pq  # type: ignore
+from psycopg_pool import AsyncConnectionPool, ConnectionPool  # type: ignore
+
+from config import get_db_connection_params, get_db_pool_settings
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_async_pool = None
+_async_pool_lock = None
+
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled psycopg connection.
+    close() rolls back any open transaction and returns the connection to the pool.
+    Everything else (cursor, commit, rollback, ...) is delegated to the real connection.
+    """
+
+    __slots__ = ("_conn", "_pool")
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise AttributeError(f"connection already returned to pool (accessing {name!r})")
+        return getattr(conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None or self._conn.closed
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if not conn.closed and conn.info.transaction_status != pq.TransactionStatus.IDLE:
+                conn.rollback()
+        except Exception as exc:
+            print(f"Warning: Could not reset pooled connection: {exc}")
+        self._pool.putconn(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._conn is not None:
+            if exc_type is None:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+        self.close()
+
+
+def _create_pool(pool_class=ConnectionPool, name="decojewels", **extra):
+    settings = get_db_pool_settings()
+    return pool_class(
+        kwargs=get_db_connection_params(),
+        min_size=settings["min_size"],
+        max_size=settings["max_size"],
+        max_lifetime=settings["max_lifetime"],
+        max_idle=settings["max_idle"],
+        timeout=settings["timeout"],
+        check=pool_class.check_connection,
+        name=name,
+        open=False,
+        **extra,
+    )
+
+
+def get_pool():
+    """Return the shared pool, creating and opening it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = _create_pool()
+                pool.open(wait=False)
+                _pool = pool
+    return _pool
+
+
+def open_pool():
+    """Open the pool at startup without waiting for min_size connections."""
+    return get_pool()
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+def get_db_connection():
+    """Borrow a connection from the pool. Call close() on it to give it back."""
+    pool = get_pool()
+    try:
+        conn = pool.getconn()
+    except Exception as e:
+        print(f"Database connection error: {e}")
+        try:
+            params = get_db_connection_params()
+            print(f"Attempted connection with host: {params.get('host', 'unknown')}")
+        except Exception:
+            pass
+        raise
+    return PooledConnection(conn, pool)
+
+
+def get_pool_stats():
+    """Pool counters for monitoring (sizes, waiting requests, errors, timings)."""
+    pool = _pool
+    if pool is None:
+        return {"open": False}
+    stats = pool.get_stats()
+    stats["open"] = not pool.closed
+    stats["name"] = pool.name
+    return stats
+
+
+async def open_async_pool():
+    """Open the asyncio pool (AsyncConnection) used by the async read endpoints."""
+    global _async_pool, _async_pool_lock
+    if _async_pool is not None:
+        return _async_pool
+    if _async_pool_lock is None:
+        _async_pool_lock = asyncio.Lock()
+    async with _async_pool_lock:
+        if _async_pool is None:
+            pool = _create_pool(
+                AsyncConnectionPool, name="decojewels-async", connection_class=AsyncConnection
+            )
+            await pool.open(wait=False)
+            _async_pool = pool
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    pool, _async_pool = _async_pool, None
+    if pool is not None:
+        await pool.close()
+
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Borrow an AsyncConnection from the async pool.
+    The transaction is committed on exit (rolled back on error) and the connection returned.
+    """
+    pool = await open_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+def get_async_pool_stats():
+    pool = _async_pool
+    if pool is None:
+        return {"open": False}
+    stats = pool.get_stats()
+    stats["open"] = not pool.closed
+    stats["name"] = pool.name
+    return stats
@@ -3,6 +3,7 @@ import asyncio
 from contextlib import asynccontextmanager, closing
 from datetime import date, datetime
 from decimal import Decimal
+import hashlib
 from io import BytesIO
 import json
 import os
@@ -14,142 +15,123 @@ try:
     from dotenv import load_dotenv  # type: ignore
 except ModuleNotFoundError:
     load_dotenv = None  # type: ignore
-from fastapi import FastAPI, HTTPException, Request  # type: ignore
+from fastapi import FastAPI, HTTPException, Query, Request  # type: ignore
+from fastapi.encoders import jsonable_encoder  # type: ignore
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
-from fastapi.responses import Response  # type: ignore
-import psycopg  # type: ignore
+from fastapi.responses import JSONResponse, Response  # type: ignore
+from fastapi.routing import APIRoute  # type: ignore
 from psycopg.rows import dict_row  # type: ignore
-from psycopg.sql import Identifier, SQL  # type: ignore
 from pydantic import BaseModel  # type: ignore
 import qrcode  # type: ignore
 
-from config import get_db_connection_params
+from barcodes import barcode_search_values, code_resolver
+from cache_bus import cache_listener
+from caches import TTLCache, cache_stats
+from catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, catalog_index, decode_cursor, encode_cursor
+from catalog_sync import catalog_changes, decode_sync_token, prune_catalog_deletions
+from challan_options import (
+    RECOUNT_INTERVAL,
+    SEARCH_DEFAULT_LIMIT,
+    SEARCH_KINDS,
+    SEARCH_MAX_LIMIT,
+    load_option_values,
+    load_option_values_async,
+    recount_option_values,
+    search_option_values,
+    search_option_values_async,
+)
+from config import async_reads_enabled, auto_migrate_enabled, cache_notify_enabled, fast_json_enabled
+from db import (
+    async_db_connection,
+    close_async_pool,
+    close_pool,
+    get_async_pool_stats,
+    get_db_connection,
+    get_pool_stats,
+    open_async_pool,
+    open_pool,
+)
+from migrate import apply_migrations
+from party_profiles import (
+    empty_party_data,
+    lookup_party_profile,
+    lookup_party_profile_async,
+    party_name_key,
+    refresh_party_profile,
+    resolve_party_profile,
+    resolve_party_profile_async,
+)
+from responses import FastJSONResponse, encode_json, orjson_available
+from schema import schema_registry
 
 if load_dotenv:
     load_dotenv()
 
-# In-memory cache for slow endpoints (avoids timeout on retry)
-_challan_options_cache = None
-_challan_options_cache_time = 0
+# DB_ASYNC_READS=1: serve read-heavy endpoints from the asyncio data path (see bottom of file)
+ASYNC_READS = async_reads_enabled()
+# DB_AUTO_MIGRATE=0: leave schema changes to `python migrate.py` (e.g. in a deploy step)
+AUTO_MIGRATE = auto_migrate_enabled()
+# API_FAST_JSON=1: encode responses with FastJSONResponse (orjson when installed)
+FAST_JSON = fast_json_enabled()
+if FAST_JSON and not orjson_available():
+    print("Warning: API_FAST_JSON is set but orjson is not installed; "
+          "responses use the slower stdlib json encoder (pip install orjson)")
+# CACHE_NOTIFY=0: no LISTEN connection; caches then only see this worker's writes (until TTL)
+CACHE_NOTIFY = cache_notify_enabled()
+
+# In-memory caches for slow endpoints (TTL + LRU, bounded; stats in /api/health)
 CHALLAN_OPTIONS_CACHE_TTL = 300  # 5 min
-
-_challans_list_cache = {}
-_challans_list_cache_time = {}
-
-_party_data_cache = {}
-_party_data_cache_time = {}
+CHALLANS_LIST_CACHE_TTL = 30
 PARTY_DATA_CACHE_TTL = 300  # 5 min - party data rarely changes
 
+_challan_options_cache = TTLCache("challan_options", CHALLAN_OPTIONS_CACHE_TTL, max_entries=1)
+_challans_list_cache = TTLCache("challans_list", CHALLANS_LIST_CACHE_TTL, max_entries=256)
+_party_data_cache = TTLCache("party_data", PARTY_DATA_CACHE_TTL, max_entries=5000)
+# The options payload is one entry
+_CHALLAN_OPTIONS_KEY = "all"
 
-def _migrate_varchar_columns(cursor, conn):
-    """Explicitly migrate VARCHAR(50) columns to VARCHAR(255) for party_name, station_name, transport_name, challan_number.
-    This function ALWAYS attempts to alter columns - PostgreSQL will handle gracefully if already correct size.
-    Uses USING clause to handle any data conversion issues.
-    """
-    tables_to_migrate = ['challans', 'orders']
-    columns_to_migrate = ['party_name', 'station_name', 'transport_name']
-    # Also migrate challan_number in challans table (it can be long when party name is included)
-    challan_number_migration = [('challans', 'challan_number')]
-    
-    for table_name in tables_to_migrate:
-        # First check if table exists
-        try:
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = %s
-                )
-            """, (table_name,))
-            table_exists = cursor.fetchone()
-            if not table_exists or (isinstance(table_exists, (tuple, list)) and not table_exists[0]) or (isinstance(table_exists, dict) and not table_exists.get('exists')):
-                continue
-        except Exception:
-            continue
-        
-        for column_name in columns_to_migrate:
-            # ALWAYS try to alter - be very aggressive
-            # Try multiple approaches to ensure it works
-            migrated = False
-            for attempt in range(3):
-                try:
-                    # Method 1: Direct ALTER with USING clause (most reliable)
-                    cursor.execute(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE VARCHAR(255) USING {column_name}::VARCHAR(255)")
-                    if conn:
-                        conn.commit()
-                    print(f"✓ Migrated {table_name}.{column_name} to VARCHAR(255) (attempt {attempt + 1})")
-                    migrated = True
-                    break
-                except Exception as alter_err:
-                    error_msg = str(alter_err).lower()
-                    # If it says "already" or "does not exist", that's fine
-                    if 'already' in error_msg or 'does not exist' in error_msg or 'is not of type' in error_msg:
-                        print(f"Info: {table_name}.{column_name} is already correct or doesn't exist")
-                        migrated = True
-                        break
-                    # If it's the last attempt, log the error
-                    if attempt == 2:
-                        import traceback
-                        print(f"ERROR: Failed to migrate {table_name}.{column_name} after 3 attempts: {alter_err}")
-                        # Check current state for debugging
-                        try:
-                            cursor.execute("""
-                                SELECT data_type, character_maximum_length
-                                FROM information_schema.columns 
-                                WHERE table_name = %s AND column_name = %s
-                            """, (table_name, column_name))
-                            col_info = cursor.fetchone()
-                            if col_info:
-                                current_length = col_info[1] if isinstance(col_info, (tuple, list)) else col_info.get("character_maximum_length")
-                                print(f"  Current state: type={col_info[0] if isinstance(col_info, (tuple, list)) else col_info.get('data_type')}, length={current_length}")
-                        except Exception:
-                            pass
-                        traceback.print_exc()
-                    else:
-                        # Try alternative method
-                        try:
-                            cursor.execute(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE VARCHAR(255)")
-                            if conn:
-                                conn.commit()
-                            print(f"✓ Migrated {table_name}.{column_name} to VARCHAR(255) (alternative method)")
-                            migrated = True
-                            break
-                        except Exception:
-                            pass
-    
-    # Also migrate challan_number separately (it's VARCHAR(50) but can exceed 50 chars with long party names)
-    for table_name, column_name in challan_number_migration:
-        migrated = False
-        for attempt in range(3):
-            try:
-                cursor.execute(f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE VARCHAR(255) USING {column_name}::VARCHAR(255)")
-                if conn:
-                    conn.commit()
-                print(f"✓ Migrated {table_name}.{column_name} to VARCHAR(255) (attempt {attempt + 1})")
-                migrated = True
-                break
-            except Exception as alter_err:
-                error_msg = str(alter_err).lower()
-                if 'already' in error_msg or 'does not exist' in error_msg:
-                    print(f"Info: {table_name}.{column_name} is already correct or doesn't exist")
-                    migrated = True
-                    break
-                if attempt == 2:
-                    import traceback
-                    print(f"ERROR: Failed to migrate {table_name}.{column_name}: {alter_err}")
-                    traceback.print_exc()
 
 def _run_startup_db_checks():
-    """Run DB table checks in a thread so server can start even when DB is slow/unavailable."""
+    """Apply pending migrations and verify the schema in a thread so the server can start
+    even when the DB is slow/unavailable. Handlers only check schema_migrations (read-only)."""
     try:
         with closing(get_db_connection()) as conn:
+            if AUTO_MIGRATE:
+                apply_migrations(conn)
             with conn.cursor(row_factory=dict_row) as cursor:
-                ensure_product_tables(cursor)
-                ensure_challan_tables(cursor, conn)
-                _migrate_varchar_columns(cursor, conn)  # Explicit migration
+                # Verify every schema component once; handlers never run DDL
+                schema_registry.ensure_all(cursor)
                 cleanup_finalized_challan_numbers(cursor)
+                prune_catalog_deletions(cursor)
             conn.commit()
     except Exception as exc:
         print(f"Warning: Startup table checks failed: {exc}")
+    _recount_challan_options()
+    try:
+        # Load the product catalog index so the first product request is served from memory
+        catalog_index.refresh()
+    except Exception as exc:
+        print(f"Warning: Catalog index load failed: {exc}")
+
+
+def _recount_challan_options():
+    """Drop dictionary values nothing uses any more (at most once per RECOUNT_INTERVAL
+    across all workers; the others skip)."""
+    try:
+        with closing(get_db_connection()) as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                changed = recount_option_values(cursor, RECOUNT_INTERVAL)
+            conn.commit()
+        if changed > 0:
+            print(f"Challan options recount: {changed} values added or removed")
+    except Exception as exc:
+        print(f"Warning: Challan options recount failed: {exc}")
+
+
+async def _recount_challan_options_periodically():
+    while True:
+        await asyncio.sleep(RECOUNT_INTERVAL)
+        await asyncio.to_thread(_recount_challan_options)
 
 
 def _warm_challan_cache():
@@ -180,16 +162,41 @@ async def lifespan(app: FastAPI):
     """
     Lifespan event handler for startup and shutdown tasks.
     """
+    # Open the shared connection pool (does not block on the first connections)
+    open_pool()
+    if ASYNC_READS:
+        await open_async_pool()
     # Run DB checks in thread so server starts listening immediately
     asyncio.create_task(asyncio.to_thread(_run_startup_db_checks))
     # Warm cache in background so first request doesn't timeout
     asyncio.create_task(asyncio.to_thread(_warm_challan_cache))
+    # Evict cache entries that writes on other workers invalidated
+    if CACHE_NOTIFY:
+        cache_listener.start()
+    recount_task = asyncio.create_task(_recount_challan_options_periodically())
     yield
-    # Shutdown (if needed in the future)
-    pass
+    # Shutdown: stop the recount and the invalidation listener, release pooled connections
+    recount_task.cancel()
+    if CACHE_NOTIFY:
+        await asyncio.to_thread(cache_listener.stop)
+    if ASYNC_READS:
+        await close_async_pool()
+    close_pool()
+
+
+app = FastAPI(
+    title="DecoJewels API",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse if FAST_JSON else JSONResponse,
+)
 
 
-app = FastAPI(title="DecoJewels API", lifespan=lifespan)
+def json_response(content):
+    """
+    Hot-path return value: with API_FAST_JSON a FastJSONResponse, which skips FastAPI's
+    jsonable_encoder walk; otherwise the content itself (default encoding).
+    """
+    return FastJSONResponse(content) if FAST_JSON else content
 
 # CORS middleware to allow Flutter app to connect
 app.add_middleware(
@@ -200,423 +207,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database connection helpers
-def get_db_connection():
-    try:
-        params = get_db_connection_params()
-        conn = psycopg.connect(**params)
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
-        try:
-            params = get_db_connection_params()
-            print(f"Attempted connection with host: {params.get('host', 'unknown')}")
-        except Exception:
-            pass
-        raise
+# Schema components and the migration version each one needs (see migrate.py)
+schema_registry.register("products", 21)
+schema_registry.register("orders", 20)
+schema_registry.register("challans", 22)
+schema_registry.register("labels", 5)
 
-def ensure_product_tables(cursor):
-    """
-    Ensure product_catalog and product_sizes tables exist with expected columns.
-    """
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS product_catalog (
-            id SERIAL PRIMARY KEY,
-            external_id INTEGER,
-            name VARCHAR(500) NOT NULL,
-            category_id INTEGER,
-            category_name VARCHAR(255),
-            image_url TEXT,
-            video_url TEXT,
-            qr_code TEXT,
-            is_active BOOLEAN DEFAULT TRUE,
-            metadata JSONB,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
-
-    cursor.execute(
-        """
-        CREATE TABLE IF NOT EXISTS product_sizes (
-            id SERIAL PRIMARY KEY,
-            product_id INTEGER REFERENCES product_catalog(id) ON DELETE CASCADE,
-            size_id INTEGER,
-            size_text VARCHAR(100),
-            price_a NUMERIC(12, 2),
-            price_b NUMERIC(12, 2),
-            price_c NUMERIC(12, 2),
-            price_d NUMERIC(12, 2),
-            price_e NUMERIC(12, 2),
-            price_r NUMERIC(12, 2),
-            is_active BOOLEAN DEFAULT TRUE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        """
-    )
 
-    cursor.execute(
-        "CREATE UNIQUE INDEX IF NOT EXISTS idx_product_catalog_external_id "
-        "ON product_catalog(external_id) WHERE external_id IS NOT NULL"
-    )
-    cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_product_sizes_product_id "
-        "ON product_sizes(product_id)"
-    )
-    cursor.execute(
-        "CREATE INDEX IF NOT EXISTS idx_product_sizes_size_id "
-        "ON product_sizes(size_id)"
-    )
+def format_dc_series(sequence_num: int) -> str:
+    """DC000001..DC999999, then DC1000000, DC1000001... (no limit)."""
+    sequence_str = str(sequence_num).zfill(6) if sequence_num <= 999999 else str(sequence_num)
+    return f"DC{sequence_str}"
 
 
-def ensure_orders_table(cursor):
+def next_dc_sequence(cursor) -> int:
     """
-    Ensure orders table exists with all required columns, especially order_number.
+    Allocate the next global DC number from challan_dc_seq (migration 0006).
+    nextval() never blocks other transactions; numbers of rolled-back inserts are skipped.
     """
-    # Check if orders table exists
-    cursor.execute("""
-        SELECT EXISTS (
-            SELECT FROM information_schema.tables 
-            WHERE table_name = 'orders'
-        ) as exists
-    """)
-    result = cursor.fetchone()
-    # Handle both dict_row and tuple results
-    if isinstance(result, dict):
-        table_exists = result.get('exists', False)
-    else:
-        table_exists = result[0] if result else False
-    
-    if not table_exists:
-        # Create orders table if it doesn't exist
-        cursor.execute("""
-            CREATE TABLE orders (
-                id SERIAL PRIMARY KEY,
-                order_number VARCHAR(50) UNIQUE NOT NULL,
-                party_name VARCHAR(255),
-                station VARCHAR(255),
-                price_category VARCHAR(100),
-                product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
-                product_external_id INTEGER,
-                product_name VARCHAR(500),
-                size_id INTEGER,
-                size_text VARCHAR(100),
-                quantity INTEGER NOT NULL DEFAULT 1,
-                unit_price DECIMAL(12, 2),
-                total_price DECIMAL(12, 2) NOT NULL,
-                customer_name VARCHAR(255) NOT NULL,
-                customer_phone VARCHAR(20),
-                customer_email VARCHAR(255),
-                customer_address TEXT,
-                order_status VARCHAR(50) DEFAULT 'pending' CHECK (
-                    order_status IN ('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled')
-                ),
-                payment_status VARCHAR(50) DEFAULT 'pending' CHECK (
-                    payment_status IN ('pending', 'partial', 'paid', 'refunded')
-                ),
-                payment_method VARCHAR(50),
-                transport_name VARCHAR(255),
-                notes TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                created_by VARCHAR(255)
-            )
-        """)
-        
-        # Create indexes
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_orders_product_id ON orders(product_id)
-        """)
-    else:
-        # Table exists, ensure order_number column exists
-        cursor.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'orders' AND column_name = 'order_number'
-        """)
-        has_order_number = cursor.fetchone() is not None
-        
-        if not has_order_number:
-            print("Adding order_number column to orders table...")
-            # First, add the column (allowing NULLs initially)
-            cursor.execute("""
-                ALTER TABLE orders 
-                ADD COLUMN order_number VARCHAR(50)
-            """)
-            # Update existing rows with a default order number if needed
-            cursor.execute("""
-                UPDATE orders 
-                SET order_number = 'DJ-' || LPAD(id::TEXT, 6, '0')
-                WHERE order_number IS NULL
-            """)
-            # Now make it NOT NULL and add unique constraint
-            try:
-                cursor.execute("""
-                    ALTER TABLE orders 
-                    ALTER COLUMN order_number SET NOT NULL
-                """)
-                cursor.execute("""
-                    ALTER TABLE orders 
-                    ADD CONSTRAINT orders_order_number_key UNIQUE (order_number)
-                """)
-            except Exception as e:
-                print(f"Warning: Could not add NOT NULL or UNIQUE constraint to order_number: {e}")
-                # If constraint fails, at least ensure the column exists
-
-    # Indexes for challan options queries (DISTINCT on party, station, transport)
-    for idx_name, col in [
-        ("idx_orders_party_name", "party_name"),
-        ("idx_orders_station", "station"),
-        ("idx_orders_transport_name", "transport_name"),
-    ]:
-        try:
-            cursor.execute(
-                SQL("CREATE INDEX IF NOT EXISTS {} ON orders({})").format(
-                    Identifier(idx_name), Identifier(col)
-                )
-            )
-        except Exception:
-            pass
-
+    cursor.execute("SELECT nextval('challan_dc_seq') AS seq")
+    row = cursor.fetchone()
+    return int(row["seq"] if isinstance(row, dict) else row[0])
 
-def ensure_challan_tables(cursor, conn=None):
-    """
-    Create challan tables if they do not exist, and ensure all required columns exist.
-    """
-    # Check if challans table exists and has required columns
-    cursor.execute("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'challans' AND column_name = 'challan_number'
-    """)
-    table_exists_with_columns = cursor.fetchone() is not None
-    
-    if not table_exists_with_columns:
-        # Table doesn't exist or is missing key columns - drop and recreate
-        cursor.execute("DROP TABLE IF EXISTS challan_items CASCADE")
-        cursor.execute("DROP TABLE IF EXISTS challans CASCADE")
-        
-        cursor.execute("""
-            CREATE TABLE challans (
-                id SERIAL PRIMARY KEY,
-                challan_number VARCHAR(255) UNIQUE NOT NULL,
-                party_name VARCHAR(255) NOT NULL,
-                station_name VARCHAR(255) NOT NULL,
-                transport_name VARCHAR(255),
-                price_category VARCHAR(100),
-                total_amount NUMERIC(12, 2) DEFAULT 0,
-                total_quantity NUMERIC(12, 2) DEFAULT 0,
-                status VARCHAR(50) DEFAULT 'draft' CHECK (
-                    status IN ('draft', 'ready', 'in_transit', 'delivered', 'cancelled')
-                ),
-                notes TEXT,
-                metadata JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    else:
-        # Table exists, just ensure it has all columns
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS challans (
-                id SERIAL PRIMARY KEY,
-                challan_number VARCHAR(255) UNIQUE NOT NULL,
-                party_name VARCHAR(255) NOT NULL,
-                station_name VARCHAR(255) NOT NULL,
-                transport_name VARCHAR(255),
-                price_category VARCHAR(100),
-                total_amount NUMERIC(12, 2) DEFAULT 0,
-                total_quantity NUMERIC(12, 2) DEFAULT 0,
-                status VARCHAR(50) DEFAULT 'draft' CHECK (
-                    status IN ('draft', 'ready', 'in_transit', 'delivered', 'cancelled')
-                ),
-                notes TEXT,
-                metadata JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS challan_items (
-            id SERIAL PRIMARY KEY,
-            challan_id INTEGER REFERENCES challans(id) ON DELETE CASCADE,
-            product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
-            product_name VARCHAR(500) NOT NULL,
-            size_id INTEGER,
-            size_text VARCHAR(100),
-            quantity NUMERIC(12, 2) NOT NULL DEFAULT 1,
-            unit_price NUMERIC(12, 2) NOT NULL DEFAULT 0,
-            total_price NUMERIC(12, 2) NOT NULL DEFAULT 0,
-            qr_code TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_number 
-        ON challans(challan_number)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_status 
-        ON challans(status)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_party_name 
-        ON challans(party_name)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_station_name 
-        ON challans(station_name)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_transport_name 
-        ON challans(transport_name)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challans_created_at 
-        ON challans(created_at DESC)
-    """)
-    cursor.execute("""
-        CREATE INDEX IF NOT EXISTS idx_challan_items_challan_id 
-        ON challan_items(challan_id)
-    """)
-    
-    # Ensure UNIQUE on challan_number so duplicate numbers are rejected at DB level
-    try:
-        cursor.execute("""
-            ALTER TABLE challans
-            ADD CONSTRAINT challans_challan_number_key UNIQUE (challan_number)
-        """)
-    except Exception:
-        pass  # Constraint already exists
-
-    # Ensure columns exist even if table was created previously with old schema
-    challan_columns = [
-        ("challan_number", "VARCHAR(255)"),  # Changed from VARCHAR(50) to accommodate long party names
-        ("party_name", "VARCHAR(255)"),
-        ("station_name", "VARCHAR(255)"),
-        ("transport_name", "VARCHAR(255)"),
-        ("price_category", "VARCHAR(100)"),
-        ("total_amount", "NUMERIC(12, 2) DEFAULT 0"),
-        ("total_quantity", "NUMERIC(12, 2) DEFAULT 0"),
-        ("gst_amount", "NUMERIC(12, 2) DEFAULT 0"),
-        ("apply_gst", "VARCHAR(50)"),
-        ("status", "VARCHAR(50) DEFAULT 'draft'"),
-        ("notes", "TEXT"),
-        ("metadata", "JSONB"),
-        ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
-        ("updated_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
-    ]
-    for column_name, column_type in challan_columns:
-        try:
-            # Check if column exists first
-            cursor.execute("""
-                SELECT column_name, character_maximum_length
-                FROM information_schema.columns 
-                WHERE table_name = 'challans' AND column_name = %s
-            """, (column_name,))
-            existing_col = cursor.fetchone()
-            if not existing_col:
-                # Column doesn't exist, add it
-                cursor.execute(
-                    SQL("ALTER TABLE challans ADD COLUMN {} {}").format(
-                        Identifier(column_name),
-                        SQL(column_type)
-                    )
-                )
-            elif column_name == "party_name":
-                # Always check and upgrade party_name column if it's VARCHAR(50) or smaller
-                try:
-                    max_length = existing_col.get("character_maximum_length") if isinstance(existing_col, dict) else (existing_col[1] if len(existing_col) > 1 else None)
-                    if max_length is not None and max_length < 255:
-                        cursor.execute("ALTER TABLE challans ALTER COLUMN party_name TYPE VARCHAR(255)")
-                        if conn:
-                            conn.commit()  # Commit the ALTER immediately
-                        print(f"✓ Updated challans.party_name column from VARCHAR({max_length}) to VARCHAR(255)")
-                    elif max_length is None:
-                        # Column exists but we couldn't determine length - try to upgrade anyway
-                        try:
-                            cursor.execute("ALTER TABLE challans ALTER COLUMN party_name TYPE VARCHAR(255)")
-                            if conn:
-                                conn.commit()
-                            print(f"✓ Updated challans.party_name column to VARCHAR(255)")
-                        except Exception:
-                            pass
-                except Exception as alter_err:
-                    print(f"Warning: Could not alter challans.party_name column size: {alter_err}")
-                    import traceback
-                    traceback.print_exc()
-            elif column_name in ["station_name", "transport_name"]:
-                # Also ensure station_name and transport_name are VARCHAR(255)
-                try:
-                    max_length = existing_col.get("character_maximum_length") if isinstance(existing_col, dict) else (existing_col[1] if len(existing_col) > 1 else None)
-                    if max_length is not None and max_length < 255:
-                        cursor.execute(f"ALTER TABLE challans ALTER COLUMN {column_name} TYPE VARCHAR(255)")
-                        if conn:
-                            conn.commit()
-                        print(f"✓ Updated challans.{column_name} column from VARCHAR({max_length}) to VARCHAR(255)")
-                    elif max_length is None:
-                        # Try to upgrade anyway if we can't determine length
-                        try:
-                            cursor.execute(f"ALTER TABLE challans ALTER COLUMN {column_name} TYPE VARCHAR(255)")
-                            if conn:
-                                conn.commit()
-                            print(f"✓ Updated challans.{column_name} column to VARCHAR(255)")
-                        except Exception:
-                            pass
-                except Exception as alter_err:
-                    print(f"Warning: Could not alter challans.{column_name} column size: {alter_err}")
-                    import traceback
-                    traceback.print_exc()
-        except Exception as e:
-            print(f"Warning: Could not add/check column {column_name} to challans table: {e}")
-    
-    # ALWAYS run migration check after ensuring columns exist
-    if conn:
-        try:
-            _migrate_varchar_columns(cursor, conn)
-        except Exception as migrate_err:
-            print(f"Warning: Migration check failed in ensure_challan_tables: {migrate_err}")
-            import traceback
-            traceback.print_exc()
-    
-    challan_item_columns = [
-        ("challan_id", "INTEGER"),
-        ("product_id", "INTEGER"),
-        ("product_name", "VARCHAR(500)"),
-        ("size_id", "INTEGER"),
-        ("size_text", "VARCHAR(100)"),
-        ("quantity", "NUMERIC(12, 2) DEFAULT 1"),
-        ("unit_price", "NUMERIC(12, 2) DEFAULT 0"),
-        ("total_price", "NUMERIC(12, 2) DEFAULT 0"),
-        ("qr_code", "TEXT"),
-        ("created_at", "TIMESTAMP DEFAULT CURRENT_TIMESTAMP"),
-    ]
-    for column_name, column_type in challan_item_columns:
-        try:
-            # Check if column exists first
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'challan_items' AND column_name = %s
-            """, (column_name,))
-            if not cursor.fetchone():
-                # Column doesn't exist, add it
-                cursor.execute(
-                    SQL("ALTER TABLE challan_items ADD COLUMN {} {}").format(
-                        Identifier(column_name),
-                        SQL(column_type)
-                    )
-                )
-        except Exception as e:
-            print(f"Warning: Could not add column {column_name} to challan_items table: {e}")
 
 def generate_challan_number(cursor, party_name: str = None) -> str:
     """
@@ -626,118 +238,90 @@ def generate_challan_number(cursor, party_name: str = None) -> str:
     When challan is finalized, party name is removed leaving just DC000001
     Starts from DC000001 (not DC000000)
     """
-    # Advisory lock so only one transaction generates at a time (prevents duplicate DC numbers)
-    cursor.execute("SELECT pg_advisory_xact_lock(8247)")
-    # Get full party name (uppercase)
     if not party_name:
         party_name = "UNKNOWN"  # Default fallback
     party_name_upper = party_name.strip().upper()
-    
-    # Find the highest existing DC sequence number across ALL challans (global sequence)
-    # Check both formats: "DC000001" and "PARTY_NAME - DC000001"
-    max_sequence = 0  # Start from 0 so first challan becomes DC000001
-    try:
-        # Use regex to extract DC numbers from all challans and find the maximum
-        # This matches both "DC000001" and "PARTY_NAME - DC000001" formats
-        # FOR UPDATE locks the row so concurrent requests get unique sequence numbers
-        cursor.execute("""
-            SELECT challan_number 
-            FROM challans 
-            WHERE challan_number ~ 'DC[0-9]+$' OR challan_number ~ ' - DC[0-9]+$'
-            ORDER BY 
-                CAST(
-                    COALESCE(
-                        SUBSTRING(challan_number FROM 'DC([0-9]+)$'),
-                        SUBSTRING(challan_number FROM ' - DC([0-9]+)$')
-                    ) AS INTEGER
-                ) DESC
-            LIMIT 1
-            FOR UPDATE
-        """)
-        result = cursor.fetchone()
-        
-        if result:
-            existing_number = result.get('challan_number') if isinstance(result, dict) else result[0]
-            if existing_number:
-                try:
-                    # Extract the DC sequence part using regex
-                    # Matches both "DC000001" and "PARTY_NAME - DC000001"
-                    match = re.search(r'(?: - )?DC(\d+)$', existing_number)
-                    if match:
-                        sequence_str = match.group(1)
-                        sequence_num = int(sequence_str)
-                        max_sequence = sequence_num
-                except (ValueError, AttributeError) as e:
-                    print(f"Warning: Could not parse DC sequence from {existing_number}: {e}")
-    except Exception as e:
-        print(f"Warning: Could not find existing challan numbers: {e}")
-        # Fallback: try simpler query
-        try:
-            cursor.execute("""
-                SELECT challan_number 
-                FROM challans 
-                WHERE challan_number LIKE '%DC%'
-                ORDER BY challan_number DESC
-                LIMIT 100
-            """)
-            results = cursor.fetchall()
-            
-            for result in results:
-                existing_number = result.get('challan_number') if isinstance(result, dict) else result[0]
-                if existing_number:
-                    try:
-                        # Extract the sequence part from either format
-                        if ' - DC' in existing_number:
-                            # Format: "PARTY_NAME - DC000001"
-                            dc_part = existing_number.split(' - DC')[-1].strip()
-                            if dc_part.startswith('DC'):
-                                sequence_str = dc_part[2:]  # Remove "DC" prefix
-                                sequence_num = int(sequence_str)
-                                if sequence_num > max_sequence:
-                                    max_sequence = sequence_num
-                        elif existing_number.startswith('DC'):
-                            # Format: "DC000001"
-                            sequence_str = existing_number[2:]  # Remove "DC" prefix
-                            sequence_num = int(sequence_str)
-                            if sequence_num > max_sequence:
-                                max_sequence = sequence_num
-                    except (ValueError, IndexError):
-                        continue
-        except Exception as e2:
-            print(f"Warning: Fallback query also failed: {e2}")
-            max_sequence = 0  # Start from 0 so first challan becomes DC000001
-    
-    # Generate a unique number by incrementing the global DC sequence
-    # Format: DC000001..DC999999, then DC1000000, DC1000001... (no limit)
-    max_attempts = 1000  # Safety limit
-    for attempt in range(max_attempts):
-        sequence_num = max_sequence + attempt + 1
-        sequence_str = str(sequence_num).zfill(6) if sequence_num <= 999999 else str(sequence_num)
-        dc_series = f"DC{sequence_str}"  # DC000001..DC999999, DC1000000+
-        challan_number = f"{party_name_upper} - {dc_series}"  # SAGAR - DC000001, etc.
-        
-        # Check if this number already exists
-        try:
-            cursor.execute("""
-                SELECT id FROM challans WHERE challan_number = %s
-            """, (challan_number,))
-            exists = cursor.fetchone()
-            if not exists:
-                return challan_number
-        except Exception as e:
-            # If there's an error checking, assume it's safe to use
-            print(f"Warning: Could not check challan number existence: {e}")
-            return challan_number
-    
-    # Fallback: use timestamp if we can't find a unique sequence
-    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return f"{party_name_upper} - DC{timestamp[-6:]}"
+    return f"{party_name_upper} - {format_dc_series(next_dc_sequence(cursor))}"
+
+
+def next_order_number(cursor) -> str:
+    """Allocate the next DJ-XXXXXX order number from order_number_seq (migration 0007)."""
+    cursor.execute("SELECT nextval('order_number_seq') AS seq")
+    row = cursor.fetchone()
+    sequence_num = row["seq"] if isinstance(row, dict) else row[0]
+    return f"DJ-{str(sequence_num).zfill(6)}"
+
+
+# Claim the lowest reusable DJ- number by deleting its placeholder row. SKIP LOCKED
+# lets concurrent submissions each claim a different row (or fall through to nextval)
+# instead of reading the same one; the partial index (migration 0020) keeps it an
+# index lookup.
+_CLAIM_INCOMPLETE_ORDER_SQL = """
+    DELETE FROM orders
+    WHERE ctid = (
+        SELECT ctid
+        FROM orders
+        WHERE product_id IS NULL
+          AND total_price = 0
+          AND order_number LIKE 'DJ-%'
+        ORDER BY order_number
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING order_number
+"""
+
+
+def claim_incomplete_order_number(cursor):
+    """
+    DJ- number of an incomplete order (no items), removed so the caller can re-insert it;
+    None when there is none. Runs in the caller's transaction.
+    """
+    cursor.execute(_CLAIM_INCOMPLETE_ORDER_SQL)
+    row = cursor.fetchone()
+    if not row:
+        return None
+    order_number = row["order_number"]
+    # Any duplicate placeholder rows for the same number go with it
+    cursor.execute("""
+        DELETE FROM orders
+        WHERE order_number = %s
+          AND product_id IS NULL
+          AND total_price = 0
+    """, (order_number,))
+    return order_number
+
+
 def decimal_to_float(value):
     if isinstance(value, Decimal):
         return float(value)
     return value
 
 
+def _int_or_none(value):
+    try:
+        return int(value) if value not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _item_id(item: dict, field: str, position: int):
+    """Integer id from a challan item field (None when empty); 400 for anything else."""
+    value = item.get(field)
+    if value in (None, ""):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    raise HTTPException(
+        status_code=400,
+        detail=f"Item {position}: invalid {field} {value!r} (expected an integer id)"
+    )
+
+
 def _json_serializable(value):
     """Convert a value to something JSON-serializable (avoids 500 on GET challan)."""
     if value is None:
@@ -754,144 +338,37 @@ def _json_serializable(value):
         return value
     return str(value)
 
-def process_designs_field(designs_data):
-    """
-    Process designs field from database to extract design names/codes as a list of strings.
-    Handles various formats: dict with 'designs' key, JSON string, list of objects, list of strings.
-    """
-    if designs_data is None:
-        return []
-    
+def _row_items(row):
     try:
-        # If it's a dict, check for 'designs' key first (most common case from database)
-        if isinstance(designs_data, dict):
-            if 'designs' in designs_data:
-                designs_list = designs_data['designs']
-                if isinstance(designs_list, list) and len(designs_list) > 0:
-                    # If it's a list of dicts, extract design_name or design_code
-                    if isinstance(designs_list[0], dict):
-                        result = []
-                        for d in designs_list:
-                            if isinstance(d, dict):
-                                design_name = d.get('design_name') or d.get('design_code') or d.get('name')
-                                if design_name:
-                                    result.append(str(design_name))
-                        return result
-                    # If it's a list of strings, return as is
-                    elif isinstance(designs_list[0], str):
-                        return designs_list
-                elif isinstance(designs_list, list):
-                    return []
-            # If dict doesn't have 'designs' key, try to extract values
-            if 'design' in designs_data:
-                design_val = designs_data['design']
-                if isinstance(design_val, list):
-                    return [str(d) for d in design_val]
-                return [str(design_val)]
-        
-        # If it's already a list
-        if isinstance(designs_data, list):
-            if len(designs_data) == 0:
-                return []
-            # Check if it's a list of strings
-            if isinstance(designs_data[0], str):
-                return designs_data
-            # If it's a list of dicts, extract design_name or design_code
-            if isinstance(designs_data[0], dict):
-                result = []
-                for d in designs_data:
-                    if isinstance(d, dict):
-                        design_name = d.get('design_name') or d.get('design_code') or d.get('name')
-                        if design_name:
-                            result.append(str(design_name))
-                return result
-        
-        # If it's a string, try to parse as JSON
-        if isinstance(designs_data, str):
-            try:
-                parsed = json.loads(designs_data)
-                return process_designs_field(parsed)  # Recursively process parsed JSON
-            except (json.JSONDecodeError, TypeError):
-                # If parsing fails, treat as comma-separated string
-                return [d.strip() for d in designs_data.split(',') if d.strip()]
-        
-        # Fallback: convert to string
-        return [str(designs_data)]
+        return dict(row).items()
     except Exception as e:
-        print(f"Error processing designs field: {e}, type: {type(designs_data)}, value: {designs_data}")
-        import traceback
-        traceback.print_exc()
-        return []
+        print(f"serialize_challan: dict(row) failed: {e}")
+        return ((k, getattr(row, k, None)) for k in getattr(row, "_fields", []) or [])
+
 
 def serialize_challan(challan_row, items: List[Dict[str, Any]] = None):
+    """Challan row (+ item rows) as JSON-ready primitives, converted in a single pass."""
     if not challan_row:
         return None
-    try:
-        challan = dict(challan_row)
-    except Exception as e:
-        print(f"serialize_challan: dict(challan_row) failed: {e}")
-        challan = {k: getattr(challan_row, k, None) for k in getattr(challan_row, "_fields", []) or []}
-    challan["total_amount"] = decimal_to_float(challan.get("total_amount"))
-    challan["total_quantity"] = decimal_to_float(challan.get("total_quantity"))
-    if challan.get("created_at") is not None:
-        challan["created_at"] = _json_serializable(challan["created_at"])
-    if challan.get("updated_at") is not None:
-        challan["updated_at"] = _json_serializable(challan["updated_at"])
-    if challan.get("metadata") is not None:
-        v = challan["metadata"]
-        if isinstance(v, str):
+    challan = {}
+    for key, value in _row_items(challan_row):
+        if key == "metadata" and isinstance(value, str):
             try:
-                challan["metadata"] = json.loads(v)
+                challan[key] = json.loads(value)
             except (TypeError, json.JSONDecodeError):
-                challan["metadata"] = None
+                challan[key] = None
         else:
-            challan["metadata"] = _json_serializable(v)
+            challan[key] = _json_serializable(value)
+    challan.setdefault("total_amount", None)
+    challan.setdefault("total_quantity", None)
     serialized_items = []
-    if items:
-        for item in items:
-            try:
-                item_dict = dict(item)
-            except Exception:
-                item_dict = {k: getattr(item, k, None) for k in getattr(item, "_fields", []) or []}
-            item_dict["quantity"] = decimal_to_float(item_dict.get("quantity"))
-            item_dict["unit_price"] = decimal_to_float(item_dict.get("unit_price"))
-            item_dict["total_price"] = decimal_to_float(item_dict.get("total_price"))
-            serialized_items.append(_json_serializable(item_dict))
+    for item in items or []:
+        item_dict = {key: _json_serializable(value) for key, value in _row_items(item)}
+        for key in ("quantity", "unit_price", "total_price"):
+            item_dict.setdefault(key, None)
+        serialized_items.append(item_dict)
     challan["items"] = serialized_items
-    return _json_serializable(challan)
-
-def fetch_distinct_values(cursor, table: str, column: str, limit: int = 100) -> List[str]:
-    """
-    Safely fetch distinct values from a table column.
-    Validates table and column names to prevent SQL injection.
-    """
-    try:
-        # Validate table and column names (only allow alphanumeric and underscore)
-        import re
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', table):
-            raise ValueError(f"Invalid table name: {table}")
-        if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', column):
-            raise ValueError(f"Invalid column name: {column}")
-        
-        # Use psycopg's identifier quoting for safety
-        query = SQL("""
-            SELECT DISTINCT {column} AS value
-            FROM {table}
-            WHERE {column} IS NOT NULL AND {column} <> ''
-            ORDER BY {column}
-            LIMIT %s
-        """).format(
-            column=Identifier(column),
-            table=Identifier(table)
-        )
-        cursor.execute(query, (limit,))
-        return [
-            str(row["value"]) for row in cursor.fetchall() 
-            if row and row.get("value") is not None
-        ]
-    except Exception as e:
-        print(f"Warning: Could not fetch distinct values for {table}.{column}: {e}")
-        return []
+    return challan
 
 class ProductResponse(BaseModel):
     id: int = None
@@ -938,19 +415,8 @@ def cleanup_finalized_challan_numbers(cursor):
                         """, (new_number, challan_id))
                         existing = cursor.fetchone()
                         if existing:
-                            # Conflict: find next available DC number
-                            cursor.execute("""
-                                SELECT challan_number 
-                                FROM challans 
-                                WHERE challan_number ~ '^DC[0-9]+$'
-                                ORDER BY CAST(SUBSTRING(challan_number FROM 'DC([0-9]+)$') AS INTEGER) DESC
-                                LIMIT 1
-                            """)
-                            max_result = cursor.fetchone()
-                            if max_result:
-                                max_dc = max_result['challan_number'] if isinstance(max_result, dict) else max_result[0]
-                                max_num = int(max_dc[2:])  # Remove 'DC' prefix
-                                new_number = f'DC{str(max_num + 1).zfill(6)}'
+                            # Conflict: allocate a fresh DC number
+                            new_number = format_dc_series(next_dc_sequence(cursor))
                         
                         cursor.execute("""
                             UPDATE challans
@@ -1095,151 +561,205 @@ def health_check():
         return {
             "status": "healthy",
             "database": "connected",
-            "message": "API and database are running"
+            "message": "API and database are running",
+            "pool": get_pool_stats(),
+            "schema": schema_registry.status(),
+            "catalog": catalog_index.status(),
+            "barcodes": code_resolver.status(),
+            "caches": cache_stats(),
+            "cache_bus": cache_listener.status()
         }
     except Exception as e:
         return {
             "status": "unhealthy",
             "database": "disconnected",
-            "error": str(e)
+            "error": str(e),
+            "pool": get_pool_stats()
         }
 
+@app.get("/api/health/pool")
+def pool_stats():
+    """
+    Connection pool statistics for monitoring (size, available, waiting requests, timeouts).
+    """
+    stats = get_pool_stats()
+    if ASYNC_READS:
+        stats["async"] = get_async_pool_stats()
+    return stats
+
+
+@app.post("/api/catalog/refresh")
+def refresh_catalog(full: bool = False):
+    """
+    Refresh the in-memory product catalog index now (full=true rebuilds it from scratch).
+    Use after bulk product imports that should be visible before CATALOG_MAX_STALENESS.
+    """
+    try:
+        catalog_index.refresh(full=full)
+        code_resolver.clear()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Catalog refresh failed: {str(e)}")
+    return catalog_index.status()
+
 @app.get("/api/product/{product_id}")
 def get_product_by_id(product_id: int):
     """
-    Retrieve product details by ID from products_master with all sizes
+    Retrieve product details by ID from products_master with all sizes (served from the catalog index)
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        # Get product from products_master
-        cursor.execute("""
-            SELECT 
-                pm.id,
-                pm.external_id,
-                pm.name,
-                pm.category_id,
-                pm.category as category_name,
-                pm.image as image_url,
-                pm.video as video_url,
-                pm.is_active,
-                pm.created_on as created_at,
-                pm.updated_at,
-                pm.designs,
-                pc.qr_code
-            FROM products_master pm
-            LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
-            WHERE pm.id = %s AND pm.is_active = true
-        """, (product_id,))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        product_dict = {
-            'id': product['id'],
-            'external_id': product['external_id'],
-            'name': product['name'],
-            'category_id': product['category_id'],
-            'category_name': product['category_name'],
-            'image_url': product['image_url'],
-            'video_url': product['video_url'],
-            'qr_code': product['qr_code'],
-            'is_active': product['is_active'],
-            'created_at': product['created_at'],
-            'updated_at': product['updated_at'],
-            'designs': product.get('designs')
-        }
-        
-        # Get sizes for this product - check both direct (product_type='master') and via product_catalog
-        sizes_list = []
-        product_id_val = product['id']
-        
-        # First, check for sizes directly linked to products_master (product_id = products_master.id, product_type = 'master')
-        cursor.execute("""
-            SELECT 
-                id,
-                size_id,
-                size_text,
-                price_a,
-                price_b,
-                price_c,
-                price_d,
-                price_e,
-                price_r,
-                is_active
-            FROM product_sizes
-            WHERE product_id = %s AND product_type = 'master' AND is_active = true
-            ORDER BY id
-        """, (product_id_val,))
-        
-        direct_sizes = cursor.fetchall()
-        for size in direct_sizes:
-            size_dict = {
-                'id': size['id'],
-                'size_id': size['size_id'],
-                'size_text': size['size_text'],
-                'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                'is_active': size['is_active']
-            }
-            sizes_list.append(size_dict)
-        
-        # If no direct sizes found, check via product_catalog
-        if not sizes_list and product['external_id']:
-            cursor.execute("""
-                SELECT 
-                    ps.id,
-                    ps.size_id,
-                    ps.size_text,
-                    ps.price_a,
-                    ps.price_b,
-                    ps.price_c,
-                    ps.price_d,
-                    ps.price_e,
-                    ps.price_r,
-                    ps.is_active
-                FROM product_sizes ps
-                JOIN product_catalog pc ON ps.product_id = pc.id
-                WHERE pc.external_id = %s AND ps.is_active = true
-                ORDER BY ps.size_id
-            """, (product['external_id'],))
-            
-            catalog_sizes = cursor.fetchall()
-            for size in catalog_sizes:
-                size_dict = {
-                    'id': size['id'],
-                    'size_id': size['size_id'],
-                    'size_text': size['size_text'],
-                    'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                    'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                    'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                    'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                    'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                    'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                    'is_active': size['is_active']
-                }
-                sizes_list.append(size_dict)
-        
-        product_dict['sizes'] = sizes_list
-        
-        return product_dict
-            
-    except HTTPException:
-        raise
+        entry = catalog_index.snapshot().get(product_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return entry.detail
+
+
+def resolve_order_items(cursor, items: List[Dict[str, Any]]) -> List[dict]:
+    """
+    Resolve every order item to a product with the same precedence as the old per-item
+    lookups, but with one set-based query per step for the whole item list; each step
+    only looks at the items that are still unresolved. Steps (resolved_by):
+      catalog_id         product_catalog.id = product_id
+      master_to_catalog  products_master.id -> external_id -> product_catalog
+      external_id        product_catalog.external_id = product_external_id
+      name_exact         product_catalog.name = product_name
+      name_ci            LOWER(TRIM(name)) match
+      name_like          LOWER(name) LIKE %product_name%
+      products_master    products_master row without an active catalog row
+
+    Mobile app sends `product_id` from `products_master.id`; `product_catalog.id` is a
+    different sequence but shares `external_id` with `products_master.external_id`.
+
+    Returns one diagnostic dict per item, in payload order: index, requested_product_id,
+    product_id, product_external_id, product_name, resolved_by (step name or None),
+    status ("resolved" / "skipped") and reason.
+    """
+    results = [
+        {
+            "index": idx,
+            "requested_product_id": item.get("product_id"),
+            "product_id": None,
+            "product_external_id": None,
+            "product_name": item.get("product_name"),
+            "resolved_by": None,
+            "status": "skipped",
+            "reason": None if item.get("product_id") else "Missing product_id",
+        }
+        for idx, item in enumerate(items)
+    ]
+
+    def pending():
+        return [r for r in results if r["resolved_by"] is None and r["reason"] is None]
+
+    def resolve(result, row, step, product_id=None):
+        result["product_id"] = product_id if product_id is not None else row["id"]
+        result["product_external_id"] = row.get("external_id")
+        result["product_name"] = row.get("name") or result["product_name"]
+        result["resolved_by"] = step
+        result["status"] = "resolved"
+
+    def requested_id(result):
+        return _int_or_none(result["requested_product_id"])
+
+    def external_id(result):
+        return _int_or_none(items[result["index"]].get("product_external_id"))
+
+    def lookup_name(result):
+        return (items[result["index"]].get("product_name") or "").strip()
+
+    def run_step(step, sql, key_of, row_key, keep_requested_id=False):
+        keys = {key_of(r) for r in pending()} - {None, ""}
+        if not keys:
+            return
+        cursor.execute(sql, (list(keys),))
+        found = {row[row_key]: row for row in cursor.fetchall()}
+        for r in pending():
+            row = found.get(key_of(r))
+            if row:
+                resolve(r, row, step, product_id=r["requested_product_id"] if keep_requested_id else None)
+
+    run_step("catalog_id", """
+        SELECT id, external_id, name
+        FROM product_catalog
+        WHERE id = ANY(%s) AND is_active = true
+    """, requested_id, "id", keep_requested_id=True)
+    run_step("master_to_catalog", """
+        SELECT DISTINCT ON (pm.id) pm.id AS master_id, pc.id, pc.external_id, pc.name
+        FROM products_master pm
+        JOIN product_catalog pc ON pm.external_id = pc.external_id
+        WHERE pm.id = ANY(%s) AND pc.is_active = true
+        ORDER BY pm.id, pc.id
+    """, requested_id, "master_id")
+    run_step("external_id", """
+        SELECT DISTINCT ON (external_id) id, external_id, name
+        FROM product_catalog
+        WHERE external_id = ANY(%s) AND is_active = true
+        ORDER BY external_id, id
+    """, external_id, "external_id")
+    for step, condition in (
+        ("name_exact", "pc.name = t.name"),
+        ("name_ci", "LOWER(TRIM(pc.name)) = LOWER(TRIM(t.name))"),
+        ("name_like", "LOWER(pc.name) LIKE LOWER('%%' || t.name || '%%')"),
+    ):
+        run_step(step, f"""
+            SELECT DISTINCT ON (t.name) t.name AS lookup, pc.id, pc.external_id, pc.name
+            FROM unnest(%s::text[]) AS t(name)
+            JOIN product_catalog pc ON {condition}
+            WHERE pc.is_active = true
+            ORDER BY t.name, pc.id
+        """, lookup_name, "lookup")
+    # Accept the products_master row even if no active catalog row exists, so order
+    # creation is not blocked when product_catalog is incomplete/out-of-sync
+    run_step("products_master", """
+        SELECT id, external_id, name
+        FROM products_master
+        WHERE id = ANY(%s)
+    """, requested_id, "id", keep_requested_id=True)
+
+    for r in pending():
+        r["reason"] = "Product not found in products master/catalog"
+    return results
+
+
+_ORDER_ITEMS_BULK_INSERT_SQL = """
+    INSERT INTO orders (
+        order_number,
+        party_name,
+        station,
+        price_category,
+        customer_name,
+        customer_phone,
+        customer_email,
+        customer_address,
+        order_status,
+        payment_status,
+        payment_method,
+        notes,
+        created_by,
+        product_id,
+        product_external_id,
+        product_name,
+        size_id,
+        size_text,
+        quantity,
+        unit_price,
+        total_price
+    )
+    SELECT %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+           product_id, product_external_id, product_name, size_id, size_text,
+           quantity, unit_price, total_price
+    FROM unnest(
+        %s::integer[], %s::integer[], %s::text[], %s::integer[], %s::text[],
+        %s::integer[], %s::numeric[], %s::numeric[]
+    ) WITH ORDINALITY AS t(
+        product_id, product_external_id, product_name, size_id, size_text,
+        quantity, unit_price, total_price, ord
+    )
+    ORDER BY ord
+    RETURNING id, order_number, created_at
+"""
+
 
 @app.post("/api/order/multiple")
 def create_order_with_multiple_items(order_data: dict):
@@ -1269,89 +789,8 @@ def create_order_with_multiple_items(order_data: dict):
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
         
-        # Ensure orders table exists with order_number column
-        ensure_orders_table(cursor)
-        conn.commit()
-        
-        # Create order_items table if it doesn't exist
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS order_items (
-                    id SERIAL PRIMARY KEY,
-                    order_id INTEGER REFERENCES orders(id) ON DELETE CASCADE,
-                    product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
-                    product_external_id INTEGER,
-                    product_name VARCHAR(500),
-                    size_id INTEGER,
-                    size_text VARCHAR(100),
-                    quantity INTEGER NOT NULL DEFAULT 1,
-                    unit_price DECIMAL(12, 2),
-                    total_price DECIMAL(12, 2) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id)
-            """)
-            conn.commit()
-        except Exception as table_error:
-            print(f"Note: order_items table may already exist: {table_error}")
-        
-        # Ensure required columns exist in orders table
-        try:
-            # Check and add price_category
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'orders' AND column_name = 'price_category'
-            """)
-            has_price_category = cursor.fetchone() is not None
-            
-            if not has_price_category:
-                print("Adding price_category column to orders table...")
-                cursor.execute("""
-                    ALTER TABLE orders 
-                    ADD COLUMN price_category VARCHAR(100)
-                """)
-                conn.commit()
-                print("Successfully added price_category column to orders table")
-            
-            # Check and add transport_name
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'orders' AND column_name = 'transport_name'
-            """)
-            has_transport_name = cursor.fetchone() is not None
-            
-            if not has_transport_name:
-                print("Adding transport_name column to orders table...")
-                cursor.execute("""
-                    ALTER TABLE orders 
-                    ADD COLUMN transport_name VARCHAR(255)
-                """)
-                conn.commit()
-                print("Successfully added transport_name column to orders table")
-            
-            # Check and add created_by
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'orders' AND column_name = 'created_by'
-            """)
-            has_created_by = cursor.fetchone() is not None
-            
-            if not has_created_by:
-                print("Adding created_by column to orders table...")
-                cursor.execute("""
-                    ALTER TABLE orders 
-                    ADD COLUMN created_by VARCHAR(255)
-                """)
-                conn.commit()
-                print("Successfully added created_by column to orders table")
-        except Exception as col_error:
-            print(f"Warning: Could not check/add columns: {col_error}")
-            conn.rollback()
+        # Orders schema is verified once per process (see schema_registry)
+        schema_registry.ensure("orders", cursor)
         
         # Check if order_number is provided (for updating existing order)
         order_number = order_data.get("order_number")
@@ -1366,64 +805,16 @@ def create_order_with_multiple_items(order_data: dict):
         # Generate order number if not provided or doesn't exist
         if not order_number or not order_exists:
             try:
-                # First, check for incomplete orders (orders with no items) to reuse
-                # An incomplete order has product_id IS NULL and total_price = 0
-                # Only check for DJ- prefix orders
-                cursor.execute("""
-                    SELECT DISTINCT order_number 
-                    FROM orders 
-                    WHERE order_number LIKE 'DJ-%'
-                      AND product_id IS NULL 
-                      AND total_price = 0
-                    ORDER BY order_number ASC
-                    LIMIT 1
-                """)
-                incomplete_order = cursor.fetchone()
-                
-                if incomplete_order:
-                    # Reuse the incomplete order number (only if it's DJ- prefix)
-                    incomplete_number = incomplete_order[0] if isinstance(incomplete_order, (tuple, list)) else incomplete_order.get('order_number')
-                    if incomplete_number and incomplete_number.startswith('DJ-'):
-                        order_number = incomplete_number
-                        order_exists = True
-                        print(f"Reusing incomplete order number: {order_number}")
-                
-                # If no incomplete order found, generate a new one
-                if not order_number or not order_exists:
-                    # Find the highest sequence number for DJ- prefix only
-                    cursor.execute("""
-                        SELECT order_number 
-                        FROM orders 
-                        WHERE order_number LIKE 'DJ-%'
-                        ORDER BY order_number DESC
-                        LIMIT 1
-                    """)
-                    result = cursor.fetchone()
-                    max_sequence = 0
-                    if result:
-                        existing_number = result[0] if isinstance(result, (tuple, list)) else result.get('order_number')
-                        if existing_number and existing_number.startswith('DJ-'):
-                            try:
-                                sequence_part = existing_number.split('-')[1]
-                                max_sequence = int(sequence_part)
-                            except (ValueError, IndexError):
-                                max_sequence = 0
-                    
-                    # Generate new order number with DJ- prefix
-                    order_number = f"DJ-{str(max_sequence + 1).zfill(6)}"
-                    
-                    # Ensure uniqueness
-                    max_attempts = 1000
-                    for attempt in range(max_attempts):
-                        cursor.execute("SELECT id FROM orders WHERE order_number = %s", (order_number,))
-                        exists = cursor.fetchone()
-                        if not exists:
-                            break
-                        order_number = f"DJ-{str(max_sequence + attempt + 2).zfill(6)}"
+                # Reuse the number of an incomplete order (no items) if one can be claimed;
+                # its placeholder row is deleted, so the order is inserted below as new
+                order_number = claim_incomplete_order_number(cursor)
+                if order_number:
+                    print(f"Reusing incomplete order number: {order_number}")
+                else:
+                    order_number = next_order_number(cursor)
             except Exception as e:
-                from datetime import datetime
-                # Fallback: use timestamp-based number
-                order_number = f"DJ-{datetime.now().strftime('%Y%m%d%H%M%S')[:6]}"
+                print(f"Error generating order number: {e}")
+                raise HTTPException(status_code=500, detail=f"Could not generate order number: {e}")
         
         # Calculate total price for all items
         total_order_price = 0.0
@@ -1500,215 +891,58 @@ def create_order_with_multiple_items(order_data: dict):
                         "order_number": result["order_number"],
                         "created_at": result["created_at"]
                     })
-                conn.commit()
+                # Committed (with the party profile refresh) on the common path below
             except Exception as e:
                 conn.rollback()
                 raise HTTPException(status_code=500, detail=f"Failed to create order: {str(e)}")
         
-        skipped_items = []
-        print(f"DEBUG: Processing {len(items)} items for order")
-        for idx, item in enumerate(items):
-            print(f"DEBUG: Item {idx}: {item}")
-            product_id = item.get("product_id")
-            print(f"DEBUG: Item {idx} product_id: {product_id} (type: {type(product_id)})")
-            if not product_id:
-                product_name = item.get("product_name", "Unknown")
-                skipped_items.append(f"{product_name}: Missing product_id")
-                print(f"Warning: Item missing product_id: {item}")
-                continue
-            
-            # Get product details
-            #
-            # IMPORTANT:
-            # - Mobile app sends `product_id` from `products_master.id`
-            # - Orders table historically stored `product_id` that matches `products_master.id`
-            # - `product_catalog.id` is a different sequence, but shares `external_id` with `products_master.external_id`
-            #
-            # So: first try `product_catalog.id = product_id` (legacy / admin inputs),
-            # then resolve via products_master.id -> external_id -> product_catalog (best-effort),
-            # and finally fall back to products_master data even if no catalog row exists.
-            cursor.execute("""
-                SELECT id, external_id, name 
-                FROM product_catalog 
-                WHERE id = %s AND is_active = true
-            """, (product_id,))
-            product_info = cursor.fetchone()
-
-            # Fallback 0: resolve products_master.id -> product_catalog by external_id
-            if not product_info:
-                try:
-                    cursor.execute("""
-                        SELECT pc.id, pc.external_id, pc.name
-                        FROM products_master pm
-                        JOIN product_catalog pc ON pm.external_id = pc.external_id
-                        WHERE pm.id = %s
-                          AND pc.is_active = true
-                        LIMIT 1
-                    """, (product_id,))
-                    product_info = cursor.fetchone()
-                    if product_info:
-                        # Keep FK consistent with catalog when available
-                        resolved_catalog_id = product_info["id"] if isinstance(product_info, dict) else None
-                        print(f"Info: Resolved catalog product via products_master.id={product_id} -> catalog_id={resolved_catalog_id}")
-                        product_id = resolved_catalog_id or product_id
-                except Exception as e:
-                    print(f"Warning: Could not resolve via products_master->product_catalog for product_id={product_id}: {e}")
-
-            # Fallback 1: resolve by external_id if provided (frontend should send Product.externalId here)
-            if not product_info:
-                product_external_id = item.get("product_external_id")
-                if product_external_id is not None and str(product_external_id).strip() != "":
-                    try:
-                        cursor.execute("""
-                            SELECT id, external_id, name
-                            FROM product_catalog
-                            WHERE external_id = %s AND is_active = true
-                            LIMIT 1
-                        """, (product_external_id,))
-                        product_info = cursor.fetchone()
-                        if product_info:
-                            # Update product_id to the actual catalog ID (keeps FK consistent)
-                            product_id = product_info["id"] if isinstance(product_info, dict) else product_id
-                            print(f"Info: Resolved product_id via external_id={product_external_id} -> id={product_id}")
-                    except Exception as e:
-                        print(f"Warning: Could not resolve product by external_id={product_external_id}: {e}")
-
-            # Fallback 2: resolve by product_name (last resort) - use case-insensitive matching
-            if not product_info:
-                product_name_for_lookup = (item.get("product_name") or "").strip()
-                if product_name_for_lookup:
-                    try:
-                        # Try exact match first
-                        cursor.execute("""
-                            SELECT id, external_id, name
-                            FROM product_catalog
-                            WHERE name = %s AND is_active = true
-                            LIMIT 1
-                        """, (product_name_for_lookup,))
-                        product_info = cursor.fetchone()
-                        
-                        # If exact match fails, try case-insensitive match
-                        if not product_info:
-                            cursor.execute("""
-                                SELECT id, external_id, name
-                                FROM product_catalog
-                                WHERE LOWER(TRIM(name)) = LOWER(TRIM(%s)) AND is_active = true
-                                LIMIT 1
-                            """, (product_name_for_lookup,))
-                            product_info = cursor.fetchone()
-                        
-                        # If still no match, try partial match (contains)
-                        if not product_info:
-                            cursor.execute("""
-                                SELECT id, external_id, name
-                                FROM product_catalog
-                                WHERE LOWER(name) LIKE LOWER(%s) AND is_active = true
-                                LIMIT 1
-                            """, (f"%{product_name_for_lookup}%",))
-                            product_info = cursor.fetchone()
-                        
-                        if product_info:
-                            product_id = product_info["id"] if isinstance(product_info, dict) else product_id
-                            print(f"Info: Resolved product_id via name='{product_name_for_lookup}' -> id={product_id}")
-                    except Exception as e:
-                        print(f"Warning: Could not resolve product by name='{product_name_for_lookup}': {e}")
-
-            # Final fallback: accept products_master row even if no active catalog row exists.
-            # This prevents order creation from being blocked when product_catalog is incomplete/out-of-sync.
-            products_master_row = None
-            if not product_info:
-                try:
-                    cursor.execute("""
-                        SELECT id, external_id, name
-                        FROM products_master
-                        WHERE id = %s
-                        LIMIT 1
-                    """, (item.get("product_id"),))
-                    products_master_row = cursor.fetchone()
-                    if products_master_row:
-                        print(f"Info: Using products_master for product_id={item.get('product_id')} (no active catalog match)")
-                except Exception as e:
-                    print(f"Warning: Could not lookup products_master for product_id={item.get('product_id')}: {e}")
-
-            if not product_info and not products_master_row:
-                product_name = item.get("product_name", f"Product ID {product_id}")
-                skipped_items.append(f"{product_name}: Product not found in products master/catalog")
-                print(f"Warning: Product {product_id} not found in products_master or product_catalog, skipping")
+        # Resolve all items to products with a few set-based queries
+        print(f"Processing {len(items)} items for order {order_number}")
+        item_results = resolve_order_items(cursor, items) if items else []
+        
+        columns = {
+            "product_id": [], "product_external_id": [], "product_name": [], "size_id": [],
+            "size_text": [], "quantity": [], "unit_price": [], "total_price": [],
+        }
+        inserted_results = []
+        for result in item_results:
+            if result["status"] != "resolved":
+                print(f"Warning: Item {result['index']} skipped: {result['reason']}")
                 continue
-            
-            # Convert product_info to dict for easier access (it's already a dict_row from row_factory)
-            product_dict = dict(product_info) if product_info else {}
-            if not product_dict and products_master_row:
-                # Normalize products_master row to same shape used below
-                product_dict = dict(products_master_row)
-            
+            item = items[result["index"]]
             unit_price = float(item.get("unit_price", 0) or 0)
             quantity = int(float(item.get("quantity", 0) or 0))  # Convert to float first, then int to handle decimal strings
             
             # Validate quantity and unit_price
             if quantity <= 0:
-                product_name = item.get("product_name", f"Product ID {product_id}")
-                skipped_items.append(f"{product_name}: Quantity must be greater than 0 (got {quantity})")
-                print(f"Warning: Item {idx} has invalid quantity: {quantity}")
+                result["status"] = "skipped"
+                result["reason"] = f"Quantity must be greater than 0 (got {quantity})"
                 continue
-            
             if unit_price <= 0:
-                product_name = item.get("product_name", f"Product ID {product_id}")
-                skipped_items.append(f"{product_name}: Unit price must be greater than 0 (got {unit_price})")
-                print(f"Warning: Item {idx} has invalid unit_price: {unit_price}")
+                result["status"] = "skipped"
+                result["reason"] = f"Unit price must be greater than 0 (got {unit_price})"
                 continue
             
-            item_total = unit_price * quantity
-            
-            # Extract values with fallbacks - ensure we have values
-            product_external_id = product_dict.get("external_id") if product_dict.get("external_id") is not None else (item.get("product_external_id") if item.get("product_external_id") is not None else None)
-            product_name = product_dict.get("name") if product_dict.get("name") else (item.get("product_name") if item.get("product_name") else "Unknown Product")
-            size_id = item.get("size_id") if item.get("size_id") is not None else None
-            size_text = item.get("size_text") if item.get("size_text") else ""
-            
-            # Debug logging
-            print(f"Inserting order - product_id={product_id}, product_name={product_name}, product_external_id={product_external_id}, size_id={size_id}, size_text={size_text}, unit_price={unit_price}, quantity={quantity}, item_total={item_total}")
-            
-            # Insert order record for this item
-            cursor.execute("""
-                INSERT INTO orders (
-                    order_number,
-                    party_name,
-                    station,
-                    price_category,
-                    product_id,
-                    product_external_id,
-                    product_name,
-                    size_id,
-                    size_text,
-                    quantity,
-                    unit_price,
-                    total_price,
-                    customer_name,
-                    customer_phone,
-                    customer_email,
-                    customer_address,
-                    order_status,
-                    payment_status,
-                    payment_method,
-                    notes,
-                    created_by
-                )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, order_number, created_at
-            """, (
-                order_number,  # Same order number for all items
+            product_external_id = result["product_external_id"]
+            if product_external_id is None:
+                product_external_id = _int_or_none(item.get("product_external_id"))
+            columns["product_id"].append(_int_or_none(result["product_id"]))
+            columns["product_external_id"].append(product_external_id)
+            columns["product_name"].append(result["product_name"] or "Unknown Product")
+            columns["size_id"].append(_int_or_none(item.get("size_id")))
+            columns["size_text"].append(str(item.get("size_text")) if item.get("size_text") else "")
+            columns["quantity"].append(quantity)
+            columns["unit_price"].append(unit_price)
+            columns["total_price"].append(unit_price * quantity)  # Individual item total
+            inserted_results.append(result)
+        
+        # Insert one order record per valid item (same order number) in a single statement
+        if inserted_results:
+            cursor.execute(_ORDER_ITEMS_BULK_INSERT_SQL, (
+                order_number,
                 order_data.get("party_name"),
                 order_data.get("station"),
-                order_data.get("price_category"),  # Add price_category
-                product_id,
-                product_external_id,
-                product_name,
-                size_id,
-                size_text,
-                quantity,
-                unit_price,
-                item_total,  # Individual item total
+                order_data.get("price_category"),
                 order_data.get("customer_name"),
                 order_data.get("customer_phone"),
                 order_data.get("customer_email"),
@@ -1717,40 +951,48 @@ def create_order_with_multiple_items(order_data: dict):
                 order_data.get("payment_status", "pending"),
                 order_data.get("payment_method"),
                 order_data.get("notes"),
-                order_data.get("created_by", "system")
+                order_data.get("created_by", "system"),
+                *columns.values(),
             ))
-            
-            order_result = cursor.fetchone()
-            if order_result:
+            # ids follow payload order (ORDER BY ord), so sorting by id lines rows up with items
+            order_rows = sorted(cursor.fetchall(), key=lambda row: row["id"])
+            for result, order_result in zip(inserted_results, order_rows):
+                result["status"] = "inserted"
+                result["order_id"] = order_result["id"]
                 order_ids.append(order_result["id"])
                 created_orders.append({
                     "id": order_result["id"],
                     "order_number": order_result["order_number"],
                     "created_at": order_result["created_at"]
                 })
+        skipped_items = [r for r in item_results if r["status"] == "skipped"]
         
         # Allow empty order_ids if items list was empty (order created without items)
         # This happens when creating an order first, then adding items later
         if len(order_ids) == 0 and len(items) > 0:
             if conn:
                 conn.rollback()
-            print(f"ERROR: No valid items added. Total items: {len(items)}, Skipped: {len(skipped_items)}, Order IDs: {len(order_ids)}")
-            print(f"DEBUG: Skipped items details: {skipped_items}")
-            print(f"DEBUG: First few items received: {items[:3] if len(items) > 0 else 'No items'}")
+            print(f"ERROR: No valid items added. Total items: {len(items)}, Skipped: {len(skipped_items)}")
             error_detail = "No valid items were added to the order"
             if skipped_items:
-                error_detail += f". Skipped items: {', '.join(skipped_items[:5])}"  # Show first 5 skipped items
+                summaries = [
+                    f"{r['product_name'] or 'Product ID ' + str(r['requested_product_id'])}: {r['reason']}"
+                    for r in skipped_items[:5]  # Show first 5 skipped items
+                ]
+                error_detail += f". Skipped items: {', '.join(summaries)}"
                 if len(skipped_items) > 5:
                     error_detail += f" (and {len(skipped_items) - 5} more)"
             else:
                 error_detail += ". All items were rejected (check product_id, quantity, and unit_price)"
-            print(f"DEBUG: Error detail to return: {error_detail}")
             raise HTTPException(
                 status_code=400,
                 detail=error_detail
             )
         
+        refresh_party_profile(cursor, order_data.get("party_name"))
         conn.commit()
+        _forget_party_data(order_data.get("party_name"))
+        _forget_challan_options()
         
         # Return first order details (all have same order_number)
         first_order = created_orders[0] if created_orders else None
@@ -1762,7 +1004,9 @@ def create_order_with_multiple_items(order_data: dict):
             "item_count": len(order_ids),
             "order_count": len(order_ids),  # Number of order records created
             "status": "success",
-            "created_at": first_order["created_at"].isoformat() if first_order and first_order["created_at"] else None
+            "created_at": first_order["created_at"].isoformat() if first_order and first_order["created_at"] else None,
+            # Per-item resolution diagnostics (resolved_by step, inserted/skipped, reason)
+            "items": item_results
         }
         
     except HTTPException:
@@ -1770,206 +1014,39 @@ def create_order_with_multiple_items(order_data: dict):
     except Exception as e:
         if conn:
             conn.rollback()
-        import traceback
-        error_trace = traceback.format_exc()
-        print(f"Error creating order with multiple items: {str(e)}")
-        print(f"Traceback: {error_trace}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error creating order: {str(e)}"
-        )
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
-
-@app.get("/api/product/barcode/{barcode:path}")
-def get_product_by_barcode(barcode: str):
-    """
-    Retrieve product details by barcode/QR code from products_master
-    Searches in external_id and qr_code fields
-    Handles URL-encoded barcodes and extracts codes from URLs
-    Uses :path to allow special characters in the barcode
-    """
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        # Decode URL-encoded barcode
-        from urllib.parse import unquote
-        decoded_barcode = unquote(barcode)
-        
-        # If barcode looks like a URL, try to extract the actual code
-        # Handle formats like: http://65.1.12.120/qr?xF2kd3A84m or http://65.1.12.120/qr?code=xF2kd3A84m
-        search_barcodes = [decoded_barcode]
-        
-        if 'http://' in decoded_barcode or 'https://' in decoded_barcode:
-            try:
-                from urllib.parse import urlparse, parse_qs
-                parsed = urlparse(decoded_barcode)
-                # Extract from query parameters
-                if parsed.query:
-                    params = parse_qs(parsed.query)
-                    # If query has no '=' (no key-value pairs), use the query string itself
-                    if '=' not in parsed.query:
-                        search_barcodes.append(parsed.query)
-                    else:
-                        # Try common parameter names
-                        for param_name in ['code', 'id', 'qr', 'barcode']:
-                            if param_name in params and params[param_name]:
-                                search_barcodes.append(params[param_name][0])
-                        # If no named params, get first value
-                        if not any('code' in str(k).lower() or 'id' in str(k).lower() or 'qr' in str(k).lower() for k in params.keys()):
-                            for values in params.values():
-                                if values:
-                                    search_barcodes.append(values[0])
-                                    break
-                # Extract from path (e.g., /qr/xF2kd3A84m)
-                if parsed.path and len(parsed.path) > 1:
-                    path_parts = [p for p in parsed.path.split('/') if p]
-                    if path_parts:
-                        search_barcodes.append(path_parts[-1])
-            except Exception as e:
-                print(f"Warning: Could not parse URL from barcode: {e}")
-        
-        # Remove duplicates and empty strings
-        search_barcodes = list(dict.fromkeys([b for b in search_barcodes if b and b.strip()]))
-        
-        if not search_barcodes:
-            raise HTTPException(status_code=400, detail="Invalid barcode: could not extract barcode from input")
-        
-        # Try to find by external_id or qr_code via product_catalog
-        # Build query with multiple barcode values to try
-        placeholders = ','.join(['%s'] * len(search_barcodes))
-        cursor.execute(f"""
-            SELECT 
-                pm.id,
-                pm.external_id,
-                pm.name,
-                pm.category_id,
-                pm.category as category_name,
-                pm.image as image_url,
-                pm.video as video_url,
-                pm.is_active,
-                pm.created_on as created_at,
-                pm.updated_at,
-                pm.designs,
-                pc.qr_code
-            FROM products_master pm
-            LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
-            WHERE (pm.external_id::text IN ({placeholders}) OR pc.qr_code IN ({placeholders})) 
-            AND pm.is_active = true
-            LIMIT 1
-        """, tuple(search_barcodes + search_barcodes))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        product_id = product['id']
-        product_dict = {
-            'id': product_id,
-            'external_id': product['external_id'],
-            'name': product['name'],
-            'category_id': product['category_id'],
-            'category_name': product['category_name'],
-            'image_url': product['image_url'],
-            'video_url': product['video_url'],
-            'qr_code': product['qr_code'],
-            'is_active': product['is_active'],
-            'created_at': product['created_at'],
-            'updated_at': product['updated_at'],
-            'designs': product.get('designs')
-        }
-        
-        # Get sizes for this product - check both direct (product_type='master') and via product_catalog
-        sizes_list = []
-        
-        # First, check for sizes directly linked to products_master (product_id = products_master.id, product_type = 'master')
-        cursor.execute("""
-            SELECT 
-                id,
-                size_id,
-                size_text,
-                price_a,
-                price_b,
-                price_c,
-                price_d,
-                price_e,
-                price_r,
-                is_active
-            FROM product_sizes
-            WHERE product_id = %s AND product_type = 'master' AND is_active = true
-            ORDER BY id
-        """, (product_id,))
-        
-        direct_sizes = cursor.fetchall()
-        for size in direct_sizes:
-            size_dict = {
-                'id': size['id'],
-                'size_id': size['size_id'],
-                'size_text': size['size_text'],
-                'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                'is_active': size['is_active']
-            }
-            sizes_list.append(size_dict)
-        
-        # If no direct sizes found, check via product_catalog
-        if not sizes_list and product['external_id']:
-            cursor.execute("""
-                SELECT 
-                    ps.id,
-                    ps.size_id,
-                    ps.size_text,
-                    ps.price_a,
-                    ps.price_b,
-                    ps.price_c,
-                    ps.price_d,
-                    ps.price_e,
-                    ps.price_r,
-                    ps.is_active
-                FROM product_sizes ps
-                JOIN product_catalog pc ON ps.product_id = pc.id
-                WHERE pc.external_id = %s AND ps.is_active = true
-                ORDER BY ps.size_id
-            """, (product['external_id'],))
-            
-            catalog_sizes = cursor.fetchall()
-            for size in catalog_sizes:
-                size_dict = {
-                    'id': size['id'],
-                    'size_id': size['size_id'],
-                    'size_text': size['size_text'],
-                    'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                    'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                    'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                    'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                    'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                    'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                    'is_active': size['is_active']
-                }
-                sizes_list.append(size_dict)
-        
-        product_dict['sizes'] = sizes_list
-        
-        return product_dict
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        import traceback
+        error_trace = traceback.format_exc()
+        print(f"Error creating order with multiple items: {str(e)}")
+        print(f"Traceback: {error_trace}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating order: {str(e)}"
+        )
     finally:
         if conn:
             cursor.close()
             conn.close()
 
+@app.get("/api/product/barcode/{barcode:path}")
+def get_product_by_barcode(barcode: str):
+    """
+    Retrieve product details by barcode/QR code from products_master
+    Resolves external_id and qr_code values through the code map (see barcodes.py)
+    Handles URL-encoded barcodes and extracts codes from URLs
+    Uses :path to allow special characters in the barcode
+    """
+    search_barcodes = barcode_search_values(barcode)
+    if not search_barcodes:
+        raise HTTPException(status_code=400, detail="Invalid barcode: could not extract barcode from input")
+    try:
+        entry = code_resolver.resolve(barcode, search_barcodes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return entry.detail
+
+
 @app.get("/api/product/{product_id}/qr-code")
 def get_product_qr_code(product_id: int):
     """
@@ -2011,125 +1088,88 @@ def get_product_qr_code(product_id: int):
                 cursor.close()
             conn.close()
 
-@app.get("/api/products")
-def get_all_products():
+def _render_json(payload):
+    """Serialize like the app's response class; returns (body, strong ETag of the body)."""
+    if FAST_JSON:
+        body = encode_json(payload)
+    else:
+        body = json.dumps(
+            jsonable_encoder(payload),
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+        ).encode("utf-8")
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def _catalog_listing_response(request: Request, key: str, build_payload):
     """
-    Get all products from products_master with their sizes
+    Full product listing served from bytes built once per catalog snapshot.
+    Answers If-None-Match with 304 when the client already has this version.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        # Get all active products from products_master
-        cursor.execute("""
-            SELECT 
-                pm.id,
-                pm.external_id,
-                pm.name,
-                pm.category_id,
-                pm.category as category_name,
-                pm.image as image_url,
-                pm.video as video_url,
-                pm.is_active,
-                pm.created_on as created_at,
-                pm.updated_at,
-                pc.qr_code
-            FROM products_master pm
-            LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
-            WHERE pm.is_active = true
-            ORDER BY pm.name
-        """)
-        products = cursor.fetchall()
-        
-        # Get all sizes for all products via product_catalog
-        # Map products_master external_id to product_catalog id to get sizes
-        external_ids = [p['external_id'] for p in products if p['external_id']]
-        sizes_map = {}
-        
-        if external_ids:
-            # Get product_catalog IDs for these external_ids
-            placeholders = ','.join(['%s'] * len(external_ids))
-            cursor.execute(f"""
-                SELECT pc.id as catalog_id, pc.external_id
-                FROM product_catalog pc
-                WHERE pc.external_id IN ({placeholders})
-            """, tuple(external_ids))
-            catalog_mapping = {row['external_id']: row['catalog_id'] for row in cursor.fetchall()}
-            
-            # Get sizes using catalog IDs
-            if catalog_mapping:
-                catalog_ids = list(catalog_mapping.values())
-                size_placeholders = ','.join(['%s'] * len(catalog_ids))
-            cursor.execute(f"""
-                SELECT 
-                        pc.external_id,
-                        ps.id,
-                        ps.size_id,
-                        ps.size_text,
-                        ps.price_a,
-                        ps.price_b,
-                        ps.price_c,
-                        ps.price_d,
-                        ps.price_e,
-                        ps.price_r,
-                        ps.is_active
-                    FROM product_sizes ps
-                    JOIN product_catalog pc ON ps.product_id = pc.id
-                    WHERE ps.product_id IN ({size_placeholders}) AND ps.is_active = true
-                    ORDER BY pc.external_id, ps.size_id
-                """, tuple(catalog_ids))
-            
-            sizes = cursor.fetchall()
-                # Group sizes by external_id (products_master key)
-            for size in sizes:
-                    external_id = size['external_id']
-                    if external_id not in sizes_map:
-                        sizes_map[external_id] = []
-                
-                    size_dict = {
-                        'id': size['id'],
-                        'size_id': size['size_id'],
-                        'size_text': size['size_text'],
-                        'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                        'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                        'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                        'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                        'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                        'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                        'is_active': size['is_active']
-                    }
-                    sizes_map[external_id].append(size_dict)
-        
-        # Build result with sizes grouped by product
-        result = []
-        for product in products:
-            product_dict = {
-                'id': product['id'],
-                'external_id': product['external_id'],
-                'name': product['name'],
-                'category_id': product['category_id'],
-                'category_name': product['category_name'],
-                'image_url': product['image_url'],
-                'video_url': product['video_url'],
-                'qr_code': product['qr_code'],
-                'is_active': product['is_active'],
-                'created_at': product['created_at'],
-                'updated_at': product['updated_at']
-            }
-            # Get sizes using external_id
-            external_id = product['external_id']
-            product_dict['sizes'] = sizes_map.get(external_id, []) if external_id else []
-            result.append(product_dict)
-        
-        return result
-        
+        snapshot = catalog_index.snapshot()
+        body, etag = snapshot.rendered(key, lambda: _render_json(build_payload(snapshot.entries())))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _catalog_page(payload, limit: int = None, cursor: str = None, category_id: int = None, product_type: str = None):
+    """
+    One page of the catalog in (name, id) order: {"count", "products", "next_cursor"}.
+    Pass next_cursor back as ?cursor= to get the following page (null on the last page).
+    """
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        entries, has_more = catalog_index.snapshot().page(
+            limit, after=after, category_id=category_id, product_type=product_type
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+    return json_response({
+        "count": len(entries),
+        "products": [payload(entry) for entry in entries],
+        "next_cursor": encode_cursor(entries[-1]) if has_more else None,
+    })
+
+
+@app.get("/api/products")
+def get_all_products(
+    request: Request,
+    limit: int = None,
+    cursor: str = None,
+    category_id: int = None,
+    product_type: str = Query(None, alias="type"),
+):
+    """
+    Get all products from products_master with their sizes (catalog index)
+    With limit/cursor/category_id/type: a keyset page (see _catalog_page).
+    Without them: the full list; supports If-None-Match (304 Not Modified when unchanged)
+    """
+    if any(value is not None for value in (limit, cursor, category_id, product_type)):
+        return _catalog_page(lambda entry: entry.summary, limit, cursor, category_id, product_type)
+    return _catalog_listing_response(
+        request, "products", lambda entries: [entry.summary for entry in entries]
+    )
+
 
 @app.post("/api/order")
 def create_order(order_data: dict):
@@ -2157,9 +1197,8 @@ def create_order(order_data: dict):
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
         
-        # Ensure orders table exists with order_number column
-        ensure_orders_table(cursor)
-        conn.commit()
+        # Orders schema is verified once per process (see schema_registry)
+        schema_registry.ensure("orders", cursor)
         
         # Get product details if product_id is provided
         product_info = None
@@ -2190,160 +1229,17 @@ def create_order(order_data: dict):
             )
         
         # Generate order number in format: DJ-XXXXXX
+        order_number = None
         try:
-            # First, check for incomplete orders (orders with no items) to reuse
-            # An incomplete order has product_id IS NULL and total_price = 0
-            # Only check for DJ- prefix orders
-            cursor.execute("""
-                SELECT DISTINCT order_number 
-                FROM orders 
-                WHERE order_number LIKE 'DJ-%'
-                  AND product_id IS NULL 
-                  AND total_price = 0
-                ORDER BY order_number ASC
-                LIMIT 1
-            """)
-            incomplete_order = cursor.fetchone()
-            
-            if incomplete_order:
-                # Reuse the incomplete order number (only if it's DJ- prefix)
-                incomplete_number = incomplete_order[0] if isinstance(incomplete_order, (tuple, list)) else incomplete_order.get('order_number')
-                if incomplete_number and incomplete_number.startswith('DJ-'):
-                    order_number = incomplete_number
-                    # Delete the incomplete order record to replace it
-                    cursor.execute("""
-                        DELETE FROM orders 
-                        WHERE order_number = %s 
-                          AND product_id IS NULL 
-                          AND total_price = 0
-                    """, (order_number,))
-                    print(f"Reusing incomplete order number: {order_number}")
-            
-            # If no incomplete order found, generate a new one
-            if not order_number:
-                # Find the highest sequence number for DJ- prefix only
-                cursor.execute("""
-                    SELECT order_number 
-                    FROM orders 
-                    WHERE order_number LIKE 'DJ-%'
-                    ORDER BY order_number DESC
-                    LIMIT 1
-                """)
-                result = cursor.fetchone()
-                max_sequence = 0
-                if result:
-                    existing_number = result[0] if isinstance(result, (tuple, list)) else result.get('order_number')
-                    if existing_number and existing_number.startswith('DJ-'):
-                        try:
-                            sequence_part = existing_number.split('-')[1]
-                            max_sequence = int(sequence_part)
-                        except (ValueError, IndexError):
-                            max_sequence = 0
-                
-                # Generate new order number with DJ- prefix
-                order_number = f"DJ-{str(max_sequence + 1).zfill(6)}"
-                
-                # Ensure uniqueness
-                max_attempts = 1000
-                for attempt in range(max_attempts):
-                    cursor.execute("SELECT id FROM orders WHERE order_number = %s", (order_number,))
-                    exists = cursor.fetchone()
-                    if not exists:
-                        break
-                    order_number = f"DJ-{str(max_sequence + attempt + 2).zfill(6)}"
-        except Exception as e:
-            from datetime import datetime
-            # Fallback: use timestamp-based number
-            order_number = f"DJ-{datetime.now().strftime('%Y%m%d%H%M%S')[:6]}"
-        
-        # Check and fix foreign key constraint if it references wrong table
-        try:
-            cursor.execute("""
-                SELECT constraint_name, table_name
-                FROM information_schema.table_constraints
-                WHERE table_name = 'orders' 
-                AND constraint_type = 'FOREIGN KEY'
-                AND constraint_name LIKE '%product_id%'
-            """)
-            fk_constraints = cursor.fetchall()
-            
-            # Check if foreign key references wrong table
-            for constraint in fk_constraints:
-                constraint_name = constraint[0]
-                cursor.execute("""
-                    SELECT 
-                        tc.constraint_name, 
-                        kcu.column_name, 
-                        ccu.table_name AS foreign_table_name
-                    FROM information_schema.table_constraints AS tc 
-                    JOIN information_schema.key_column_usage AS kcu
-                      ON tc.constraint_name = kcu.constraint_name
-                    JOIN information_schema.constraint_column_usage AS ccu
-                      ON ccu.constraint_name = tc.constraint_name
-                    WHERE tc.constraint_name = %s
-                """, (constraint_name,))
-                fk_info = cursor.fetchone()
-                
-                if fk_info and fk_info[2] == 'products':
-                    # Drop the wrong foreign key constraint
-                    print(f"Dropping incorrect foreign key constraint: {constraint_name}")
-                    cursor.execute(f"ALTER TABLE orders DROP CONSTRAINT IF EXISTS {constraint_name}")
-                    # Add correct foreign key constraint
-                    cursor.execute("""
-                        ALTER TABLE orders 
-                        ADD CONSTRAINT orders_product_id_fkey 
-                        FOREIGN KEY (product_id) 
-                        REFERENCES product_catalog(id) 
-                        ON DELETE SET NULL
-                    """)
-                    print("Fixed foreign key constraint to reference product_catalog")
-        except Exception as fk_error:
-            print(f"Warning: Could not fix foreign key constraint: {fk_error}")
-        
-        # Check if party_name, station, price_category, transport_name, and created_by columns exist, if not add them
-        try:
-            cursor.execute("""
-                SELECT column_name, character_maximum_length
-                FROM information_schema.columns 
-                WHERE table_name = 'orders' AND column_name IN ('party_name', 'station', 'price_category', 'transport_name', 'created_by')
-            """)
-            existing_cols = cursor.fetchall()
-            existing_columns = [row[0] if isinstance(row, (tuple, list)) else row.get("column_name") for row in existing_cols]
-            
-            if 'party_name' not in existing_columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN party_name VARCHAR(255)")
+            # Reuse the number of an incomplete order (no items), replacing its placeholder
+            order_number = claim_incomplete_order_number(cursor)
+            if order_number:
+                print(f"Reusing incomplete order number: {order_number}")
             else:
-                # Always check and upgrade party_name if it's VARCHAR(50) or smaller
-                party_col = next((row for row in existing_cols if (row[0] if isinstance(row, (tuple, list)) else row.get("column_name")) == 'party_name'), None)
-                if party_col:
-                    try:
-                        max_length = party_col[1] if isinstance(party_col, (tuple, list)) else party_col.get("character_maximum_length")
-                        if max_length is not None and max_length < 255:
-                            cursor.execute("ALTER TABLE orders ALTER COLUMN party_name TYPE VARCHAR(255)")
-                            conn.commit()  # Commit the ALTER immediately
-                            print(f"✓ Updated orders.party_name column from VARCHAR({max_length}) to VARCHAR(255)")
-                        elif max_length is None:
-                            # Try to upgrade anyway if we can't determine length
-                            try:
-                                cursor.execute("ALTER TABLE orders ALTER COLUMN party_name TYPE VARCHAR(255)")
-                                conn.commit()
-                                print(f"✓ Updated orders.party_name column to VARCHAR(255)")
-                            except Exception:
-                                pass
-                    except Exception as alter_err:
-                        print(f"Warning: Could not alter orders.party_name column size: {alter_err}")
-                        import traceback
-                        traceback.print_exc()
-            if 'station' not in existing_columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN station VARCHAR(255)")
-            if 'price_category' not in existing_columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN price_category VARCHAR(100)")
-            if 'transport_name' not in existing_columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN transport_name VARCHAR(255)")
-            if 'created_by' not in existing_columns:
-                cursor.execute("ALTER TABLE orders ADD COLUMN created_by VARCHAR(255)")
-        except Exception as col_error:
-            print(f"Warning: Could not check/add columns: {col_error}")
+                order_number = next_order_number(cursor)
+        except Exception as e:
+            print(f"Error generating order number: {e}")
+            raise HTTPException(status_code=500, detail=f"Could not generate order number: {e}")
         
         # Insert order into database
         try:
@@ -2409,7 +1305,10 @@ def create_order(order_data: dict):
                 detail="Failed to create order: Database did not return order details. Please check if the orders table exists and has the correct structure."
             )
         
+        refresh_party_profile(cursor, order_data.get("party_name"))
         conn.commit()
+        _forget_party_data(order_data.get("party_name"))
+        _forget_challan_options()
         
         return {
             "order_id": result["id"],
@@ -2447,298 +1346,61 @@ def get_party_data_from_orders_path(party_name_path: str):
     """Path parameter version: /api/orders/party-data/{name} - uses :path to handle / in names"""
     return get_party_data_from_orders_impl(party_name_path)
 
-def get_party_data_from_orders_impl(party_name_value: str = None):
-    """
-    Get the most recent station, phone number, price category, transport for a party.
-    Uses exact matching only. Always returns 200 OK with data (or null values if not found).
-    Never returns 404 to prevent frontend errors.
-    """
-    global _party_data_cache, _party_data_cache_time
-    
-    # Handle invalid/empty party names gracefully
+def _normalize_party_lookup(party_name_value: str = None):
+    """Trimmed party name and its cache key, or (None, None) for invalid names (like "/" or empty)."""
     party_trimmed = party_name_value.strip() if party_name_value else ""
     if not party_trimmed or len(party_trimmed) < 2 or party_trimmed == "/":
-        # Return empty response for invalid party names (like "/" or empty)
-        return {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
-    
-    key = party_trimmed.lower()
-    now = datetime.now().timestamp()
-    # Don't use cache if it's a 404 response - always try fresh lookup
-    cached_response = _party_data_cache.get(key)
-    if cached_response and (now - _party_data_cache_time.get(key, 0)) < PARTY_DATA_CACHE_TTL:
-        # Only return cached response if it's not None (None might indicate previous 404)
-        if cached_response is not None:
-            print(f"Returning cached party data for: {party_trimmed}")
-            return cached_response
+        return None, None
+    return party_trimmed, party_trimmed.lower()
 
-    conn = None
-    cursor = None
-    response_data = {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
 
-        print(f"Fetching party data for: '{party_trimmed}' (EXACT MATCH ONLY)")
-        response_data = {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
+def _forget_party_data(party_name: str):
+    """Drop a party's cached auto-fill data after a write changed its profile."""
+    if party_name and party_name.strip():
+        _party_data_cache.invalidate(party_name_key(party_name))
 
-        # 1. Try parties table first (master data - most reliable) - EXACT MATCH ONLY
-        try:
-            cursor.execute("""
-                SELECT EXISTS (
-                  SELECT FROM information_schema.tables
-                  WHERE table_name = 'parties'
-                ) AS exists
-            """)
-            ex = cursor.fetchone()
-            table_exists = ex and (ex.get("exists") if isinstance(ex, dict) else ex[0])
-            
-            if table_exists:
-                # Check which columns exist in parties table
-                cursor.execute("""
-                    SELECT column_name
-                    FROM information_schema.columns
-                    WHERE table_name = 'parties'
-                    AND column_name IN ('shop_name', 'price_category', 'station', 'transport', 'transport_name')
-                """)
-                parties_cols = cursor.fetchall()
-                parties_col_names = [row.get("column_name") if isinstance(row, dict) else row[0] for row in parties_cols]
-                
-                # Build SELECT clause based on available columns
-                select_fields = []
-                if 'shop_name' in parties_col_names:
-                    select_fields.append('shop_name')
-                if 'price_category' in parties_col_names:
-                    select_fields.append('price_category')
-                if 'station' in parties_col_names:
-                    select_fields.append('station')
-                # Try both transport and transport_name
-                if 'transport' in parties_col_names:
-                    select_fields.append('transport')
-                elif 'transport_name' in parties_col_names:
-                    select_fields.append('transport_name')
-                
-                if select_fields and 'shop_name' in parties_col_names:
-                    select_clause = ', '.join(select_fields)
-                    
-                    # EXACT MATCH ONLY - no normalization or flexible matching
-                    # Build query safely - validate select_clause doesn't contain SQL injection
-                    if select_clause and all(col in ['shop_name', 'price_category', 'station', 'transport', 'transport_name'] for col in select_clause.split(', ')):
-                        cursor.execute(f"""
-                            SELECT {select_clause}
-                            FROM parties
-                            WHERE LOWER(TRIM(shop_name)) = LOWER(TRIM(%s))
-                            ORDER BY id DESC
-                            LIMIT 1
-                        """, (party_trimmed,))
-                    else:
-                        # Fallback to safe default columns
-                        cursor.execute("""
-                            SELECT shop_name, price_category, station
-                            FROM parties
-                            WHERE LOWER(TRIM(shop_name)) = LOWER(TRIM(%s))
-                            ORDER BY id DESC
-                            LIMIT 1
-                        """, (party_trimmed,))
-                    pr = cursor.fetchone()
-                    
-                    if pr:
-                        matched_shop_name = pr.get("shop_name")
-                        station_from_parties = pr.get("station")
-                        # Try both transport and transport_name - ONLY use actual transport fields
-                        transport_from_parties = pr.get("transport") or pr.get("transport_name")
-                        price_cat_from_parties = pr.get("price_category")
-                        
-                        # CRITICAL: Never use station as transport_name - ensure transport is not the same as station
-                        if transport_from_parties and station_from_parties:
-                            try:
-                                transport_str = str(transport_from_parties).strip().lower() if transport_from_parties else ""
-                                station_str = str(station_from_parties).strip().lower() if station_from_parties else ""
-                                if transport_str and station_str and transport_str == station_str:
-                                    print(f"  WARNING: transport='{transport_from_parties}' matches station='{station_from_parties}' - setting transport_name to None")
-                                    transport_from_parties = None
-                            except Exception as check_err:
-                                print(f"  Warning: Error comparing transport and station: {check_err}")
-                                # If comparison fails, set transport to None to be safe
-                                transport_from_parties = None
-                        
-                        print(f"✓ Found in parties table (EXACT MATCH): shop_name='{matched_shop_name}'")
-                        print(f"  Data: station='{station_from_parties}', transport='{transport_from_parties}', price_category='{price_cat_from_parties}'")
-                        
-                        # Parties table is master data - use it first
-                        if station_from_parties:
-                            response_data["station"] = station_from_parties
-                        if price_cat_from_parties:
-                            response_data["price_category"] = price_cat_from_parties
-                        # Only set transport_name if it's a valid transport value (not null, not empty, and not the same as station)
-                        try:
-                            if transport_from_parties and str(transport_from_parties).strip():
-                                response_data["transport_name"] = str(transport_from_parties).strip()
-                            else:
-                                # Explicitly set to None if transport is null/empty
-                                response_data["transport_name"] = None
-                        except Exception as transport_err:
-                            print(f"  Warning: Error setting transport_name from parties: {transport_err}")
-                            response_data["transport_name"] = None
-        except Exception as parties_err:
-            print(f"Warning: Error fetching from parties table: {parties_err}")
-            import traceback
-            traceback.print_exc()
 
-        # 2. Try challans table (recent transaction data) - EXACT MATCH ONLY
-        try:
-            # EXACT MATCH ONLY - no normalization or flexible matching
-            cursor.execute("""
-                SELECT station_name, transport_name, price_category, party_name
-                FROM challans
-                WHERE LOWER(TRIM(party_name)) = LOWER(TRIM(%s))
-                ORDER BY created_at DESC LIMIT 1
-            """, (party_trimmed,))
-            cr = cursor.fetchone()
-            
-            if cr:
-                matched_party_name = cr.get("party_name")
-                station_from_challans = cr.get("station_name")
-                transport_from_challans = cr.get("transport_name")
-                price_cat_from_challans = cr.get("price_category")
-                
-                # CRITICAL: Never use station_name as transport_name - ensure transport_name is not the same as station_name
-                if transport_from_challans and station_from_challans:
-                    try:
-                        transport_str = str(transport_from_challans).strip().lower() if transport_from_challans else ""
-                        station_str = str(station_from_challans).strip().lower() if station_from_challans else ""
-                        if transport_str and station_str and transport_str == station_str:
-                            print(f"  WARNING: transport_name='{transport_from_challans}' matches station_name='{station_from_challans}' - setting transport_name to None")
-                            transport_from_challans = None
-                    except Exception as check_err:
-                        print(f"  Warning: Error comparing transport_name and station_name: {check_err}")
-                        # If comparison fails, set transport to None to be safe
-                        transport_from_challans = None
-                
-                print(f"✓ Found in challans table (EXACT MATCH): party_name='{matched_party_name}'")
-                print(f"  Data: station_name='{station_from_challans}', transport_name='{transport_from_challans}', price_category='{price_cat_from_challans}'")
-                
-                # Fill missing fields only (parties table takes priority)
-                if not response_data["station"]:
-                    response_data["station"] = station_from_challans if station_from_challans else None
-                if not response_data["price_category"]:
-                    response_data["price_category"] = price_cat_from_challans if price_cat_from_challans else None
-                # Only set transport_name if it's not already set, is valid, and is not the same as station_name
-                if not response_data["transport_name"]:
-                    try:
-                        if transport_from_challans and str(transport_from_challans).strip():
-                            response_data["transport_name"] = str(transport_from_challans).strip()
-                        else:
-                            # Explicitly set to None if transport is null/empty
-                            response_data["transport_name"] = None
-                    except Exception as transport_err:
-                        print(f"  Warning: Error setting transport_name from challans: {transport_err}")
-                        response_data["transport_name"] = None
-        except Exception as challan_err:
-            print(f"Warning: Error fetching from challans for party '{party_trimmed}': {challan_err}")
-            import traceback
-            traceback.print_exc()
+def _log_party_data(party_trimmed: str, response_data: dict):
+    has_data = any([response_data["station"], response_data["phone_number"],
+                   response_data["price_category"], response_data["transport_name"]])
+    if has_data:
+        print(f"Found party data for '{party_trimmed}': station={response_data['station']}, price_category={response_data['price_category']}, transport={response_data['transport_name']}")
+    else:
+        print(f"No historical data found for party: '{party_trimmed}' - returning empty response")
 
-        # 3. Try orders table (for phone_number and any still-missing fields) - EXACT MATCH ONLY
-        try:
-            cursor.execute("""
-                SELECT EXISTS (SELECT FROM information_schema.tables WHERE table_name = 'orders') AS exists
-            """)
-            ex = cursor.fetchone()
-            if ex and (ex.get("exists") if isinstance(ex, dict) else ex[0]):
-                # EXACT MATCH ONLY - no normalization or flexible matching
-                cursor.execute("""
-                    SELECT station, customer_phone, price_category, transport_name, party_name
-                    FROM orders
-                    WHERE LOWER(TRIM(party_name)) = LOWER(TRIM(%s))
-                    ORDER BY created_at DESC LIMIT 1
-                """, (party_trimmed,))
-                ord_row = cursor.fetchone()
-                
-                if ord_row:
-                    matched_party_name = ord_row.get("party_name")
-                    station_from_orders = ord_row.get("station")
-                    transport_from_orders = ord_row.get("transport_name")
-                    price_cat_from_orders = ord_row.get("price_category")
-                    
-                    # CRITICAL: Never use station as transport_name - ensure transport_name is not the same as station
-                    if transport_from_orders and station_from_orders:
-                        try:
-                            transport_str = str(transport_from_orders).strip().lower() if transport_from_orders else ""
-                            station_str = str(station_from_orders).strip().lower() if station_from_orders else ""
-                            if transport_str and station_str and transport_str == station_str:
-                                print(f"  WARNING: transport_name='{transport_from_orders}' matches station='{station_from_orders}' - setting transport_name to None")
-                                transport_from_orders = None
-                        except Exception as check_err:
-                            print(f"  Warning: Error comparing transport_name and station: {check_err}")
-                            # If comparison fails, set transport to None to be safe
-                            transport_from_orders = None
-                    
-                    print(f"✓ Found in orders table (EXACT MATCH): party_name='{matched_party_name}'")
-                    print(f"  Data from orders: station='{station_from_orders}', transport='{transport_from_orders}', price_category='{price_cat_from_orders}'")
-                    
-                    # Fill missing fields only (parties and challans take priority)
-                    if not response_data["station"]:
-                        response_data["station"] = station_from_orders
-                    if ord_row.get("customer_phone"):
-                        response_data["phone_number"] = ord_row["customer_phone"]
-                    if not response_data["price_category"]:
-                        response_data["price_category"] = price_cat_from_orders
-                    # Only set transport_name if it's not already set, is valid, and is not the same as station
-                    if not response_data["transport_name"]:
-                        try:
-                            if transport_from_orders and str(transport_from_orders).strip():
-                                response_data["transport_name"] = str(transport_from_orders).strip()
-                            else:
-                                # Explicitly set to None if transport is null/empty
-                                response_data["transport_name"] = None
-                        except Exception as transport_err:
-                            print(f"  Warning: Error setting transport_name from orders: {transport_err}")
-                            response_data["transport_name"] = None
-        except Exception as order_err:
-            print(f"Warning: Error fetching from orders for party '{party_trimmed}': {order_err}")
-            import traceback
-            traceback.print_exc()
 
+def get_party_data_from_orders_impl(party_name_value: str = None):
+    """
+    Get the most recent station, phone number, price category, transport for a party.
+    Uses exact matching only. Always returns 200 OK with data (or null values if not found).
+    Never returns 404 to prevent frontend errors.
+    """
+    party_trimmed, key = _normalize_party_lookup(party_name_value)
+    if not party_trimmed:
+        return empty_party_data()
+
+    def load():
+        with closing(get_db_connection()) as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                print(f"Fetching party data for: '{party_trimmed}' (EXACT MATCH ONLY)")
+                # Stored profile (primary-key read); parties without one yet are resolved live
+                response_data = lookup_party_profile(cursor, party_trimmed)
+                if response_data is None:
+                    response_data = resolve_party_profile(cursor, party_trimmed)
+        _log_party_data(party_trimmed, response_data)
+        return response_data
 
-        # Return data even if some fields are None - frontend handles this gracefully
+    try:
+        # Cached even when all fields are None; concurrent misses for a name share one load.
         # Always return a response (even with null values) instead of 404
         # This allows the frontend to proceed with creating challans even if no historical data exists
-        has_data = any([response_data["station"], response_data["phone_number"],
-                       response_data["price_category"], response_data["transport_name"]])
-        
-        if has_data:
-            print(f"Found party data for '{party_trimmed}': station={response_data['station']}, price_category={response_data['price_category']}, transport={response_data['transport_name']}")
-        else:
-            print(f"No historical data found for party: '{party_trimmed}' - returning empty response")
-        
-        # Cache and return the response (even if all fields are None)
-        _party_data_cache[key] = response_data
-        _party_data_cache_time[key] = now
-        return response_data
-            
-    except HTTPException as http_ex:
-        # Never return HTTPException - always return empty response
-        print(f"HTTPException caught for party '{party_trimmed}': {http_ex.status_code} - {http_ex.detail}")
-        import traceback
-        traceback.print_exc()
-        return {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
+        return _party_data_cache.get_or_load(key, load)
     except Exception as e:
         print(f"ERROR fetching party data for '{party_trimmed}': {e}")
         import traceback
         traceback.print_exc()
-        # Always return empty response instead of error to prevent 500
-        return {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
-    finally:
-        try:
-            if cursor:
-                cursor.close()
-        except Exception:
-            pass
-        try:
-            if conn:
-                conn.close()
-        except Exception:
-            pass
+        # Always return empty response instead of error to prevent 500 (not cached)
+        return empty_party_data()
 
 def _dedupe_sort(values: list) -> list:
     """Deduplicate (case-insensitive) and sort."""
@@ -2755,102 +1417,23 @@ def _dedupe_sort(values: list) -> list:
     return result
 
 
-def _get_challan_options_from_db(quick: bool, conn, cursor) -> dict:
-    """Fetch options from DB. quick=True = challans only (faster)."""
-    limit = 2000  # Fetch more data so dropdowns show all options
-    party_names = []
-    station_names = []
-    transport_names = []
-    price_categories = []
-    customer_names = []
+def _assemble_challan_options(raw: dict) -> dict:
+    """Dedupe/sort the raw distinct values per option key and build the response."""
+    party_names = _dedupe_sort(raw.get("party_names", []))
+    station_names = _dedupe_sort(raw.get("station_names", []))
+    transport_names = _dedupe_sort(raw.get("transport_names", []))
+    price_categories = raw.get("price_categories", [])
+    customer_names = _dedupe_sort(raw.get("customer_names", []))
     customer_phones = []
-
-    def _try(fn):
-        try:
-            return fn()
-        except Exception:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
-            return []
-
-    # Helper to fetch party names from parties table (shop_name column)
-    def _fetch_parties_table_names():
-        try:
-            cursor.execute("""
-                SELECT EXISTS (
-                  SELECT FROM information_schema.tables
-                  WHERE table_name = 'parties'
-                ) AS exists
-            """)
-            ex = cursor.fetchone()
-            table_exists = ex and (ex.get("exists") if isinstance(ex, dict) else ex[0])
-            if table_exists:
-                # Try to fetch shop_name from parties table
-                try:
-                    cursor.execute("""
-                        SELECT DISTINCT shop_name
-                        FROM parties
-                        WHERE shop_name IS NOT NULL AND shop_name <> ''
-                        ORDER BY shop_name
-                        LIMIT %s
-                    """, (limit,))
-                    return [row.get("shop_name") if isinstance(row, dict) else row[0] 
-                           for row in cursor.fetchall() 
-                           if row and (row.get("shop_name") if isinstance(row, dict) else row[0])]
-                except Exception:
-                    # If parties schema is different, return empty list
-                    return []
-            return []
-        except Exception:
-            return []
-    
-    if quick:
-        # Challans only - 4 queries, much faster (no orders table)
-        # Also include parties table for party names
-        parties_names = _try(_fetch_parties_table_names)
-        party_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "challans", "party_name", limit=limit))
-            + parties_names
-        )
-        station_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "challans", "station_name", limit=limit))
-        )
-        transport_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "challans", "transport_name", limit=limit))
-        )
-        price_categories = _try(lambda: fetch_distinct_values(cursor, "challans", "price_category", limit=limit))
-    else:
-        # Full: orders + challans + parties table
-        parties_names = _try(_fetch_parties_table_names)
-        party_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "orders", "party_name", limit=limit))
-            + _try(lambda: fetch_distinct_values(cursor, "challans", "party_name", limit=limit))
-            + parties_names
-        )
-        station_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "orders", "station", limit=limit))
-            + _try(lambda: fetch_distinct_values(cursor, "challans", "station_name", limit=limit))
-        )
-        transport_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "orders", "transport_name", limit=limit))
-            + _try(lambda: fetch_distinct_values(cursor, "challans", "transport_name", limit=limit))
-        )
-        price_categories = _try(lambda: fetch_distinct_values(cursor, "challans", "price_category", limit=limit))
-        customer_names = _dedupe_sort(
-            _try(lambda: fetch_distinct_values(cursor, "orders", "customer_name", limit=limit))
-        )
-        customer_phones_raw = _try(lambda: fetch_distinct_values(cursor, "orders", "customer_phone", limit=limit))
-        seen_phone = set()
-        for p in customer_phones_raw:
-            if not p or not str(p).strip():
-                continue
-            clean = "".join(filter(str.isdigit, str(p).strip()))
-            if clean and clean not in seen_phone:
-                seen_phone.add(clean)
-                customer_phones.append(str(p).strip())
-        customer_phones.sort()
+    seen_phone = set()
+    for p in raw.get("customer_phones", []):
+        if not p or not str(p).strip():
+            continue
+        clean = "".join(filter(str.isdigit, str(p).strip()))
+        if clean and clean not in seen_phone:
+            seen_phone.add(clean)
+            customer_phones.append(str(p).strip())
+    customer_phones.sort()
 
     default_price_categories = ["A", "B", "C", "D", "E", "R"]
     merged_price_categories = list(dict.fromkeys(price_categories + default_price_categories))
@@ -2872,41 +1455,33 @@ def _get_challan_options_from_db(quick: bool, conn, cursor) -> dict:
     }
 
 
-_challan_options_quick_cache = None
-_challan_options_quick_cache_time = 0
+def _get_challan_options_from_db(cursor) -> dict:
+    """Options from the challan_option_values dictionary (complete, one table scan)."""
+    raw, version = load_option_values(cursor)
+    result = _assemble_challan_options(raw)
+    result["version"] = version
+    return result
+
+
+def _forget_challan_options():
+    """Drop the cached options after a write may have added or removed a value."""
+    _challan_options_cache.clear()
 
 
 @app.get(
     "/api/challan/options",
     summary="Get challan options",
-    description="Returns party names, stations, etc. Use ?quick=1 for faster load (challans only).",
+    description="Returns party names, stations, etc. with a dictionary version. "
+                "quick is accepted for older clients; the full list is always returned.",
     tags=["Challan"],
 )
 def get_challan_options(quick: bool = False):
-    """Options for challan/order forms. quick=True uses challans only (faster)."""
-    global _challan_options_cache, _challan_options_cache_time
-    global _challan_options_quick_cache, _challan_options_quick_cache_time
-    now = datetime.now().timestamp()
-    if quick:
-        if _challan_options_quick_cache and (now - _challan_options_quick_cache_time) < CHALLAN_OPTIONS_CACHE_TTL:
-            return _challan_options_quick_cache
-    else:
-        if _challan_options_cache and (now - _challan_options_cache_time) < CHALLAN_OPTIONS_CACHE_TTL:
-            return _challan_options_cache
-
-    conn = None
-    cursor = None
+    """
+    Options for challan/order forms, read from the maintained dictionary tables.
+    Concurrent cache misses share one database read (single-flight).
+    """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        result = _get_challan_options_from_db(quick=quick, conn=conn, cursor=cursor)
-        if quick:
-            _challan_options_quick_cache = result
-            _challan_options_quick_cache_time = now
-        else:
-            _challan_options_cache = result
-            _challan_options_cache_time = now
-        return result
+        return _challan_options_cache.get_or_load(_CHALLAN_OPTIONS_KEY, _load_challan_options)
     except Exception as e:
         import traceback
         print(f"Error in get_challan_options: {e}")
@@ -2915,11 +1490,43 @@ def get_challan_options(quick: bool = False):
             status_code=500,
             detail=f"Error fetching challan options: {str(e)}"
         )
-    finally:
-        if conn:
-            if cursor:
-                cursor.close()
-            conn.close()
+
+
+def _load_challan_options() -> dict:
+    with closing(get_db_connection()) as conn:
+        with conn.cursor(row_factory=dict_row) as cursor:
+            schema_registry.ensure("challans", cursor)
+            return _get_challan_options_from_db(cursor)
+
+def _option_search_params(field: str, limit: int) -> int:
+    if field not in SEARCH_KINDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid field '{field}'. Use one of: {', '.join(SEARCH_KINDS)}"
+        )
+    return min(max(limit or SEARCH_DEFAULT_LIMIT, 1), SEARCH_MAX_LIMIT)
+
+
+@app.get(
+    "/api/challan/options/search",
+    summary="Search challan options",
+    description="Typeahead for party, station, transport and customer names (ranked, top N). "
+                "An empty q returns the most used values.",
+    tags=["Challan"],
+)
+def search_challan_options(field: str = "party_names", q: str = "", limit: int = None):
+    """Ranked matches for one option field: exact, prefix, word prefix, then substring."""
+    limit = _option_search_params(field, limit)
+    try:
+        with closing(get_db_connection()) as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                schema_registry.ensure("challans", cursor)
+                results = search_option_values(cursor, field, q, limit)
+    except Exception as e:
+        print(f"Error in search_challan_options: {e}")
+        raise HTTPException(status_code=500, detail=f"Error searching challan options: {str(e)}")
+    return {"field": field, "q": q, "count": len(results), "results": results}
+
 
 @app.get("/api/debug/column-types")
 def debug_column_types():
@@ -2956,12 +1563,188 @@ def debug_column_types():
         if conn:
             conn.close()
 
+
+def prepare_challan_items(cursor, items: List[Dict[str, Any]], resolve_master_ids: bool = False):
+    """
+    Validate challan line items and enrich them with name, qr_code, gst and unit.
+    Product data for the whole payload is fetched with a few set-based queries
+    (product_catalog by id, optionally products_master -> product_catalog, then
+    products_master gst/unit by id and by name) instead of 2-3 queries per line.
+
+    resolve_master_ids: the app may send products_master.id; map ids that are not in
+    product_catalog through external_id (unresolvable ids become None, as the
+    challan_items FK needs a product_catalog.id).
+
+    Returns (prepared_items, total_amount, total_quantity).
+    """
+    parsed = []
+    for position, item in enumerate(items or [], start=1):
+        product_id = _item_id(item, "product_id", position)
+        size_id = _item_id(item, "size_id", position)
+        quantity = float(item.get("quantity", 0) or 0)
+        unit_price = float(item.get("unit_price", 0) or 0)
+        if quantity <= 0:
+            raise HTTPException(status_code=400, detail="Item quantity must be greater than 0")
+        if unit_price < 0:
+            raise HTTPException(status_code=400, detail="Item unit price cannot be negative")
+        total_price = item.get("total_price")
+        total_price = float(total_price) if total_price is not None else quantity * unit_price
+        parsed.append((item, product_id, size_id, quantity, unit_price, total_price))
+    if not parsed:
+        return [], 0.0, 0.0
+
+    # 1. product_catalog rows for every product_id in the payload
+    product_ids = {product_id for _item, product_id, *_ in parsed} - {None}
+    catalog = {}
+    if product_ids:
+        cursor.execute(
+            "SELECT id, name, qr_code FROM product_catalog WHERE id = ANY(%s)",
+            (list(product_ids),),
+        )
+        catalog = {row["id"]: row for row in cursor.fetchall()}
+
+    # 2. products_master ids that are not catalog ids -> catalog row via external_id
+    master_to_catalog = {}
+    unresolved = product_ids - catalog.keys()
+    if resolve_master_ids and unresolved:
+        cursor.execute("""
+            SELECT DISTINCT ON (pm.id) pm.id AS master_id, pc.id, pc.name, pc.qr_code
+            FROM products_master pm
+            JOIN product_catalog pc ON pm.external_id = pc.external_id
+            WHERE pm.id = ANY(%s)
+            ORDER BY pm.id, pc.id
+        """, (list(unresolved),))
+        master_to_catalog = {row["master_id"]: row for row in cursor.fetchall()}
+
+    resolved = []
+    for item, product_id, size_id, quantity, unit_price, total_price in parsed:
+        product_name = item.get("product_name")
+        qr_code_value = item.get("qr_code")
+        if product_id:
+            product_row = catalog.get(product_id)
+            if product_row is None and resolve_master_ids:
+                product_row = master_to_catalog.get(product_id)
+                product_id = product_row["id"] if product_row else None
+            if product_row:
+                if not product_name:
+                    product_name = product_row.get("name")
+                if not qr_code_value:
+                    qr_code_value = product_row.get("qr_code")
+        if not product_name:
+            raise HTTPException(status_code=400, detail="Each item must include a product name")
+        resolved.append((item, product_id, size_id, product_name, qr_code_value, quantity, unit_price, total_price))
+
+    # 3. unit and GST from products_master (by id when the item has one, else by name)
+    lookup_ids = {r[1] for r in resolved if r[1]}
+    lookup_names = {r[3] for r in resolved if not r[1]}
+    master_by_id, master_by_name = {}, {}
+    if lookup_ids:
+        cursor.execute("SELECT id, gst, unit FROM products_master WHERE id = ANY(%s)", (list(lookup_ids),))
+        master_by_id = {row["id"]: row for row in cursor.fetchall()}
+    if lookup_names:
+        cursor.execute("""
+            SELECT DISTINCT ON (name) name, gst, unit
+            FROM products_master
+            WHERE name = ANY(%s)
+            ORDER BY name, id
+        """, (list(lookup_names),))
+        master_by_name = {row["name"]: row for row in cursor.fetchall()}
+
+    prepared_items = []
+    total_amount = 0.0
+    total_quantity = 0.0
+    for item, product_id, size_id, product_name, qr_code_value, quantity, unit_price, total_price in resolved:
+        item_unit = item.get("unit", "piece")
+        item_gst = 0
+        if product_id:
+            pm_row = master_by_id.get(product_id)
+        else:
+            pm_row = master_by_name.get(product_name)
+        if pm_row:
+            if pm_row.get("unit"):
+                item_unit = pm_row["unit"]
+            if pm_row.get("gst") and total_price > 0:
+                item_gst = round(total_price * float(pm_row["gst"]) / 100)
+        prepared_items.append({
+            "product_id": product_id,
+            "product_name": product_name,
+            "size_id": size_id,
+            "size_text": item.get("size_text"),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "total_price": total_price,
+            "qr_code": qr_code_value,
+            "unit": item_unit,
+            "gst": item_gst
+        })
+        total_amount += total_price
+        total_quantity += quantity
+    return prepared_items, total_amount, total_quantity
+
+
+_CHALLAN_ITEMS_BULK_INSERT_SQL = """
+    INSERT INTO challan_items (
+        challan_id,
+        product_id,
+        product_name,
+        size_id,
+        size_text,
+        quantity,
+        unit_price,
+        total_price,
+        qr_code,
+        unit,
+        gst
+    )
+    SELECT %s, product_id, product_name, size_id, size_text,
+           quantity, unit_price, total_price, qr_code, unit, gst
+    FROM unnest(
+        %s::integer[], %s::text[], %s::integer[], %s::text[], %s::numeric[],
+        %s::numeric[], %s::numeric[], %s::text[], %s::text[], %s::numeric[]
+    ) WITH ORDINALITY AS t(
+        product_id, product_name, size_id, size_text, quantity,
+        unit_price, total_price, qr_code, unit, gst, ord
+    )
+    ORDER BY ord
+    RETURNING *
+"""
+
+
+def insert_challan_items(cursor, challan_id: int, prepared_items: List[Dict[str, Any]]) -> List[dict]:
+    """
+    Insert all prepared items for a challan in one statement (arrays + unnest, so the
+    parameter count does not grow with the number of lines).
+    Returns the inserted rows in the same order as prepared_items.
+    """
+    if not prepared_items:
+        return []
+    columns = {
+        "product_id": [], "product_name": [], "size_id": [], "size_text": [], "quantity": [],
+        "unit_price": [], "total_price": [], "qr_code": [], "unit": [], "gst": [],
+    }
+    for prepared in prepared_items:
+        # Ids are validated integers (prepare_challan_items)
+        columns["product_id"].append(prepared.get("product_id") or None)
+        columns["product_name"].append(prepared["product_name"])
+        columns["size_id"].append(prepared.get("size_id") or None)
+        columns["size_text"].append(str(prepared["size_text"]) if prepared.get("size_text") else None)
+        columns["quantity"].append(prepared["quantity"])
+        columns["unit_price"].append(prepared["unit_price"])
+        columns["total_price"].append(prepared["total_price"])
+        columns["qr_code"].append(prepared.get("qr_code") or None)
+        columns["unit"].append(prepared.get("unit", "piece"))
+        columns["gst"].append(prepared.get("gst", 0))
+    cursor.execute(_CHALLAN_ITEMS_BULK_INSERT_SQL, (challan_id, *columns.values()))
+    # ids are assigned in ORDER BY ord order, so sorting by id restores payload order
+    return sorted(cursor.fetchall(), key=lambda row: row["id"])
+
+
 @app.post("/api/challans")
 def create_challan(challan_data: dict):
     """
     Create a challan with header details and line items.
-    Safe for concurrent submissions from multiple devices: challan numbers are
-    generated under an advisory lock and INSERT is retried on duplicate number.
+    Safe for concurrent submissions from multiple devices: challan numbers come from
+    a sequence and INSERT is retried on duplicate number.
     """
     required_fields = ["party_name", "station_name", "transport_name"]
     missing_fields = [field for field in required_fields if not challan_data.get(field)]
@@ -2979,113 +1762,13 @@ def create_challan(challan_data: dict):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
-        ensure_challan_tables(cursor, conn)
-        conn.commit()  # Commit table creation before inserting data
-        
-        # Explicitly ensure VARCHAR columns are correct size RIGHT BEFORE insert
-        # Use direct SQL to be absolutely sure
-        try:
-            print("Running pre-insert column migration...")
-            migration_queries = [
-                "ALTER TABLE challans ALTER COLUMN party_name TYPE VARCHAR(255) USING party_name::VARCHAR(255)",
-                "ALTER TABLE challans ALTER COLUMN station_name TYPE VARCHAR(255) USING station_name::VARCHAR(255)",
-                "ALTER TABLE challans ALTER COLUMN transport_name TYPE VARCHAR(255) USING transport_name::VARCHAR(255)",
-                "ALTER TABLE challans ALTER COLUMN challan_number TYPE VARCHAR(255) USING challan_number::VARCHAR(255)",
-            ]
-            for query in migration_queries:
-                try:
-                    cursor.execute(query)
-                    conn.commit()
-                    print(f"✓ Executed: {query}")
-                except Exception as q_err:
-                    error_msg = str(q_err).lower()
-                    if 'already' not in error_msg and 'does not exist' not in error_msg:
-                        print(f"Warning: Migration query failed (may already be correct): {q_err}")
-            
-            # Also run the migration function as backup
-            _migrate_varchar_columns(cursor, conn)
-            conn.commit()
-            print("Pre-insert migration completed")
-        except Exception as migrate_err:
-            print(f"Warning: Pre-insert migration check failed: {migrate_err}")
-            import traceback
-            traceback.print_exc()
+        # Challan (and orders, for the order_number link) schema is verified once per
+        # process - including the VARCHAR(255) column widening - so no DDL runs here
+        schema_registry.ensure("challans", cursor)
+        schema_registry.ensure("orders", cursor)
         
-        prepared_items = []
-        total_amount = 0.0
-        total_quantity = 0.0
-        
-        # Process items if provided
-        if items and len(items) > 0:
-            for item in items:
-                quantity = float(item.get("quantity", 0) or 0)
-                unit_price = float(item.get("unit_price", 0) or 0)
-                
-                if quantity <= 0:
-                    raise HTTPException(status_code=400, detail="Item quantity must be greater than 0")
-                if unit_price < 0:
-                    raise HTTPException(status_code=400, detail="Item unit price cannot be negative")
-                
-                total_price = item.get("total_price")
-                total_price = float(total_price) if total_price is not None else quantity * unit_price
-                product_id = item.get("product_id")
-                product_name = item.get("product_name")
-                size_id = item.get("size_id")
-                size_text = item.get("size_text")
-                qr_code_value = item.get("qr_code")
-                
-                # Try to fetch product details if product_id is provided
-                if product_id:
-                    try:
-                        cursor.execute("""
-                            SELECT name, qr_code 
-                            FROM product_catalog 
-                            WHERE id = %s
-                        """, (product_id,))
-                        product_row = cursor.fetchone()
-                        if product_row:
-                            if not product_name:
-                                product_name = product_row.get("name")
-                            if not qr_code_value:
-                                qr_code_value = product_row.get("qr_code")
-                    except Exception as e:
-                        print(f"Warning: Could not fetch product details for id {product_id}: {e}")
-                
-                if not product_name:
-                    raise HTTPException(status_code=400, detail="Each item must include a product name")
-                
-                # Look up unit and GST from products_master
-                item_unit = item.get("unit", "piece")
-                item_gst = 0
-                try:
-                    if product_id:
-                        cursor.execute("SELECT gst, unit FROM products_master WHERE id = %s", (product_id,))
-                    else:
-                        cursor.execute("SELECT gst, unit FROM products_master WHERE name = %s LIMIT 1", (product_name,))
-                    pm_row = cursor.fetchone()
-                    if pm_row:
-                        if pm_row.get("unit"):
-                            item_unit = pm_row["unit"]
-                        if pm_row.get("gst") and total_price > 0:
-                            item_gst = round(total_price * float(pm_row["gst"]) / 100)
-                except Exception as lu_err:
-                    print(f"Warning: Could not look up unit/GST for {product_name}: {lu_err}")
-
-                prepared_items.append({
-                    "product_id": product_id,
-                    "product_name": product_name,
-                    "size_id": size_id,
-                    "size_text": size_text,
-                    "quantity": quantity,
-                    "unit_price": unit_price,
-                    "total_price": total_price,
-                    "qr_code": qr_code_value,
-                    "unit": item_unit,
-                    "gst": item_gst
-                })
-                
-                total_amount += total_price
-                total_quantity += quantity
+        # Validate items and fetch product details for all of them at once
+        prepared_items, total_amount, total_quantity = prepare_challan_items(cursor, items)
         
         # Get party_name for challan number generation and insertion
         party_name = challan_data.get("party_name", "")
@@ -3198,30 +1881,13 @@ def create_challan(challan_data: dict):
                         )
                     continue
                 
-                # If it's a VARCHAR(50) error, try to migrate again and retry
-                if "varying(50)" in error_lower or "character varying(50)" in error_lower or "value too long" in error_lower:
-                    print(f"VARCHAR(50) error detected! Attempting emergency migration...")
-                    print(f"Error: {error_msg}")
-                    print(f"Party name: '{party_name}' (length: {len(party_name) if party_name else 0})")
-                    print(f"Station name: '{station_name}' (length: {len(station_name) if station_name else 0})")
-                    print(f"Transport name: '{transport_name}' (length: {len(transport_name) if transport_name else 0})")
-                    print(f"Challan number would be: '{number_to_insert}' (length: {len(number_to_insert) if number_to_insert else 0})")
-                    try:
-                        # Emergency migration - migrate ALL relevant columns
-                        _migrate_varchar_columns(cursor, conn)
-                        conn.commit()
-                        print("Emergency migration completed, retrying insert...")
-                        # Retry the insert
-                        continue
-                    except Exception as migrate_err:
-                        print(f"Emergency migration failed: {migrate_err}")
-                        import traceback
-                        traceback.print_exc()
-                        # Still raise the original error
-                        raise HTTPException(
-                            status_code=500,
-                            detail=f"Database column size error. Please contact support. Error: {error_msg}"
-                        )
+                # Name columns too narrow: the database is missing migration 0004
+                if "value too long" in error_lower:
+                    print(f"Column size error: {error_msg}")
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"Database column size error; run `python migrate.py`. Error: {error_msg}"
+                    )
                 
                 # Log the error details
                 import traceback
@@ -3250,50 +1916,8 @@ def create_challan(challan_data: dict):
             final_challan_number = challan_row.get("challan_number") or generate_challan_number(cursor, party_name)
             print(f"Warning: final_challan_number was empty after if/else, using fallback: {final_challan_number}")
         
-        inserted_items = []
-        # Insert items only if they were provided
-        if prepared_items:
-            for prepared in prepared_items:
-                # Ensure None values are properly handled
-                qr_code_value = prepared.get("qr_code") if prepared.get("qr_code") else None
-                size_id_value = prepared.get("size_id") if prepared.get("size_id") else None
-                size_text_value = prepared.get("size_text") if prepared.get("size_text") else None
-                product_id_value = prepared.get("product_id") if prepared.get("product_id") else None
-                
-                cursor.execute("""
-                    INSERT INTO challan_items (
-                        challan_id,
-                        product_id,
-                        product_name,
-                        size_id,
-                        size_text,
-                        quantity,
-                        unit_price,
-                        total_price,
-                        qr_code,
-                        unit,
-                        gst
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING *
-                """, (
-                    challan_row["id"],
-                    product_id_value,
-                    prepared["product_name"],
-                    size_id_value,
-                    size_text_value,
-                    prepared["quantity"],
-                    prepared["unit_price"],
-                    prepared["total_price"],
-                    qr_code_value,
-                    prepared.get("unit", "piece"),
-                    prepared.get("gst", 0),
-                ))
-                item_row = cursor.fetchone()
-                if item_row:
-                    inserted_items.append(item_row)
-                else:
-                    print(f"Warning: Failed to fetch inserted item for challan {challan_row['id']}")
+        # Insert all items in one round trip
+        inserted_items = insert_challan_items(cursor, challan_row["id"], prepared_items)
         
         # Update orders table with challan_number if order_number is in metadata
         # Parse metadata if it's a JSON string (it will be a dict from frontend, but string from DB)
@@ -3308,22 +1932,7 @@ def create_challan(challan_data: dict):
         if parsed_metadata and isinstance(parsed_metadata, dict) and parsed_metadata.get("order_number"):
             order_number = parsed_metadata.get("order_number")
             try:
-                # Check if challan_number column exists in orders table
-                cursor.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'orders' AND column_name = 'challan_number'
-                """)
-                has_challan_number = cursor.fetchone() is not None
-                
-                if not has_challan_number:
-                    # Add challan_number column to orders table
-                    cursor.execute("""
-                        ALTER TABLE orders 
-                        ADD COLUMN challan_number VARCHAR(255)
-                    """)
-                    print("Added challan_number column to orders table")
-                
+                # orders.challan_number is added by the orders schema component
                 # Check if order exists before updating
                 cursor.execute("""
                     SELECT id FROM orders WHERE order_number = %s
@@ -3349,6 +1958,8 @@ def create_challan(challan_data: dict):
                 print(f"Traceback: {traceback.format_exc()}")
                 # Don't fail the challan creation if order update fails
         
+        refresh_party_profile(cursor, challan_row.get("party_name"))
+
         # Commit the transaction
         try:
             conn.commit()
@@ -3361,6 +1972,8 @@ def create_challan(challan_data: dict):
                 status_code=500,
                 detail=f"Error committing challan: {str(commit_error)}"
             )
+        _forget_party_data(challan_row.get("party_name"))
+        _forget_challan_options()
         
         # Ensure items are included in response
         if not inserted_items:
@@ -3416,144 +2029,17 @@ def update_challan(challan_id: int, challan_data: dict):
             raise HTTPException(status_code=404, detail="Challan not found")
         
         items = challan_data.get("items", [])
-        prepared_items = []
-        total_amount = 0.0
-        total_quantity = 0.0
-        
-        # Process items if provided
-        if items and len(items) > 0:
-            for item in items:
-                quantity = float(item.get("quantity", 0) or 0)
-                unit_price = float(item.get("unit_price", 0) or 0)
-                
-                if quantity <= 0:
-                    raise HTTPException(status_code=400, detail="Item quantity must be greater than 0")
-                if unit_price < 0:
-                    raise HTTPException(status_code=400, detail="Item unit price cannot be negative")
-                
-                total_price = item.get("total_price")
-                total_price = float(total_price) if total_price is not None else quantity * unit_price
-                product_id = item.get("product_id")
-                product_name = item.get("product_name")
-                size_id = item.get("size_id")
-                size_text = item.get("size_text")
-                qr_code_value = item.get("qr_code")
-                
-                # Resolve product_id: challan_items FK needs product_catalog.id; app may send products_master.id
-                if product_id:
-                    try:
-                        cursor.execute(
-                            "SELECT id, name, qr_code FROM product_catalog WHERE id = %s",
-                            (product_id,))
-                        product_row = cursor.fetchone()
-                        if product_row:
-                            if not product_name:
-                                product_name = product_row.get("name")
-                            if not qr_code_value:
-                                qr_code_value = product_row.get("qr_code")
-                        else:
-                            try:
-                                cursor.execute("""
-                                    SELECT pc.id, pc.name, pc.qr_code
-                                    FROM products_master pm
-                                    JOIN product_catalog pc ON pm.external_id = pc.external_id
-                                    WHERE pm.id = %s LIMIT 1
-                                """, (product_id,))
-                                product_row = cursor.fetchone()
-                                if product_row:
-                                    product_id = product_row["id"]
-                                    if not product_name:
-                                        product_name = product_row.get("name")
-                                    if not qr_code_value:
-                                        qr_code_value = product_row.get("qr_code")
-                                else:
-                                    product_id = None
-                            except Exception:
-                                product_id = None
-                    except Exception as e:
-                        conn.rollback()
-                        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-                
-                if not product_name:
-                    raise HTTPException(status_code=400, detail="Each item must include a product name")
-                
-                # Look up unit and GST from products_master
-                item_unit = item.get("unit", "piece")
-                item_gst = 0
-                try:
-                    if product_id:
-                        cursor.execute("SELECT gst, unit FROM products_master WHERE id = %s", (product_id,))
-                    else:
-                        cursor.execute("SELECT gst, unit FROM products_master WHERE name = %s LIMIT 1", (product_name,))
-                    pm_row = cursor.fetchone()
-                    if pm_row:
-                        if pm_row.get("unit"):
-                            item_unit = pm_row["unit"]
-                        if pm_row.get("gst") and total_price > 0:
-                            item_gst = round(total_price * float(pm_row["gst"]) / 100)
-                except Exception as lu_err:
-                    print(f"Warning: Could not look up unit/GST for {product_name}: {lu_err}")
-
-                prepared_items.append({
-                    "product_id": product_id,
-                    "product_name": product_name,
-                    "size_id": size_id,
-                    "size_text": size_text,
-                    "quantity": quantity,
-                    "unit_price": unit_price,
-                    "total_price": total_price,
-                    "qr_code": qr_code_value,
-                    "unit": item_unit,
-                    "gst": item_gst
-                })
-                
-                total_amount += total_price
-                total_quantity += quantity
+        # Validate items and fetch product details for all of them at once;
+        # the app may send products_master ids, which are mapped to product_catalog ids
+        prepared_items, total_amount, total_quantity = prepare_challan_items(
+            cursor, items, resolve_master_ids=True
+        )
         
         # Delete existing items
         cursor.execute("DELETE FROM challan_items WHERE challan_id = %s", (challan_id,))
         
-        # Insert new items
-        inserted_items = []
-        if prepared_items:
-            for prepared in prepared_items:
-                qr_code_value = prepared.get("qr_code") if prepared.get("qr_code") else None
-                size_id_value = prepared.get("size_id") if prepared.get("size_id") else None
-                size_text_value = prepared.get("size_text") if prepared.get("size_text") else None
-                product_id_value = prepared.get("product_id") if prepared.get("product_id") else None
-                
-                cursor.execute("""
-                    INSERT INTO challan_items (
-                        challan_id,
-                        product_id,
-                        product_name,
-                        size_id,
-                        size_text,
-                        quantity,
-                        unit_price,
-                        total_price,
-                        qr_code,
-                        unit,
-                        gst
-                    )
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING *
-                """, (
-                    challan_id,
-                    product_id_value,
-                    prepared["product_name"],
-                    size_id_value,
-                    size_text_value,
-                    prepared["quantity"],
-                    prepared["unit_price"],
-                    prepared["total_price"],
-                    qr_code_value,
-                    prepared.get("unit", "piece"),
-                    prepared.get("gst", 0),
-                ))
-                item_row = cursor.fetchone()
-                if item_row:
-                    inserted_items.append(item_row)
+        # Insert new items in one round trip
+        inserted_items = insert_challan_items(cursor, challan_id, prepared_items)
         
         # Update challan totals and status
         status = challan_data.get("status", challan_row.get("status", "draft"))
@@ -3611,6 +2097,11 @@ def update_challan(challan_id: int, challan_data: dict):
             conn.rollback()
             raise HTTPException(status_code=500, detail="Failed to update challan")
         
+        # A rename moves this challan from the old party's history to the new one's
+        party_names = {challan_row.get("party_name"), updated_challan.get("party_name")}
+        for name in party_names:
+            refresh_party_profile(cursor, name)
+
         # Commit the transaction
         try:
             conn.commit()
@@ -3623,6 +2114,9 @@ def update_challan(challan_id: int, challan_data: dict):
                 status_code=500,
                 detail=f"Error updating challan: {str(commit_error)}"
             )
+        for name in party_names:
+            _forget_party_data(name)
+        _forget_challan_options()
         
         # Fetch items for response
         if not inserted_items:
@@ -3658,9 +2152,51 @@ def update_challan(challan_id: int, challan_data: dict):
 
 def _clear_challans_list_cache():
     """Clear list cache when challans are created/updated."""
-    global _challans_list_cache, _challans_list_cache_time
     _challans_list_cache.clear()
-    _challans_list_cache_time.clear()
+
+
+# Item counts for a page of challans, fetched in one batch
+_CHALLAN_ITEM_COUNTS_SQL = (
+    "SELECT challan_id, COUNT(*) AS cnt FROM challan_items WHERE challan_id = ANY(%s) GROUP BY challan_id"
+)
+
+
+def _challans_list_query(status: str = None, search: str = None, limit: int = 50):
+    """Build the challan list SELECT (no JOIN - item counts are fetched separately in batch)."""
+    query = """
+        SELECT id, challan_number, party_name, station_name, transport_name,
+               price_category, total_amount, total_quantity, status, notes,
+               created_at, updated_at
+        FROM challans
+    """
+    conditions = []
+    params = []
+
+    if status:
+        conditions.append("status = %s")
+        params.append(status)
+
+    if search:
+        search_term = f"%{search.lower()}%"
+        conditions.append("(LOWER(challan_number) LIKE %s OR LOWER(party_name) LIKE %s)")
+        params.extend([search_term, search_term])
+
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+
+    query += " ORDER BY created_at DESC LIMIT %s"
+    params.append(min(limit, 100))
+    return query, tuple(params)
+
+
+def _challans_list_result(rows, count_rows) -> dict:
+    count_map = {r["challan_id"]: r["cnt"] for r in count_rows}
+    challans = []
+    for row in rows:
+        serialized = serialize_challan(row)
+        serialized["item_count"] = count_map.get(row["id"], 0)
+        challans.append(serialized)
+    return {"count": len(challans), "challans": challans}
 
 
 @app.get("/api/challans")
@@ -3668,11 +2204,10 @@ def list_challans(status: str = None, search: str = None, limit: int = 50):
     """
     Retrieve challans with optional filtering. Cached 30s to avoid timeout on retry.
     """
-    global _challans_list_cache, _challans_list_cache_time
     cache_key = (status or "", search or "", min(limit, 100))
-    now = datetime.now().timestamp()
-    if cache_key in _challans_list_cache and (now - _challans_list_cache_time.get(cache_key, 0)) < 30:
-        return _challans_list_cache[cache_key]
+    cached = _challans_list_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached)
 
     conn = None
     cursor = None
@@ -3680,53 +2215,19 @@ def list_challans(status: str = None, search: str = None, limit: int = 50):
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
 
-        # Simple SELECT without JOIN - avoids expensive GROUP BY; item_count fetched separately in batch
-        query = """
-            SELECT id, challan_number, party_name, station_name, transport_name,
-                   price_category, total_amount, total_quantity, status, notes,
-                   created_at, updated_at
-            FROM challans
-        """
-        conditions = []
-        params = []
-
-        if status:
-            conditions.append("status = %s")
-            params.append(status)
-
-        if search:
-            search_term = f"%{search.lower()}%"
-            conditions.append("(LOWER(challan_number) LIKE %s OR LOWER(party_name) LIKE %s)")
-            params.extend([search_term, search_term])
-
-        if conditions:
-            query += " WHERE " + " AND ".join(conditions)
-
-        query += " ORDER BY created_at DESC LIMIT %s"
-        params.append(min(limit, 100))
-
-        cursor.execute(query, tuple(params))
+        query, params = _challans_list_query(status, search, limit)
+        cursor.execute(query, params)
         rows = cursor.fetchall()
 
-        challans = []
+        count_rows = []
         if rows:
-            ids = [r["id"] for r in rows]
             # Batch fetch item counts
-            placeholders = ",".join(["%s"] * len(ids))
-            cursor.execute(
-                f"SELECT challan_id, COUNT(*) AS cnt FROM challan_items WHERE challan_id IN ({placeholders}) GROUP BY challan_id",
-                tuple(ids)
-            )
-            count_map = {r["challan_id"]: r["cnt"] for r in cursor.fetchall()}
-            for row in rows:
-                serialized = serialize_challan(row)
-                serialized["item_count"] = count_map.get(row["id"], 0)
-                challans.append(serialized)
-
-        result = {"count": len(challans), "challans": challans}
-        _challans_list_cache[cache_key] = result
-        _challans_list_cache_time[cache_key] = now
-        return result
+            cursor.execute(_CHALLAN_ITEM_COUNTS_SQL, ([r["id"] for r in rows],))
+            count_rows = cursor.fetchall()
+
+        result = _challans_list_result(rows, count_rows)
+        _challans_list_cache.set(cache_key, result)
+        return json_response(result)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -3750,7 +2251,7 @@ def list_empty_draft_challans(limit: int = 10):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
-        ensure_challan_tables(cursor, conn)
+        schema_registry.ensure("challans", cursor)
         # Draft challans with no rows in challan_items (or not in challan_items at all)
         # Use COALESCE to handle NULL updated_at gracefully
         cursor.execute("""
@@ -3770,25 +2271,12 @@ def list_empty_draft_challans(limit: int = 10):
         result = []
         for row in rows:
             result.append(serialize_challan(row, items=[]))
-        return {"count": len(result), "challans": result}
+        return json_response({"count": len(result), "challans": result})
     except Exception as e:
         import traceback
         error_msg = str(e) if str(e) else "Unknown error"
-        error_lower = error_msg.lower()
         print(f"list_empty_draft_challans error: {error_msg}")
         traceback.print_exc()
-        
-        # If it's a VARCHAR(50) error, try to migrate
-        if "varying(50)" in error_lower or "character varying(50)" in error_lower or "value too long" in error_lower:
-            print("VARCHAR(50) error in empty-drafts endpoint! Attempting migration...")
-            try:
-                if conn and cursor:
-                    _migrate_varchar_columns(cursor, conn)
-                    conn.commit()
-                    print("Migration completed, you may need to retry the request")
-            except Exception as migrate_err:
-                print(f"Migration failed: {migrate_err}")
-        
         raise HTTPException(
             status_code=500,
             detail=f"Error fetching empty draft challans: {error_msg}"
@@ -3810,7 +2298,7 @@ def get_challan(challan_id: int):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
-        ensure_challan_tables(cursor, conn)
+        schema_registry.ensure("challans", cursor)
         
         cursor.execute("SELECT * FROM challans WHERE id = %s", (challan_id,))
         challan_row = cursor.fetchone()
@@ -3825,7 +2313,7 @@ def get_challan(challan_id: int):
         """, (challan_id,))
         items = cursor.fetchall()
         
-        return serialize_challan(challan_row, items)
+        return json_response(serialize_challan(challan_row, items))
     except HTTPException:
         raise
     except Exception as e:
@@ -3854,7 +2342,7 @@ def get_challan_by_number(challan_number: str):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
-        ensure_challan_tables(cursor)
+        schema_registry.ensure("challans", cursor)
 
         num = (challan_number or "").strip()
         cursor.execute("SELECT * FROM challans WHERE challan_number = %s", (num,))
@@ -3884,7 +2372,7 @@ def get_challan_by_number(challan_number: str):
         """, (challan_row["id"],))
         items = cursor.fetchall()
         
-        return serialize_challan(challan_row, items)
+        return json_response(serialize_challan(challan_row, items))
     except HTTPException:
         raise
     except Exception as e:
@@ -3916,14 +2404,18 @@ def delete_challan(challan_id: int):
         cursor.execute("DELETE FROM challan_items WHERE challan_id = %s", (challan_id,))
         
         # Then delete the challan itself
-        cursor.execute("DELETE FROM challans WHERE id = %s RETURNING challan_number", (challan_id,))
+        cursor.execute("DELETE FROM challans WHERE id = %s RETURNING challan_number, party_name", (challan_id,))
         deleted_challan = cursor.fetchone()
         
         if not deleted_challan:
             conn.rollback()
             raise HTTPException(status_code=404, detail="Challan not found")
         
+        # The party's auto-fill data may have come from this challan
+        refresh_party_profile(cursor, deleted_challan["party_name"])
         conn.commit()
+        _forget_party_data(deleted_challan["party_name"])
+        _forget_challan_options()
         return {
             "message": f"Challan {deleted_challan['challan_number']} deleted successfully",
             "challan_id": challan_id
@@ -3975,11 +2467,17 @@ def delete_challan_by_number(challan_number: str):
         cursor.execute("DELETE FROM challan_items WHERE challan_id = %s", (challan_id,))
         
         # Then delete the challan itself
-        cursor.execute("DELETE FROM challans WHERE id = %s", (challan_id,))
+        cursor.execute("DELETE FROM challans WHERE id = %s RETURNING party_name", (challan_id,))
+        deleted_challan = cursor.fetchone()
+        party_name = deleted_challan["party_name"] if deleted_challan else None
         
+        # The party's auto-fill data may have come from this challan
+        refresh_party_profile(cursor, party_name)
         conn.commit()
         actual_number = challan_row.get("challan_number", challan_number)
         _clear_challans_list_cache()
+        _forget_party_data(party_name)
+        _forget_challan_options()
         return {
             "message": f"Challan {actual_number} deleted successfully",
             "challan_id": challan_id
@@ -4028,7 +2526,7 @@ def get_challan_qr(challan_id: int):
     try:
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
-        ensure_challan_tables(cursor, conn)
+        schema_registry.ensure("challans", cursor)
         
         cursor.execute("SELECT challan_number FROM challans WHERE id = %s", (challan_id,))
         challan_row = cursor.fetchone()
@@ -4075,33 +2573,8 @@ def generate_labels(label_data: dict):
         conn = get_db_connection()
         cursor = conn.cursor(row_factory=dict_row)
         
-        # Create labels table if it doesn't exist
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS labels (
-                    id SERIAL PRIMARY KEY,
-                    product_name VARCHAR(500) NOT NULL,
-                    product_size VARCHAR(100),
-                    number_of_labels INTEGER NOT NULL DEFAULT 1,
-                    status VARCHAR(50) DEFAULT 'pending' CHECK (status IN ('pending', 'generated', 'printed', 'cancelled')),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_by VARCHAR(100)
-                )
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_labels_product_name ON labels(product_name)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_labels_status ON labels(status)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_labels_created_at ON labels(created_at DESC)
-            """)
-            conn.commit()
-        except Exception as table_error:
-            print(f"Note: labels table may already exist: {table_error}")
-            conn.rollback()
+        # Labels schema is verified once per process (see schema_registry)
+        schema_registry.ensure("labels", cursor)
         
         # Insert label items
         inserted_labels = []
@@ -4228,561 +2701,74 @@ def get_labels(status: str = None, limit: int = 500):
 # ============================================================================
 
 @app.get("/api/v1/products-master/")
-def list_products_master():
+def list_products_master(
+    request: Request,
+    limit: int = None,
+    cursor: str = None,
+    category_id: int = None,
+    product_type: str = Query(None, alias="type"),
+):
+    """
+    List all products from products_master table with their sizes (catalog index)
+    With limit/cursor/category_id/type: a keyset page (see _catalog_page).
+    Without them: the full list; supports If-None-Match (304 Not Modified when unchanged)
+    """
+    if any(value is not None for value in (limit, cursor, category_id, product_type)):
+        return _catalog_page(lambda entry: entry.master, limit, cursor, category_id, product_type)
+    return _catalog_listing_response(
+        request, "products_master", lambda entries: [entry.master for entry in entries]
+    )
+
+
+@app.get("/api/v1/products-master/changes")
+def get_products_master_changes(token: str = None):
     """
-    List all products from products_master table with their sizes
+    Delta sync: products changed since `token` (see catalog_sync.py).
+    Returns {"token", "full", "products", "removed"}; pass the returned token next time.
+    Without a token (or with an expired one) returns the full active catalog, full=true.
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        cursor.execute("""
-            SELECT 
-                pm.id,
-                pm.external_id,
-                pm.name,
-                pm.category,
-                pm.category_id,
-                pm.type,
-                pm.unit,
-                pm.description,
-                pm.image,
-                pm.video,
-                pm.hsn_code,
-                pm.gst,
-                pm.gst_applicable,
-                pm.is_active,
-                pm.created_on,
-                pm.updated_at,
-                pm.has_consumption,
-                pm.external_created_on,
-                CASE 
-                    WHEN pm.designs IS NULL THEN NULL::jsonb
-                    WHEN jsonb_typeof(pm.designs) = 'object' AND pm.designs ? 'designs' THEN
-                        (SELECT jsonb_agg(
-                            COALESCE(elem->>'design_name', elem->>'design_code', elem->>'name', '')
-                        )
-                        FROM jsonb_array_elements(pm.designs->'designs') AS elem
-                        WHERE COALESCE(elem->>'design_name', elem->>'design_code', elem->>'name', '') != '')
-                    ELSE pm.designs
-                END as designs,
-                pc.qr_code
-            FROM products_master pm
-            LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
-            WHERE pm.is_active = true
-            ORDER BY pm.name
-        """)
-        
-        products = cursor.fetchall()
-        
-        # Get all sizes for all products - check both direct (product_type='master') and via product_catalog
-        product_ids = [p['id'] for p in products]
-        sizes_map = {}
-        
-        if product_ids:
-            # First, get sizes directly linked to products_master (product_type = 'master')
-            placeholders = ','.join(['%s'] * len(product_ids))
-            cursor.execute(f"""
-                SELECT 
-                    product_id,
-                    id,
-                    size_id,
-                    size_text,
-                    price_a,
-                    price_b,
-                    price_c,
-                    price_d,
-                    price_e,
-                    price_r,
-                    is_active
-                FROM product_sizes
-                WHERE product_id IN ({placeholders}) AND product_type = 'master' AND is_active = true
-                ORDER BY product_id, id
-            """, tuple(product_ids))
-            
-            direct_sizes = cursor.fetchall()
-            for size in direct_sizes:
-                pm_id = size['product_id']
-                if pm_id not in sizes_map:
-                    sizes_map[pm_id] = []
-                
-                size_dict = {
-                    'id': size['id'],
-                    'size_id': size['size_id'],
-                    'size_text': size['size_text'],
-                    'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                    'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                    'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                    'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                    'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                    'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                    'is_active': size['is_active']
-                }
-                sizes_map[pm_id].append(size_dict)
-            
-            # Then, get sizes via product_catalog for products that don't have direct sizes
-            products_without_sizes = [p for p in products if p['id'] not in sizes_map or len(sizes_map[p['id']]) == 0]
-            external_ids = [p['external_id'] for p in products_without_sizes if p['external_id']]
-            
-            if external_ids:
-                # Get product_catalog IDs for these external_ids
-                cat_placeholders = ','.join(['%s'] * len(external_ids))
-                cursor.execute(f"""
-                    SELECT pc.id as catalog_id, pc.external_id
-                    FROM product_catalog pc
-                    WHERE pc.external_id IN ({cat_placeholders})
-                """, tuple(external_ids))
-                catalog_mapping = {row['external_id']: row['catalog_id'] for row in cursor.fetchall()}
-                
-                # Get sizes using catalog IDs
-                if catalog_mapping:
-                    catalog_ids = list(catalog_mapping.values())
-                    size_placeholders = ','.join(['%s'] * len(catalog_ids))
-                    cursor.execute(f"""
-                        SELECT 
-                            pc.external_id,
-                            ps.id,
-                            ps.size_id,
-                            ps.size_text,
-                            ps.price_a,
-                            ps.price_b,
-                            ps.price_c,
-                            ps.price_d,
-                            ps.price_e,
-                            ps.price_r,
-                            ps.is_active
-                        FROM product_sizes ps
-                        JOIN product_catalog pc ON ps.product_id = pc.id
-                        WHERE ps.product_id IN ({size_placeholders}) AND ps.is_active = true
-                        ORDER BY pc.external_id, ps.size_id
-                    """, tuple(catalog_ids))
-                    
-                    catalog_sizes = cursor.fetchall()
-                    # Group sizes by products_master id (via external_id mapping)
-                    for size in catalog_sizes:
-                        external_id = size['external_id']
-                        # Find products_master id for this external_id
-                        pm_product = next((p for p in products_without_sizes if p['external_id'] == external_id), None)
-                        if pm_product:
-                            pm_id = pm_product['id']
-                            if pm_id not in sizes_map:
-                                sizes_map[pm_id] = []
-                            
-                            size_dict = {
-                                'id': size['id'],
-                                'size_id': size['size_id'],
-                                'size_text': size['size_text'],
-                                'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                                'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                                'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                                'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                                'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                                'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                                'is_active': size['is_active']
-                            }
-                            sizes_map[pm_id].append(size_dict)
-        
-        # Build result with sizes and map field names for frontend compatibility
-        result = []
-        for product in products:
-            product_dict = dict(product)
-            pm_id = product['id']
-            
-            # Map products_master fields to frontend expected fields
-            product_dict['category_name'] = product_dict.get('category')
-            product_dict['image_url'] = product_dict.get('image')
-            product_dict['video_url'] = product_dict.get('video')
-            
-            # Process designs field - extract design names from the designs object
-            designs_raw = product_dict.get('designs')
-            product_dict['designs'] = []  # Default to empty list
-            
-            if designs_raw is not None:
-                try:
-                    # Convert to dict if needed (handle psycopg JSONB types)
-                    if not isinstance(designs_raw, dict):
-                        if isinstance(designs_raw, str):
-                            designs_raw = json.loads(designs_raw)
-                        elif hasattr(designs_raw, '__dict__'):
-                            designs_raw = dict(designs_raw)
-                        else:
-                            # Try to convert using json
-                            designs_raw = json.loads(json.dumps(designs_raw))
-                    
-                    # Extract designs array from the object
-                    if isinstance(designs_raw, dict):
-                        if 'designs' in designs_raw:
-                            designs_list = designs_raw['designs']
-                            if isinstance(designs_list, list):
-                                # Extract design_name from each design object
-                                design_names = []
-                                for d in designs_list:
-                                    if isinstance(d, dict):
-                                        design_name = d.get('design_name') or d.get('design_code') or d.get('name')
-                                        if design_name:
-                                            design_names.append(str(design_name))
-                                product_dict['designs'] = design_names
-                        else:
-                            # If it's a dict but doesn't have 'designs' key, try process_designs_field
-                            product_dict['designs'] = process_designs_field(designs_raw)
-                    elif isinstance(designs_raw, list):
-                        # Already a list - process it
-                        product_dict['designs'] = process_designs_field(designs_raw)
-                    else:
-                        product_dict['designs'] = process_designs_field(designs_raw)
-                except Exception as e:
-                    print(f"Error processing designs for product {pm_id}: {e}")
-                    product_dict['designs'] = []
-            
-            # Add sizes - use products_master ID as key
-            product_dict['sizes'] = sizes_map.get(pm_id, [])
-            
-            # Convert timestamps to ISO format strings
-            if product_dict.get('created_on'):
-                product_dict['created_on'] = product_dict['created_on'].isoformat() if hasattr(product_dict['created_on'], 'isoformat') else str(product_dict['created_on'])
-            if product_dict.get('updated_at'):
-                product_dict['updated_at'] = product_dict['updated_at'].isoformat() if hasattr(product_dict['updated_at'], 'isoformat') else str(product_dict['updated_at'])
-            if product_dict.get('external_created_on'):
-                product_dict['external_created_on'] = product_dict['external_created_on'].isoformat() if hasattr(product_dict['external_created_on'], 'isoformat') else str(product_dict['external_created_on'])
-            
-            result.append(product_dict)
-        
-        return result
-        
+        since = decode_sync_token(token) if token else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        with closing(get_db_connection()) as conn:
+            with conn.cursor(row_factory=dict_row) as cursor:
+                changes = catalog_changes(cursor, since)
+            conn.rollback()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    return json_response(changes)
+
 
 @app.get("/api/v1/products-master/{product_id}")
 def get_product_master(product_id: int):
     """
-    Get a single product from products_master table by ID with sizes
+    Get a single product from products_master table by ID with sizes (catalog index)
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        cursor.execute("""
-            SELECT 
-                pm.id,
-                pm.external_id,
-                pm.name,
-                pm.category,
-                pm.category_id,
-                pm.type,
-                pm.unit,
-                pm.description,
-                pm.image,
-                pm.video,
-                pm.hsn_code,
-                pm.gst,
-                pm.gst_applicable,
-                pm.is_active,
-                pm.created_on,
-                pm.updated_at,
-                pm.has_consumption,
-                pm.external_created_on,
-                pm.designs,
-                pc.qr_code
-            FROM products_master pm
-            LEFT JOIN product_catalog pc ON pm.external_id = pc.external_id
-            WHERE pm.id = %s AND pm.is_active = true
-        """, (product_id,))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        product_dict = dict(product)
-        
-        # Map products_master fields to frontend expected fields
-        product_dict['category_name'] = product_dict.get('category')
-        product_dict['image_url'] = product_dict.get('image')
-        product_dict['video_url'] = product_dict.get('video')
-        
-        # Process designs field - extract design names from the designs object
-        # IMPORTANT: Process designs AFTER all other field mappings to ensure it's the final value
-        designs_raw = product_dict.get('designs')
-        
-        # Force process designs - extract design_name from each design object
-        if designs_raw is not None:
-            try:
-                # Convert to Python dict if it's a psycopg special type
-                if hasattr(designs_raw, '__class__') and 'psycopg' in str(type(designs_raw)):
-                    # It's a psycopg type, convert to dict
-                    designs_raw = dict(designs_raw) if hasattr(designs_raw, '__iter__') else json.loads(str(designs_raw))
-                
-                # If it's a string, parse it
-                if isinstance(designs_raw, str):
-                    designs_raw = json.loads(designs_raw)
-                
-                # Now process the dict
-                if isinstance(designs_raw, dict) and 'designs' in designs_raw:
-                    designs_list = designs_raw['designs']
-                    if isinstance(designs_list, list):
-                        design_names = []
-                        for d in designs_list:
-                            if isinstance(d, dict):
-                                design_name = d.get('design_name') or d.get('design_code') or d.get('name')
-                                if design_name:
-                                    design_names.append(str(design_name))
-                        product_dict['designs'] = design_names
-                    else:
-                        product_dict['designs'] = []
-                else:
-                    # Try process_designs_field as fallback
-                    product_dict['designs'] = process_designs_field(designs_raw)
-            except Exception as e:
-                print(f"ERROR processing designs for product {product_id}: {e}")
-                print(f"Type: {type(designs_raw)}, Value: {str(designs_raw)[:200]}")
-                import traceback
-                traceback.print_exc()
-                product_dict['designs'] = []
-        else:
-            product_dict['designs'] = []
-        
-        # Get sizes for this product - check both direct (product_type='master') and via product_catalog
-        sizes_list = []
-        
-        # First, check for sizes directly linked to products_master (product_id = products_master.id, product_type = 'master')
-        cursor.execute("""
-            SELECT 
-                id,
-                size_id,
-                size_text,
-                price_a,
-                price_b,
-                price_c,
-                price_d,
-                price_e,
-                price_r,
-                is_active
-            FROM product_sizes
-            WHERE product_id = %s AND product_type = 'master' AND is_active = true
-            ORDER BY id
-        """, (product_id,))
-        
-        direct_sizes = cursor.fetchall()
-        for size in direct_sizes:
-            size_dict = {
-                'id': size['id'],
-                'size_id': size['size_id'],
-                'size_text': size['size_text'],
-                'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                'is_active': size['is_active']
-            }
-            sizes_list.append(size_dict)
-        
-        # If no direct sizes found, check via product_catalog
-        if not sizes_list and product['external_id']:
-            cursor.execute("""
-                SELECT 
-                    ps.id,
-                    ps.size_id,
-                    ps.size_text,
-                    ps.price_a,
-                    ps.price_b,
-                    ps.price_c,
-                    ps.price_d,
-                    ps.price_e,
-                    ps.price_r,
-                    ps.is_active
-                FROM product_sizes ps
-                JOIN product_catalog pc ON ps.product_id = pc.id
-                WHERE pc.external_id = %s AND ps.is_active = true
-                ORDER BY ps.size_id
-            """, (product['external_id'],))
-            
-            catalog_sizes = cursor.fetchall()
-            for size in catalog_sizes:
-                size_dict = {
-                    'id': size['id'],
-                    'size_id': size['size_id'],
-                    'size_text': size['size_text'],
-                    'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                    'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                    'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                    'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                    'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                    'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                    'is_active': size['is_active']
-                }
-                sizes_list.append(size_dict)
-        
-        product_dict['sizes'] = sizes_list
-        
-        # Convert timestamps to ISO format strings
-        if product_dict.get('created_on'):
-            product_dict['created_on'] = product_dict['created_on'].isoformat() if hasattr(product_dict['created_on'], 'isoformat') else str(product_dict['created_on'])
-        if product_dict.get('updated_at'):
-            product_dict['updated_at'] = product_dict['updated_at'].isoformat() if hasattr(product_dict['updated_at'], 'isoformat') else str(product_dict['updated_at'])
-        if product_dict.get('external_created_on'):
-            product_dict['external_created_on'] = product_dict['external_created_on'].isoformat() if hasattr(product_dict['external_created_on'], 'isoformat') else str(product_dict['external_created_on'])
-        
-        # FINAL: Process designs field one more time right before returning to ensure it's correct
-        designs_final = product_dict.get('designs')
-        if designs_final is not None:
-            try:
-                # If it's still a dict with 'designs' key, extract the array
-                if isinstance(designs_final, dict) and 'designs' in designs_final:
-                    designs_list = designs_final.get('designs', [])
-                    if isinstance(designs_list, list):
-                        design_names = []
-                        for d in designs_list:
-                            if isinstance(d, dict):
-                                design_name = d.get('design_name') or d.get('design_code') or d.get('name')
-                                if design_name:
-                                    design_names.append(str(design_name))
-                        # FORCE SET the designs list
-                        product_dict['designs'] = design_names
-                        print(f"FINAL: Set designs to {len(design_names)} items: {design_names[:3]}")
-                elif not isinstance(designs_final, list):
-                    # If it's not a list and not the expected dict format, set to empty
-                    product_dict['designs'] = []
-            except Exception as e:
-                print(f"Final designs processing error: {e}")
-                import traceback
-                traceback.print_exc()
-                product_dict['designs'] = []
-        
-        # Double-check: ensure designs is a list before returning
-        if not isinstance(product_dict.get('designs'), list):
-            print(f"WARNING: designs is not a list, type: {type(product_dict.get('designs'))}, setting to empty list")
-            product_dict['designs'] = []
-        
-        return product_dict
-        
-    except HTTPException:
-        raise
+        entry = catalog_index.snapshot().get(product_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return entry.master
+
 
 @app.get("/api/v1/products-master/{product_id}/sizes")
 def get_product_master_sizes(product_id: int):
     """
     Get sizes for a product from products_master
-    Checks both direct sizes (product_type='master') and sizes via product_catalog
+    Direct sizes (product_type='master') first, otherwise sizes via product_catalog (catalog index)
     """
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(row_factory=dict_row)
-        
-        # Get product from products_master
-        cursor.execute("""
-            SELECT id, external_id, name
-            FROM products_master
-            WHERE id = %s AND is_active = true
-        """, (product_id,))
-        
-        product = cursor.fetchone()
-        
-        if not product:
-            raise HTTPException(status_code=404, detail="Product not found")
-        
-        sizes_list = []
-        
-        # First, check for sizes directly linked to products_master (product_type='master')
-        cursor.execute("""
-            SELECT 
-                id,
-                size_id,
-                size_text,
-                price_a,
-                price_b,
-                price_c,
-                price_d,
-                price_e,
-                price_r,
-                is_active
-            FROM product_sizes
-            WHERE product_id = %s AND product_type = 'master' AND is_active = true
-            ORDER BY id
-        """, (product_id,))
-        
-        direct_sizes = cursor.fetchall()
-        for size in direct_sizes:
-            size_dict = {
-                'id': size['id'],
-                'size_id': size['size_id'],
-                'size_text': size['size_text'],
-                'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                'is_active': size['is_active']
-            }
-            sizes_list.append(size_dict)
-        
-        # If no direct sizes found, check via product_catalog
-        if not sizes_list and product['external_id']:
-            cursor.execute("""
-                SELECT 
-                    ps.id,
-                    ps.size_id,
-                    ps.size_text,
-                    ps.price_a,
-                    ps.price_b,
-                    ps.price_c,
-                    ps.price_d,
-                    ps.price_e,
-                    ps.price_r,
-                    ps.is_active
-                FROM product_sizes ps
-                JOIN product_catalog pc ON ps.product_id = pc.id
-                WHERE pc.external_id = %s AND ps.is_active = true
-                ORDER BY ps.size_id
-            """, (product['external_id'],))
-            
-            catalog_sizes = cursor.fetchall()
-            for size in catalog_sizes:
-                size_dict = {
-                    'id': size['id'],
-                    'size_id': size['size_id'],
-                    'size_text': size['size_text'],
-                    'price_a': float(size['price_a']) if size['price_a'] is not None else None,
-                    'price_b': float(size['price_b']) if size['price_b'] is not None else None,
-                    'price_c': float(size['price_c']) if size['price_c'] is not None else None,
-                    'price_d': float(size['price_d']) if size['price_d'] is not None else None,
-                    'price_e': float(size['price_e']) if size['price_e'] is not None else None,
-                    'price_r': float(size['price_r']) if size['price_r'] is not None else None,
-                    'is_active': size['is_active']
-                }
-                sizes_list.append(size_dict)
-        
-        return {
-            'product_id': product_id,
-            'product_name': product['name'],
-            'external_id': product['external_id'],
-            'sizes': sizes_list,
-            'count': len(sizes_list)
-        }
-        
-    except HTTPException:
-        raise
+        entry = catalog_index.snapshot().get(product_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-    finally:
-        if conn:
-            cursor.close()
-            conn.close()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return entry.sizes_payload()
+
 
 @app.post("/api/v1/products-master/")
 def create_product_master(product_data: dict):
@@ -4835,6 +2821,7 @@ def create_product_master(product_data: dict):
         
         new_product = cursor.fetchone()
         conn.commit()
+        catalog_index.invalidate()
         
         product_dict = dict(new_product)
         # Convert timestamps to ISO format strings
@@ -4869,6 +2856,189 @@ def create_product_master(product_data: dict):
             cursor.close()
             conn.close()
 
+# ============================================================================
+# Async read path (DB_ASYNC_READS=1)
+# Read-heavy endpoints served from psycopg AsyncConnection + AsyncConnectionPool,
+# so they don't hold a threadpool slot while waiting on Postgres.
+# (Product reads are served from the in-memory catalog index and stay sync.)
+# ============================================================================
+
+async def get_challan_async(challan_id: int):
+    """
+    Retrieve challan details including items.
+    """
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                await schema_registry.ensure_async("challans", cursor)
+                await cursor.execute("SELECT * FROM challans WHERE id = %s", (challan_id,))
+                challan_row = await cursor.fetchone()
+                if not challan_row:
+                    raise HTTPException(status_code=404, detail="Challan not found")
+                await cursor.execute("""
+                    SELECT *
+                    FROM challan_items
+                    WHERE challan_id = %s
+                    ORDER BY id
+                """, (challan_id,))
+                items = await cursor.fetchall()
+        return json_response(serialize_challan(challan_row, items))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"get_challan_async({challan_id}) error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error retrieving challan: {str(e)}"
+        )
+
+
+async def list_challans_async(status: str = None, search: str = None, limit: int = 50):
+    """
+    Retrieve challans with optional filtering. Cached 30s to avoid timeout on retry.
+    """
+    cache_key = (status or "", search or "", min(limit, 100))
+    cached = _challans_list_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached)
+
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                query, params = _challans_list_query(status, search, limit)
+                await cursor.execute(query, params)
+                rows = await cursor.fetchall()
+                count_rows = []
+                if rows:
+                    await cursor.execute(_CHALLAN_ITEM_COUNTS_SQL, ([r["id"] for r in rows],))
+                    count_rows = await cursor.fetchall()
+        result = _challans_list_result(rows, count_rows)
+        _challans_list_cache.set(cache_key, result)
+        return json_response(result)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching challans: {str(e)}"
+        )
+
+
+async def get_challan_options_async(quick: bool = False):
+    """Async twin of get_challan_options (same dictionary read, cache and single-flight)."""
+
+    async def load():
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                await schema_registry.ensure_async("challans", cursor)
+                raw, version = await load_option_values_async(cursor)
+        result = _assemble_challan_options(raw)
+        result["version"] = version
+        return result
+
+    try:
+        return await _challan_options_cache.get_or_load_async(_CHALLAN_OPTIONS_KEY, load)
+    except Exception as e:
+        print(f"Error in get_challan_options_async: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error fetching challan options: {str(e)}"
+        )
+
+
+async def search_challan_options_async(field: str = "party_names", q: str = "", limit: int = None):
+    """Async twin of search_challan_options."""
+    limit = _option_search_params(field, limit)
+    try:
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                results = await search_option_values_async(cursor, field, q, limit)
+    except Exception as e:
+        print(f"Error in search_challan_options_async: {e}")
+        raise HTTPException(status_code=500, detail=f"Error searching challan options: {str(e)}")
+    return {"field": field, "q": q, "count": len(results), "results": results}
+
+
+async def get_party_data_from_orders_impl_async(party_name_value: str = None):
+    """
+    Async twin of get_party_data_from_orders_impl: same query, precedence, cache and single-flight.
+    Always returns data (or null values), never an error.
+    """
+    party_trimmed, key = _normalize_party_lookup(party_name_value)
+    if not party_trimmed:
+        return empty_party_data()
+
+    async def load():
+        async with async_db_connection() as conn:
+            async with conn.cursor(row_factory=dict_row) as cursor:
+                response_data = await lookup_party_profile_async(cursor, party_trimmed)
+                if response_data is None:
+                    response_data = await resolve_party_profile_async(cursor, party_trimmed)
+        _log_party_data(party_trimmed, response_data)
+        return response_data
+
+    try:
+        return await _party_data_cache.get_or_load_async(key, load)
+    except Exception as e:
+        print(f"ERROR fetching party data for '{party_trimmed}': {e}")
+        return empty_party_data()
+
+
+async def get_party_data_from_orders_query_async(party_name: str = None):
+    """Query parameter version: /api/orders/party-data?party_name=..."""
+    return await get_party_data_from_orders_impl_async(party_name)
+
+
+async def get_party_data_from_orders_path_async(party_name_path: str):
+    """Path parameter version: /api/orders/party-data/{name} - uses :path to handle / in names"""
+    return await get_party_data_from_orders_impl_async(party_name_path)
+
+
+def _install_async_read_routes():
+    """
+    Swap the sync read handlers for their async variants, keeping paths, parameters and order.
+    The sync functions stay importable (cache warm-up calls them directly).
+    """
+    async_handlers = {
+        "get_challan": get_challan_async,
+        "list_challans": list_challans_async,
+        "get_challan_options": get_challan_options_async,
+        "search_challan_options": search_challan_options_async,
+        "get_party_data_from_orders_query": get_party_data_from_orders_query_async,
+        "get_party_data_from_orders_path": get_party_data_from_orders_path_async,
+    }
+    for index, route in enumerate(app.router.routes):
+        if isinstance(route, APIRoute) and route.name in async_handlers:
+            app.router.routes[index] = APIRoute(
+                route.path,
+                async_handlers[route.name],
+                methods=list(route.methods),
+                name=route.name,
+                summary=route.summary,
+                description=route.description,
+                tags=route.tags,
+                response_model=route.response_model,
+                status_code=route.status_code,
+                dependencies=route.dependencies,
+                response_description=route.response_description,
+                responses=route.responses,
+                deprecated=route.deprecated,
+                operation_id=route.operation_id,
+                response_model_include=route.response_model_include,
+                response_model_exclude=route.response_model_exclude,
+                response_model_by_alias=route.response_model_by_alias,
+                response_model_exclude_unset=route.response_model_exclude_unset,
+                response_model_exclude_defaults=route.response_model_exclude_defaults,
+                response_model_exclude_none=route.response_model_exclude_none,
+                include_in_schema=route.include_in_schema,
+                response_class=route.response_class,
+                callbacks=route.callbacks,
+                openapi_extra=route.openapi_extra,
+                generate_unique_id_function=route.generate_unique_id_function,
+            )
+
+
+if ASYNC_READS:
+    _install_async_read_routes()
+
 if __name__ == "__main__":
     import uvicorn  # type: ignore
     # Use 0.0.0.0 to listen on all interfaces - required for remote access.
@@ -0,0 +1,180 @@
+"""
+Versioned schema migrations.
+
+Migrations are plain SQL files in migrations/ named NNNN_description.sql. They are
+applied in order, each in its own transaction, and recorded in schema_migrations.
+Every file is idempotent (IF NOT EXISTS / catalog checks), so databases that were
+bootstrapped by the old ad-hoc DDL in main.py can be brought under version control
+without manual steps.
+
+Usage:
+    python migrate.py              # apply pending migrations (same as "upgrade")
+    python migrate.py upgrade
+    python migrate.py status
+"""
+import argparse
+from collections import namedtuple
+import hashlib
+from pathlib import Path
+import re
+import sys
+
+import psycopg  # type: ignore
+from psycopg.rows import dict_row  # type: ignore
+
+from config import get_db_connection_params
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+# pg_advisory_lock id so concurrent workers/CLI runs apply migrations one at a time
+MIGRATION_LOCK_ID = 8248
+
+Migration = namedtuple("Migration", ["version", "name", "path", "checksum"])
+
+_SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def load_migrations(directory: Path = MIGRATIONS_DIR):
+    """Return all migration files, ordered by version."""
+    migrations = {}
+    for path in sorted(directory.glob("*.sql")):
+        match = MIGRATION_FILE_RE.match(path.name)
+        if not match:
+            raise ValueError(f"Invalid migration file name: {path.name}")
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        checksum = hashlib.sha256(path.read_bytes()).hexdigest()
+        migrations[version] = Migration(version, match.group(2), path, checksum)
+    return [migrations[v] for v in sorted(migrations)]
+
+
+def latest_version() -> int:
+    migrations = load_migrations()
+    return migrations[-1].version if migrations else 0
+
+
+def schema_version(cursor) -> int:
+    """
+    Highest applied migration version (0 if none). Read-only: safe to call from
+    request handlers, never creates schema_migrations.
+    """
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS exists")
+    row = cursor.fetchone()
+    if not (row["exists"] if isinstance(row, dict) else row[0]):
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_migrations")
+    row = cursor.fetchone()
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+async def schema_version_async(cursor) -> int:
+    """schema_version() for an async cursor."""
+    await cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS exists")
+    row = await cursor.fetchone()
+    if not (row["exists"] if isinstance(row, dict) else row[0]):
+        return 0
+    await cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_migrations")
+    row = await cursor.fetchone()
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def applied_migrations(cursor) -> dict:
+    """version -> {name, checksum, applied_at} for every recorded migration."""
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL AS exists")
+    if not cursor.fetchone()["exists"]:
+        return {}
+    cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version")
+    return {row["version"]: row for row in cursor.fetchall()}
+
+
+def apply_migrations(conn, target: int = None):
+    """
+    Apply pending migrations (up to target, if given) in version order.
+    Each migration runs in its own transaction together with its schema_migrations
+    row, so a failure leaves the database at the last fully applied version.
+    Returns the list of applied Migration entries.
+    """
+    migrations = load_migrations()
+    applied = []
+    with conn.cursor(row_factory=dict_row) as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        try:
+            cursor.execute(_SCHEMA_MIGRATIONS_SQL)
+            conn.commit()
+            done = applied_migrations(cursor)
+            for migration in migrations:
+                if target is not None and migration.version > target:
+                    break
+                if migration.version in done:
+                    if done[migration.version]["checksum"] != migration.checksum:
+                        print(
+                            f"Warning: migration {migration.version:04d}_{migration.name} "
+                            f"was modified after it was applied"
+                        )
+                    continue
+                print(f"Applying migration {migration.version:04d}_{migration.name}...")
+                try:
+                    cursor.execute(migration.path.read_text())
+                    cursor.execute(
+                        """
+                        INSERT INTO schema_migrations (version, name, checksum)
+                        VALUES (%s, %s, %s)
+                        """,
+                        (migration.version, migration.name, migration.checksum),
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    print(f"Migration {migration.version:04d}_{migration.name} failed")
+                    raise
+                applied.append(migration)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+    if applied:
+        print(f"Applied {len(applied)} migration(s); schema is at version {applied[-1].version}")
+    return applied
+
+
+def migration_status(conn):
+    """[(Migration, applied_at or None)] for every migration file."""
+    with conn.cursor(row_factory=dict_row) as cursor:
+        done = applied_migrations(cursor)
+    conn.rollback()
+    return [
+        (migration, done[migration.version]["applied_at"] if migration.version in done else None)
+        for migration in load_migrations()
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply or inspect database schema migrations")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    parser.add_argument("--target", type=int, default=None, help="Stop after this migration version")
+    args = parser.parse_args(argv)
+
+    conn = psycopg.connect(**get_db_connection_params())
+    try:
+        if args.command == "status":
+            for migration, applied_at in migration_status(conn):
+                state = f"applied {applied_at}" if applied_at else "pending"
+                print(f"{migration.version:04d}_{migration.name:<30} {state}")
+        else:
+            applied = apply_migrations(conn, target=args.target)
+            if not applied:
+                print("Schema is up to date")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
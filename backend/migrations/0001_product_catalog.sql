@@ -0,0 +1,36 @@
+-- Product catalog and sizes (previously ensure_product_tables)
+CREATE TABLE IF NOT EXISTS product_catalog (
+    id SERIAL PRIMARY KEY,
+    external_id INTEGER,
+    name VARCHAR(500) NOT NULL,
+    category_id INTEGER,
+    category_name VARCHAR(255),
+    image_url TEXT,
+    video_url TEXT,
+    qr_code TEXT,
+    is_active BOOLEAN DEFAULT TRUE,
+    metadata JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS product_sizes (
+    id SERIAL PRIMARY KEY,
+    product_id INTEGER REFERENCES product_catalog(id) ON DELETE CASCADE,
+    size_id INTEGER,
+    size_text VARCHAR(100),
+    price_a NUMERIC(12, 2),
+    price_b NUMERIC(12, 2),
+    price_c NUMERIC(12, 2),
+    price_d NUMERIC(12, 2),
+    price_e NUMERIC(12, 2),
+    price_r NUMERIC(12, 2),
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_product_catalog_external_id
+    ON product_catalog(external_id) WHERE external_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_product_sizes_product_id ON product_sizes(product_id);
+CREATE INDEX IF NOT EXISTS idx_product_sizes_size_id ON product_sizes(size_id);
@@ -0,0 +1,107 @@
+-- Orders and order items (previously ensure_orders_table plus the per-request
+-- column checks in create_order / create_order_with_multiple_items)
+CREATE TABLE IF NOT EXISTS orders (
+    id SERIAL PRIMARY KEY,
+    order_number VARCHAR(50) UNIQUE NOT NULL,
+    party_name VARCHAR(255),
+    station VARCHAR(255),
+    price_category VARCHAR(100),
+    product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
+    product_external_id INTEGER,
+    product_name VARCHAR(500),
+    size_id INTEGER,
+    size_text VARCHAR(100),
+    quantity INTEGER NOT NULL DEFAULT 1,
+    unit_price DECIMAL(12, 2),
+    total_price DECIMAL(12, 2) NOT NULL,
+    customer_name VARCHAR(255) NOT NULL,
+    customer_phone VARCHAR(20),
+    customer_email VARCHAR(255),
+    customer_address TEXT,
+    order_status VARCHAR(50) DEFAULT 'pending' CHECK (
+        order_status IN ('pending', 'confirmed', 'processing', 'shipped', 'delivered', 'cancelled')
+    ),
+    payment_status VARCHAR(50) DEFAULT 'pending' CHECK (
+        payment_status IN ('pending', 'partial', 'paid', 'refunded')
+    ),
+    payment_method VARCHAR(50),
+    transport_name VARCHAR(255),
+    notes TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_by VARCHAR(255)
+);
+
+-- Columns missing from older orders tables
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS order_number VARCHAR(50);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS party_name VARCHAR(255);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS station VARCHAR(255);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS price_category VARCHAR(100);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS transport_name VARCHAR(255);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS created_by VARCHAR(255);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS challan_number VARCHAR(255);
+
+UPDATE orders
+SET order_number = 'DJ-' || LPAD(id::TEXT, 6, '0')
+WHERE order_number IS NULL;
+
+ALTER TABLE orders ALTER COLUMN order_number SET NOT NULL;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'orders'::regclass AND contype = 'u'
+          AND conkey = ARRAY[(
+              SELECT attnum FROM pg_attribute
+              WHERE attrelid = 'orders'::regclass AND attname = 'order_number'
+          )]
+    ) THEN
+        ALTER TABLE orders ADD CONSTRAINT orders_order_number_key UNIQUE (order_number);
+    END IF;
+END $$;
+
+-- orders.product_id must reference product_catalog, not the legacy products table
+DO $$
+DECLARE
+    fk RECORD;
+BEGIN
+    FOR fk IN
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'orders'::regclass AND contype = 'f'
+          AND confrelid = to_regclass('products')
+    LOOP
+        EXECUTE format('ALTER TABLE orders DROP CONSTRAINT %I', fk.conname);
+    END LOOP;
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'orders'::regclass AND contype = 'f'
+          AND confrelid = 'product_catalog'::regclass
+    ) THEN
+        ALTER TABLE orders
+            ADD CONSTRAINT orders_product_id_fkey
+            FOREIGN KEY (product_id) REFERENCES product_catalog(id) ON DELETE SET NULL;
+    END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_orders_order_number ON orders(order_number);
+CREATE INDEX IF NOT EXISTS idx_orders_product_id ON orders(product_id);
+-- Challan options queries (DISTINCT on party, station, transport)
+CREATE INDEX IF NOT EXISTS idx_orders_party_name ON orders(party_name);
+CREATE INDEX IF NOT EXISTS idx_orders_station ON orders(station);
+CREATE INDEX IF NOT EXISTS idx_orders_transport_name ON orders(transport_name);
+
+CREATE TABLE IF NOT EXISTS order_items (
+    id SERIAL PRIMARY KEY,
+    order_id INTEGER REFERENCES orders(id) ON DELETE CASCADE,
+    product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
+    product_external_id INTEGER,
+    product_name VARCHAR(500),
+    size_id INTEGER,
+    size_text VARCHAR(100),
+    quantity INTEGER NOT NULL DEFAULT 1,
+    unit_price DECIMAL(12, 2),
+    total_price DECIMAL(12, 2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_order_items_order_id ON order_items(order_id);
@@ -0,0 +1,85 @@
+-- Challans and challan items (previously ensure_challan_tables)
+CREATE TABLE IF NOT EXISTS challans (
+    id SERIAL PRIMARY KEY,
+    challan_number VARCHAR(255) UNIQUE NOT NULL,
+    party_name VARCHAR(255) NOT NULL,
+    station_name VARCHAR(255) NOT NULL,
+    transport_name VARCHAR(255),
+    price_category VARCHAR(100),
+    total_amount NUMERIC(12, 2) DEFAULT 0,
+    total_quantity NUMERIC(12, 2) DEFAULT 0,
+    status VARCHAR(50) DEFAULT 'draft' CHECK (
+        status IN ('draft', 'ready', 'in_transit', 'delivered', 'cancelled')
+    ),
+    notes TEXT,
+    metadata JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Columns missing from older challans tables
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS challan_number VARCHAR(255);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS party_name VARCHAR(255);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS station_name VARCHAR(255);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS transport_name VARCHAR(255);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS price_category VARCHAR(100);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS total_amount NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS total_quantity NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS gst_amount NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS apply_gst VARCHAR(50);
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS status VARCHAR(50) DEFAULT 'draft';
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS notes TEXT;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS metadata JSONB;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE challans ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+-- UNIQUE on challan_number so duplicate numbers are rejected at DB level
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'challans'::regclass AND contype = 'u'
+          AND conkey = ARRAY[(
+              SELECT attnum FROM pg_attribute
+              WHERE attrelid = 'challans'::regclass AND attname = 'challan_number'
+          )]
+    ) THEN
+        ALTER TABLE challans ADD CONSTRAINT challans_challan_number_key UNIQUE (challan_number);
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS challan_items (
+    id SERIAL PRIMARY KEY,
+    challan_id INTEGER REFERENCES challans(id) ON DELETE CASCADE,
+    product_id INTEGER REFERENCES product_catalog(id) ON DELETE SET NULL,
+    product_name VARCHAR(500) NOT NULL,
+    size_id INTEGER,
+    size_text VARCHAR(100),
+    quantity NUMERIC(12, 2) NOT NULL DEFAULT 1,
+    unit_price NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    total_price NUMERIC(12, 2) NOT NULL DEFAULT 0,
+    qr_code TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Columns missing from older challan_items tables (unit/gst are written by create/update challan)
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS challan_id INTEGER;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS product_id INTEGER;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS product_name VARCHAR(500);
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS size_id INTEGER;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS size_text VARCHAR(100);
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS quantity NUMERIC(12, 2) DEFAULT 1;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS unit_price NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS total_price NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS qr_code TEXT;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS unit VARCHAR(50) DEFAULT 'piece';
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS gst NUMERIC(12, 2) DEFAULT 0;
+ALTER TABLE challan_items ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+CREATE INDEX IF NOT EXISTS idx_challans_number ON challans(challan_number);
+CREATE INDEX IF NOT EXISTS idx_challans_status ON challans(status);
+CREATE INDEX IF NOT EXISTS idx_challans_party_name ON challans(party_name);
+CREATE INDEX IF NOT EXISTS idx_challans_station_name ON challans(station_name);
+CREATE INDEX IF NOT EXISTS idx_challans_transport_name ON challans(transport_name);
+CREATE INDEX IF NOT EXISTS idx_challans_created_at ON challans(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_challan_items_challan_id ON challan_items(challan_id);
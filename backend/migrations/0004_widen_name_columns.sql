@@ -0,0 +1,30 @@
+-- Widen name columns to VARCHAR(255) (previously _migrate_varchar_columns and the
+-- pre-insert ALTERs in create_challan). Only columns that are still shorter are
+-- altered, so re-running this never rewrites or locks an already migrated table.
+DO $$
+DECLARE
+    col RECORD;
+BEGIN
+    FOR col IN
+        SELECT c.table_name, c.column_name
+        FROM information_schema.columns c
+        WHERE c.table_schema = current_schema()
+          AND (c.table_name, c.column_name) IN (
+              ('challans', 'challan_number'),
+              ('challans', 'party_name'),
+              ('challans', 'station_name'),
+              ('challans', 'transport_name'),
+              ('orders', 'party_name'),
+              ('orders', 'station'),
+              ('orders', 'transport_name')
+          )
+          AND c.data_type = 'character varying'
+          AND c.character_maximum_length < 255
+    LOOP
+        EXECUTE format(
+            'ALTER TABLE %I ALTER COLUMN %I TYPE VARCHAR(255)',
+            col.table_name, col.column_name
+        );
+        RAISE NOTICE 'Widened %.% to VARCHAR(255)', col.table_name, col.column_name;
+    END LOOP;
+END $$;
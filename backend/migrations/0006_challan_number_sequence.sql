@@ -0,0 +1,15 @@
+-- Global DC series for challan numbers ("PARTY - DC000001" / "DC000001").
+-- Replaces the advisory-locked max() scan in generate_challan_number.
+CREATE SEQUENCE IF NOT EXISTS challan_dc_seq AS BIGINT START WITH 1 MINVALUE 1;
+
+-- One-time seed from the highest DC number already issued (either format).
+-- Only ever moves the sequence forward, so re-running is harmless.
+SELECT setval('challan_dc_seq', existing.max_dc, true)
+FROM (
+    SELECT MAX(CAST(SUBSTRING(challan_number FROM 'DC([0-9]+)$') AS BIGINT)) AS max_dc
+    FROM challans
+    WHERE challan_number ~ 'DC[0-9]+$'
+) AS existing
+WHERE existing.max_dc > (
+    SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM challan_dc_seq
+);
@@ -0,0 +1,14 @@
+-- DJ-XXXXXX order numbers. Replaces the max() scan + uniqueness probes in
+-- create_order / create_order_with_multiple_items.
+CREATE SEQUENCE IF NOT EXISTS order_number_seq AS BIGINT START WITH 1 MINVALUE 1;
+
+-- One-time seed from the highest DJ- number already issued; only moves forward.
+SELECT setval('order_number_seq', existing.max_number, true)
+FROM (
+    SELECT MAX(CAST(SUBSTRING(order_number FROM '^DJ-([0-9]+)$') AS BIGINT)) AS max_number
+    FROM orders
+    WHERE order_number ~ '^DJ-[0-9]+$'
+) AS existing
+WHERE existing.max_number > (
+    SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM order_number_seq
+);
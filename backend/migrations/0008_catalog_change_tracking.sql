@@ -0,0 +1,6 @@
+-- Indexes for the catalog index change probe (MAX(updated_at) / updated_at >= watermark)
+CREATE INDEX IF NOT EXISTS idx_products_master_updated_at ON products_master(updated_at);
+CREATE INDEX IF NOT EXISTS idx_product_catalog_updated_at ON product_catalog(updated_at);
+CREATE INDEX IF NOT EXISTS idx_product_sizes_updated_at ON product_sizes(updated_at);
+-- Direct (products_master) size lookups
+CREATE INDEX IF NOT EXISTS idx_product_sizes_type_product ON product_sizes(product_type, product_id);
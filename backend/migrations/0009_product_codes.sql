@@ -0,0 +1,84 @@
+-- Scan code -> product lookup table for /api/product/barcode.
+-- One row per code an active product answers to: its external_id as text, its
+-- product_catalog.qr_code and the code embedded in a printed QR URL
+-- (http://host/qr?CODE, ?code=CODE, or /qr/CODE when there is no query).
+-- Kept current by triggers; catalog.qr_code_variants() extracts the same codes.
+CREATE TABLE IF NOT EXISTS product_codes (
+    code TEXT PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    source VARCHAR(20) NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_product_codes_product_id ON product_codes(product_id);
+
+CREATE OR REPLACE FUNCTION product_qr_code_variants(qr TEXT) RETURNS TEXT[]
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT array_remove(ARRAY[
+        NULLIF(qr, ''),
+        CASE WHEN qr ~* '^https?://' THEN substring(qr from '\?([^=&#]+)$') END,
+        CASE WHEN qr ~* '^https?://' THEN substring(qr from '[?&](?:code|id|qr|barcode)=([^&#]+)') END,
+        CASE WHEN qr ~* '^https?://[^?#]*$' THEN substring(qr from '^https?://[^/?#]+[^?#]*/([^/?#]+)$') END
+    ], NULL)
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_product_codes(master_ids INTEGER[]) RETURNS VOID
+LANGUAGE sql AS $$
+    DELETE FROM product_codes WHERE product_id = ANY(master_ids);
+    INSERT INTO product_codes (code, product_id, source)
+    SELECT DISTINCT ON (code) code, product_id, source
+    FROM (
+        SELECT variant AS code, pm.id AS product_id, 'qr_code' AS source, 0 AS priority
+        FROM products_master pm
+        JOIN product_catalog pc ON pc.external_id = pm.external_id
+        CROSS JOIN LATERAL unnest(product_qr_code_variants(pc.qr_code)) AS variant
+        WHERE pm.id = ANY(master_ids) AND pm.is_active = true
+        UNION ALL
+        SELECT pm.external_id::text, pm.id, 'external_id', 1
+        FROM products_master pm
+        WHERE pm.id = ANY(master_ids) AND pm.is_active = true AND pm.external_id IS NOT NULL
+    ) candidates
+    ORDER BY code, priority, product_id
+    ON CONFLICT (code) DO NOTHING;
+$$;
+
+CREATE OR REPLACE FUNCTION products_master_codes_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM product_codes WHERE product_id = OLD.id;
+        RETURN OLD;
+    END IF;
+    PERFORM refresh_product_codes(ARRAY[NEW.id]);
+    RETURN NEW;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION product_catalog_codes_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids INTEGER[];
+BEGIN
+    SELECT array_agg(pm.id) INTO ids
+    FROM products_master pm
+    WHERE pm.external_id IN (
+        CASE WHEN TG_OP <> 'INSERT' THEN OLD.external_id END,
+        CASE WHEN TG_OP <> 'DELETE' THEN NEW.external_id END
+    );
+    IF ids IS NOT NULL THEN
+        PERFORM refresh_product_codes(ids);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_products_master_codes ON products_master;
+CREATE TRIGGER trg_products_master_codes
+    AFTER INSERT OR DELETE OR UPDATE OF external_id, is_active ON products_master
+    FOR EACH ROW EXECUTE FUNCTION products_master_codes_trigger();
+
+DROP TRIGGER IF EXISTS trg_product_catalog_codes ON product_catalog;
+CREATE TRIGGER trg_product_catalog_codes
+    AFTER INSERT OR DELETE OR UPDATE OF external_id, qr_code ON product_catalog
+    FOR EACH ROW EXECUTE FUNCTION product_catalog_codes_trigger();
+
+-- Backfill
+SELECT refresh_product_codes(ARRAY(SELECT id FROM products_master));
@@ -0,0 +1,3 @@
+-- Catalog order for paginated product listings: active products by (name, id)
+CREATE INDEX IF NOT EXISTS idx_products_master_active_name_id
+    ON products_master(name, id) WHERE is_active = true;
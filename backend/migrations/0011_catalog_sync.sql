@@ -0,0 +1,69 @@
+-- Change tracking for the catalog delta sync endpoint (/api/v1/products-master/changes)
+
+-- Any update bumps updated_at unless the writer set it explicitly, so deactivations
+-- and price edits made by the product import are visible to "changed since" queries.
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_products_master_touch ON products_master;
+CREATE TRIGGER trg_products_master_touch
+    BEFORE UPDATE ON products_master
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_product_catalog_touch ON product_catalog;
+CREATE TRIGGER trg_product_catalog_touch
+    BEFORE UPDATE ON product_catalog
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_product_sizes_touch ON product_sizes;
+CREATE TRIGGER trg_product_sizes_touch
+    BEFORE UPDATE ON product_sizes
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+-- Tombstones for hard deletes; product_id is the affected products_master id
+CREATE TABLE IF NOT EXISTS catalog_deletions (
+    id BIGSERIAL PRIMARY KEY,
+    table_name VARCHAR(50) NOT NULL,
+    row_id INTEGER NOT NULL,
+    product_id INTEGER,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_deletions_deleted_at ON catalog_deletions(deleted_at);
+
+CREATE OR REPLACE FUNCTION record_catalog_deletion() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    master_id INTEGER;
+BEGIN
+    IF TG_TABLE_NAME = 'products_master' THEN
+        master_id := OLD.id;
+    ELSIF OLD.product_type = 'master' THEN
+        master_id := OLD.product_id;
+    ELSE
+        SELECT pm.id INTO master_id
+        FROM product_catalog pc
+        JOIN products_master pm ON pm.external_id = pc.external_id
+        WHERE pc.id = OLD.product_id;
+    END IF;
+    INSERT INTO catalog_deletions (table_name, row_id, product_id)
+    VALUES (TG_TABLE_NAME, OLD.id, master_id);
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_products_master_deletions ON products_master;
+CREATE TRIGGER trg_products_master_deletions
+    AFTER DELETE ON products_master
+    FOR EACH ROW EXECUTE FUNCTION record_catalog_deletion();
+
+DROP TRIGGER IF EXISTS trg_product_sizes_deletions ON product_sizes;
+CREATE TRIGGER trg_product_sizes_deletions
+    AFTER DELETE ON product_sizes
+    FOR EACH ROW EXECUTE FUNCTION record_catalog_deletion();
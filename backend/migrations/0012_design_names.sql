@@ -0,0 +1,92 @@
+-- Normalized design names, maintained on write so readers never parse products_master.designs.
+-- Mirrors catalog.design_names(): {"designs": [{design_name|design_code|name}]},
+-- {"design": [..] | value}, a list of strings or objects, a JSON-encoded string,
+-- or a plain comma-separated string.
+CREATE OR REPLACE FUNCTION normalize_design_names(designs JSONB) RETURNS TEXT[]
+LANGUAGE plpgsql IMMUTABLE AS $$
+DECLARE
+    items JSONB;
+    parsed JSONB;
+BEGIN
+    IF designs IS NULL OR jsonb_typeof(designs) = 'null' THEN
+        RETURN ARRAY[]::TEXT[];
+    END IF;
+
+    IF jsonb_typeof(designs) = 'string' THEN
+        BEGIN
+            parsed := (designs #>> '{}')::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN ARRAY(
+                SELECT btrim(part)
+                FROM unnest(string_to_array(designs #>> '{}', ',')) AS part
+                WHERE btrim(part) <> ''
+            );
+        END;
+        RETURN normalize_design_names(parsed);
+    END IF;
+
+    IF jsonb_typeof(designs) = 'object' THEN
+        IF designs ? 'designs' THEN
+            -- Only objects count inside {"designs": [...]}
+            IF jsonb_typeof(designs -> 'designs') <> 'array' THEN
+                RETURN ARRAY[]::TEXT[];
+            END IF;
+            items := designs -> 'designs';
+        ELSIF designs ? 'design' THEN
+            IF jsonb_typeof(designs -> 'design') = 'array' THEN
+                RETURN ARRAY(SELECT jsonb_array_elements_text(designs -> 'design'));
+            END IF;
+            RETURN ARRAY[designs ->> 'design'];
+        ELSE
+            RETURN ARRAY[designs::text];
+        END IF;
+    ELSIF jsonb_typeof(designs) = 'array' THEN
+        IF jsonb_array_length(designs) = 0 THEN
+            RETURN ARRAY[]::TEXT[];
+        END IF;
+        IF jsonb_typeof(designs -> 0) = 'string' THEN
+            RETURN ARRAY(SELECT jsonb_array_elements_text(designs));
+        END IF;
+        IF jsonb_typeof(designs -> 0) <> 'object' THEN
+            RETURN ARRAY[designs::text];
+        END IF;
+        items := designs;
+    ELSE
+        RETURN ARRAY[designs #>> '{}'];
+    END IF;
+
+    RETURN ARRAY(
+        SELECT name
+        FROM jsonb_array_elements(items) WITH ORDINALITY AS e(item, position)
+        CROSS JOIN LATERAL (
+            SELECT COALESCE(
+                NULLIF(item ->> 'design_name', ''),
+                NULLIF(item ->> 'design_code', ''),
+                NULLIF(item ->> 'name', '')
+            ) AS name
+        ) n
+        WHERE jsonb_typeof(item) = 'object' AND name IS NOT NULL
+        ORDER BY position
+    );
+END;
+$$;
+
+ALTER TABLE products_master ADD COLUMN IF NOT EXISTS design_names TEXT[];
+
+CREATE OR REPLACE FUNCTION products_master_design_names_trigger() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.design_names := normalize_design_names(to_jsonb(NEW.designs));
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_products_master_design_names ON products_master;
+CREATE TRIGGER trg_products_master_design_names
+    BEFORE INSERT OR UPDATE OF designs ON products_master
+    FOR EACH ROW EXECUTE FUNCTION products_master_design_names_trigger();
+
+-- Backfill without bumping updated_at (that would make every sync client re-download)
+ALTER TABLE products_master DISABLE TRIGGER trg_products_master_touch;
+UPDATE products_master SET designs = designs;
+ALTER TABLE products_master ENABLE TRIGGER trg_products_master_touch;
@@ -0,0 +1,20 @@
+-- Expression indexes for party lookups by normalized name (LOWER(TRIM(...)) = LOWER(TRIM(%s)))
+CREATE INDEX IF NOT EXISTS idx_challans_party_name_norm
+    ON challans (LOWER(TRIM(party_name)), created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_party_name_norm
+    ON orders (LOWER(TRIM(party_name)), created_at DESC);
+
+-- parties is managed outside this app; index it only where it exists with shop_name
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    ) AND EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'id'
+    ) THEN
+        CREATE INDEX IF NOT EXISTS idx_parties_shop_name_norm
+            ON parties (LOWER(TRIM(shop_name)), id DESC);
+    END IF;
+END $$;
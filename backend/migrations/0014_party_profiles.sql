@@ -0,0 +1,11 @@
+-- Party auto-fill data materialized per normalized party name (see party_profiles.py).
+-- Rows are written by challan/order saves; `python party_profiles.py backfill` fills history.
+CREATE TABLE IF NOT EXISTS party_profiles (
+    name_key TEXT PRIMARY KEY,
+    party_name TEXT NOT NULL,
+    station TEXT,
+    phone_number TEXT,
+    price_category TEXT,
+    transport_name TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,159 @@
+-- Dropdown dictionaries for /api/challan/options (see challan_options.py).
+-- One row per (option kind, normalized value) with a reference count over the
+-- challans / orders / parties rows that use it. Triggers keep the counts current on
+-- every write; rows whose count drops to 0 are kept (hidden) so `version` also moves
+-- when a value disappears. `version` is taken from challan_option_version_seq whenever
+-- a value becomes visible or hidden.
+CREATE SEQUENCE IF NOT EXISTS challan_option_version_seq;
+
+CREATE TABLE IF NOT EXISTS challan_option_values (
+    kind TEXT NOT NULL,
+    value_key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    refs INTEGER NOT NULL DEFAULT 0,
+    version BIGINT NOT NULL,
+    PRIMARY KEY (kind, value_key)
+);
+
+-- Dedupe key per kind: phones by digits, price categories exactly, names case-insensitively
+CREATE OR REPLACE FUNCTION challan_option_key(p_kind TEXT, p_value TEXT)
+RETURNS TEXT AS $$
+    SELECT CASE
+        WHEN p_value IS NULL OR TRIM(p_value) = '' THEN NULL
+        WHEN p_kind = 'customer_phones' THEN NULLIF(regexp_replace(p_value, '\D', '', 'g'), '')
+        WHEN p_kind = 'price_categories' THEN p_value
+        ELSE LOWER(TRIM(p_value))
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION adjust_challan_option(p_kind TEXT, p_value TEXT, p_delta INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_key TEXT := challan_option_key(p_kind, p_value);
+BEGIN
+    IF v_key IS NULL THEN
+        RETURN;
+    END IF;
+    IF p_delta > 0 THEN
+        INSERT INTO challan_option_values (kind, value_key, value, refs, version)
+        VALUES (
+            p_kind, v_key,
+            CASE WHEN p_kind = 'price_categories' THEN p_value ELSE TRIM(p_value) END,
+            p_delta, nextval('challan_option_version_seq')
+        )
+        ON CONFLICT (kind, value_key) DO UPDATE SET
+            refs = challan_option_values.refs + EXCLUDED.refs,
+            version = CASE
+                WHEN challan_option_values.refs <= 0 THEN EXCLUDED.version
+                ELSE challan_option_values.version
+            END;
+    ELSE
+        UPDATE challan_option_values SET
+            refs = GREATEST(refs + p_delta, 0),
+            version = CASE
+                WHEN refs > 0 AND refs + p_delta <= 0 THEN nextval('challan_option_version_seq')
+                ELSE version
+            END
+        WHERE kind = p_kind AND value_key = v_key;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger arguments are (kind, column) pairs; only columns that changed are adjusted
+CREATE OR REPLACE FUNCTION track_challan_options()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_row JSONB;
+    new_row JSONB;
+    i INTEGER := 0;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_row := to_jsonb(OLD);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_row := to_jsonb(NEW);
+    END IF;
+    WHILE i < TG_NARGS LOOP
+        IF TG_OP <> 'UPDATE'
+           OR (old_row ->> TG_ARGV[i + 1]) IS DISTINCT FROM (new_row ->> TG_ARGV[i + 1]) THEN
+            IF old_row IS NOT NULL THEN
+                PERFORM adjust_challan_option(TG_ARGV[i], old_row ->> TG_ARGV[i + 1], -1);
+            END IF;
+            IF new_row IS NOT NULL THEN
+                PERFORM adjust_challan_option(TG_ARGV[i], new_row ->> TG_ARGV[i + 1], 1);
+            END IF;
+        END IF;
+        i := i + 2;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_challans_options ON challans;
+CREATE TRIGGER trg_challans_options
+    AFTER INSERT OR DELETE OR UPDATE OF party_name, station_name, transport_name, price_category
+    ON challans
+    FOR EACH ROW EXECUTE FUNCTION track_challan_options(
+        'party_names', 'party_name',
+        'station_names', 'station_name',
+        'transport_names', 'transport_name',
+        'price_categories', 'price_category'
+    );
+
+DROP TRIGGER IF EXISTS trg_orders_options ON orders;
+CREATE TRIGGER trg_orders_options
+    AFTER INSERT OR DELETE OR UPDATE OF party_name, station, transport_name, customer_name, customer_phone
+    ON orders
+    FOR EACH ROW EXECUTE FUNCTION track_challan_options(
+        'party_names', 'party_name',
+        'station_names', 'station',
+        'transport_names', 'transport_name',
+        'customer_names', 'customer_name',
+        'customer_phones', 'customer_phone'
+    );
+
+-- parties is managed outside this app; track its shop names only where the column exists.
+-- Backfill only into an empty dictionary, so re-running this file never double counts.
+-- The triggers above lock challans/orders until commit, so no write is missed or counted twice.
+DO $$
+DECLARE
+    has_parties BOOLEAN := EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    );
+BEGIN
+    IF has_parties THEN
+        EXECUTE 'DROP TRIGGER IF EXISTS trg_parties_options ON parties';
+        EXECUTE $sql$
+            CREATE TRIGGER trg_parties_options
+                AFTER INSERT OR DELETE OR UPDATE OF shop_name ON parties
+                FOR EACH ROW EXECUTE FUNCTION track_challan_options('party_names', 'shop_name')
+        $sql$;
+    END IF;
+    IF EXISTS (SELECT 1 FROM challan_option_values) THEN
+        RETURN;
+    END IF;
+    EXECUTE format($sql$
+        INSERT INTO challan_option_values (kind, value_key, value, refs, version)
+        SELECT src.kind, k.value_key,
+               MIN(CASE WHEN src.kind = 'price_categories' THEN src.value ELSE TRIM(src.value) END),
+               COUNT(*), nextval('challan_option_version_seq')
+        FROM (
+            SELECT 'party_names', party_name::text FROM challans
+            UNION ALL SELECT 'station_names', station_name::text FROM challans
+            UNION ALL SELECT 'transport_names', transport_name::text FROM challans
+            UNION ALL SELECT 'price_categories', price_category::text FROM challans
+            UNION ALL SELECT 'party_names', party_name::text FROM orders
+            UNION ALL SELECT 'station_names', station::text FROM orders
+            UNION ALL SELECT 'transport_names', transport_name::text FROM orders
+            UNION ALL SELECT 'customer_names', customer_name::text FROM orders
+            UNION ALL SELECT 'customer_phones', customer_phone::text FROM orders
+            %s
+        ) AS src(kind, value)
+        CROSS JOIN LATERAL (SELECT challan_option_key(src.kind, src.value) AS value_key) AS k
+        WHERE k.value_key IS NOT NULL
+        GROUP BY src.kind, k.value_key
+    $sql$, CASE WHEN has_parties
+                THEN 'UNION ALL SELECT ''party_names'', shop_name::text FROM parties'
+                ELSE '' END);
+END $$;
@@ -0,0 +1,15 @@
+-- Trigram index for typeahead search over challan_option_values (see challan_options.py).
+-- pg_trgm may not be installable for this database role; searches still work without the
+-- index (a scan of the dictionary table), so a missing extension is only a notice.
+DO $$
+BEGIN
+    BEGIN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+    EXCEPTION WHEN insufficient_privilege OR undefined_file THEN
+        RAISE NOTICE 'pg_trgm is not available; option search runs without a trigram index';
+    END;
+    IF EXISTS (SELECT 1 FROM pg_opclass WHERE opcname = 'gin_trgm_ops') THEN
+        CREATE INDEX IF NOT EXISTS idx_challan_option_values_trgm
+            ON challan_option_values USING gin (value_key gin_trgm_ops);
+    END IF;
+END $$;
@@ -0,0 +1,96 @@
+-- Cross-worker cache invalidation (see cache_bus.py). Writes NOTIFY on the
+-- cache_invalidation channel with a JSON payload {"cache": ..., "key": ...}; a null key
+-- clears the whole cache. Notifications are delivered when the writing transaction
+-- commits, and identical ones within a transaction are sent once.
+
+-- Same normalization as party_profiles.party_name_key() (str.strip().lower())
+CREATE OR REPLACE FUNCTION cache_party_key(p_name TEXT)
+RETURNS TEXT AS $$
+    SELECT NULLIF(LOWER(regexp_replace(p_name, '^\s+|\s+$', '', 'g')), '')
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION notify_cache(p_cache TEXT, p_key TEXT DEFAULT NULL)
+RETURNS VOID AS $$
+    SELECT pg_notify('cache_invalidation', json_build_object('cache', p_cache, 'key', p_key)::text)
+$$ LANGUAGE sql;
+
+-- Row trigger: the party-data entries for the old and new party name (TG_ARGV[0] = column)
+CREATE OR REPLACE FUNCTION notify_party_cache()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_key TEXT;
+    new_key TEXT;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_key := cache_party_key(to_jsonb(OLD) ->> TG_ARGV[0]);
+        IF old_key IS NOT NULL THEN
+            PERFORM notify_cache('party_data', old_key);
+        END IF;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_key := cache_party_key(to_jsonb(NEW) ->> TG_ARGV[0]);
+        IF new_key IS NOT NULL AND new_key IS DISTINCT FROM old_key THEN
+            PERFORM notify_cache('party_data', new_key);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement trigger: clear a whole cache (TG_ARGV[0] = cache name)
+CREATE OR REPLACE FUNCTION notify_cache_clear()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM notify_cache(TG_ARGV[0]);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_challans_party_cache ON challans;
+CREATE TRIGGER trg_challans_party_cache
+    AFTER INSERT OR UPDATE OR DELETE ON challans
+    FOR EACH ROW EXECUTE FUNCTION notify_party_cache('party_name');
+
+DROP TRIGGER IF EXISTS trg_orders_party_cache ON orders;
+CREATE TRIGGER trg_orders_party_cache
+    AFTER INSERT OR UPDATE OR DELETE ON orders
+    FOR EACH ROW EXECUTE FUNCTION notify_party_cache('party_name');
+
+-- Challan lists show challan rows and their item counts
+DROP TRIGGER IF EXISTS trg_challans_list_cache ON challans;
+CREATE TRIGGER trg_challans_list_cache
+    AFTER INSERT OR UPDATE OR DELETE ON challans
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_clear('challans_list');
+
+DROP TRIGGER IF EXISTS trg_challan_items_list_cache ON challan_items;
+CREATE TRIGGER trg_challan_items_list_cache
+    AFTER INSERT OR UPDATE OR DELETE ON challan_items
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_clear('challans_list');
+
+-- Options only change when a dictionary value appears or disappears (version moves)
+DROP TRIGGER IF EXISTS trg_challan_option_values_cache_insert ON challan_option_values;
+CREATE TRIGGER trg_challan_option_values_cache_insert
+    AFTER INSERT ON challan_option_values
+    FOR EACH ROW EXECUTE FUNCTION notify_cache_clear('challan_options');
+
+DROP TRIGGER IF EXISTS trg_challan_option_values_cache_update ON challan_option_values;
+CREATE TRIGGER trg_challan_option_values_cache_update
+    AFTER UPDATE ON challan_option_values
+    FOR EACH ROW WHEN (OLD.version IS DISTINCT FROM NEW.version)
+    EXECUTE FUNCTION notify_cache_clear('challan_options');
+
+-- parties is managed outside this app; watch it only where shop_name exists
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    ) THEN
+        EXECUTE 'DROP TRIGGER IF EXISTS trg_parties_party_cache ON parties';
+        EXECUTE $sql$
+            CREATE TRIGGER trg_parties_party_cache
+                AFTER INSERT OR UPDATE OR DELETE ON parties
+                FOR EACH ROW EXECUTE FUNCTION notify_party_cache('shop_name')
+        $sql$;
+    END IF;
+END $$;
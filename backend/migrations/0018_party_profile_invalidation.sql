@@ -0,0 +1,45 @@
+-- Keep party_profiles from outliving the rows it was built from. Any update or delete
+-- of a party's challans/orders (or any change to parties) drops the stored profile for
+-- the old and new name; the party-data endpoint then resolves it live until the next
+-- challan/order save stores it again. App write paths call refresh_party_profile()
+-- after their write in the same transaction, so they re-store it immediately.
+CREATE OR REPLACE FUNCTION forget_party_profile()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM party_profiles WHERE name_key = cache_party_key(to_jsonb(OLD) ->> TG_ARGV[0]);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        DELETE FROM party_profiles WHERE name_key = cache_party_key(to_jsonb(NEW) ->> TG_ARGV[0]);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_challans_party_profile ON challans;
+CREATE TRIGGER trg_challans_party_profile
+    AFTER DELETE OR UPDATE OF party_name, station_name, transport_name, price_category, created_at
+    ON challans
+    FOR EACH ROW EXECUTE FUNCTION forget_party_profile('party_name');
+
+DROP TRIGGER IF EXISTS trg_orders_party_profile ON orders;
+CREATE TRIGGER trg_orders_party_profile
+    AFTER DELETE OR UPDATE OF party_name, station, transport_name, price_category, customer_phone, created_at
+    ON orders
+    FOR EACH ROW EXECUTE FUNCTION forget_party_profile('party_name');
+
+-- parties is managed outside this app (edited directly); watch it where shop_name exists
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    ) THEN
+        EXECUTE 'DROP TRIGGER IF EXISTS trg_parties_party_profile ON parties';
+        EXECUTE $sql$
+            CREATE TRIGGER trg_parties_party_profile
+                AFTER INSERT OR UPDATE OR DELETE ON parties
+                FOR EACH ROW EXECUTE FUNCTION forget_party_profile('shop_name')
+        $sql$;
+    END IF;
+END $$;
@@ -0,0 +1,196 @@
+-- Challan option dictionaries without per-write reference counting (see challan_options.py).
+-- 0015 upserted a shared (kind, value_key) row on every challan/order write, so concurrent
+-- writes using the same price category or station queued on that row lock until commit.
+-- Writes now only add values that are not listed yet (a plain index read otherwise), and
+-- values nobody uses any more are removed by recount_challan_options(), which the app
+-- runs periodically. `refs` is the usage count as of the last recount (1 for newer values).
+
+-- Single row: when the last recount ran, and the version it set when it removed values
+CREATE TABLE IF NOT EXISTS challan_option_recounts (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    recounted_at TIMESTAMP,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO challan_option_recounts (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION add_challan_option(p_kind TEXT, p_value TEXT)
+RETURNS VOID AS $$
+DECLARE
+    v_key TEXT := challan_option_key(p_kind, p_value);
+BEGIN
+    IF v_key IS NULL THEN
+        RETURN;
+    END IF;
+    -- Common case: already listed, nothing to write or lock
+    IF EXISTS (SELECT 1 FROM challan_option_values WHERE kind = p_kind AND value_key = v_key) THEN
+        RETURN;
+    END IF;
+    INSERT INTO challan_option_values (kind, value_key, value, refs, version)
+    VALUES (
+        p_kind, v_key,
+        CASE WHEN p_kind = 'price_categories' THEN p_value ELSE TRIM(p_value) END,
+        1, nextval('challan_option_version_seq')
+    )
+    ON CONFLICT (kind, value_key) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Trigger arguments are (kind, column) pairs; only new or changed values are added
+CREATE OR REPLACE FUNCTION track_challan_options()
+RETURNS TRIGGER AS $$
+DECLARE
+    old_row JSONB;
+    new_row JSONB := to_jsonb(NEW);
+    i INTEGER := 0;
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        old_row := to_jsonb(OLD);
+    END IF;
+    WHILE i < TG_NARGS LOOP
+        IF old_row IS NULL
+           OR (old_row ->> TG_ARGV[i + 1]) IS DISTINCT FROM (new_row ->> TG_ARGV[i + 1]) THEN
+            PERFORM add_challan_option(TG_ARGV[i], new_row ->> TG_ARGV[i + 1]);
+        END IF;
+        i := i + 2;
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_challans_options ON challans;
+CREATE TRIGGER trg_challans_options
+    AFTER INSERT OR UPDATE OF party_name, station_name, transport_name, price_category
+    ON challans
+    FOR EACH ROW EXECUTE FUNCTION track_challan_options(
+        'party_names', 'party_name',
+        'station_names', 'station_name',
+        'transport_names', 'transport_name',
+        'price_categories', 'price_category'
+    );
+
+DROP TRIGGER IF EXISTS trg_orders_options ON orders;
+CREATE TRIGGER trg_orders_options
+    AFTER INSERT OR UPDATE OF party_name, station, transport_name, customer_name, customer_phone
+    ON orders
+    FOR EACH ROW EXECUTE FUNCTION track_challan_options(
+        'party_names', 'party_name',
+        'station_names', 'station',
+        'transport_names', 'transport_name',
+        'customer_names', 'customer_name',
+        'customer_phones', 'customer_phone'
+    );
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    ) THEN
+        EXECUTE 'DROP TRIGGER IF EXISTS trg_parties_options ON parties';
+        EXECUTE $sql$
+            CREATE TRIGGER trg_parties_options
+                AFTER INSERT OR UPDATE OF shop_name ON parties
+                FOR EACH ROW EXECUTE FUNCTION track_challan_options('party_names', 'shop_name')
+        $sql$;
+    END IF;
+END $$;
+
+DROP FUNCTION IF EXISTS adjust_challan_option(TEXT, TEXT, INTEGER);
+
+-- Rebuild the dictionary from the source tables: add missing values, refresh usage
+-- counts and delete values no row uses. Skipped (returns -1) while another recount
+-- holds the lock or when the last one ran less than p_min_interval ago; otherwise
+-- returns the number of values added or removed. A value removed at the same moment a
+-- concurrent write first uses it again is re-added by the next write or recount.
+CREATE OR REPLACE FUNCTION recount_challan_options(p_min_interval INTERVAL DEFAULT INTERVAL '0')
+RETURNS INTEGER AS $$
+DECLARE
+    has_parties BOOLEAN := EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'parties' AND column_name = 'shop_name'
+    );
+    added INTEGER;
+    removed INTEGER;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(8250) THEN
+        RETURN -1;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM challan_option_recounts
+        WHERE recounted_at > CURRENT_TIMESTAMP - p_min_interval
+    ) THEN
+        RETURN -1;
+    END IF;
+
+    DROP TABLE IF EXISTS challan_option_counts;
+    CREATE TEMP TABLE challan_option_counts ON COMMIT DROP AS
+    SELECT src.kind, k.value_key,
+           MIN(CASE WHEN src.kind = 'price_categories' THEN src.value ELSE TRIM(src.value) END) AS value,
+           COUNT(*)::INTEGER AS refs
+    FROM (
+        SELECT 'party_names', party_name::text FROM challans
+        UNION ALL SELECT 'station_names', station_name::text FROM challans
+        UNION ALL SELECT 'transport_names', transport_name::text FROM challans
+        UNION ALL SELECT 'price_categories', price_category::text FROM challans
+        UNION ALL SELECT 'party_names', party_name::text FROM orders
+        UNION ALL SELECT 'station_names', station::text FROM orders
+        UNION ALL SELECT 'transport_names', transport_name::text FROM orders
+        UNION ALL SELECT 'customer_names', customer_name::text FROM orders
+        UNION ALL SELECT 'customer_phones', customer_phone::text FROM orders
+    ) AS src(kind, value)
+    CROSS JOIN LATERAL (SELECT challan_option_key(src.kind, src.value) AS value_key) AS k
+    WHERE k.value_key IS NOT NULL
+    GROUP BY src.kind, k.value_key;
+
+    IF has_parties THEN
+        EXECUTE $sql$
+            INSERT INTO challan_option_counts (kind, value_key, value, refs)
+            SELECT 'party_names', k.value_key, MIN(TRIM(p.shop_name)), COUNT(*)::INTEGER
+            FROM parties p
+            CROSS JOIN LATERAL (SELECT challan_option_key('party_names', p.shop_name) AS value_key) AS k
+            WHERE k.value_key IS NOT NULL
+            GROUP BY k.value_key
+        $sql$;
+    END IF;
+
+    UPDATE challan_option_values v
+    SET refs = c.total
+    FROM (
+        SELECT kind, value_key, SUM(refs)::INTEGER AS total
+        FROM challan_option_counts GROUP BY kind, value_key
+    ) c
+    WHERE v.kind = c.kind AND v.value_key = c.value_key AND v.refs <> c.total;
+
+    INSERT INTO challan_option_values (kind, value_key, value, refs, version)
+    SELECT kind, value_key, MIN(value), SUM(refs)::INTEGER, nextval('challan_option_version_seq')
+    FROM challan_option_counts c
+    WHERE NOT EXISTS (
+        SELECT 1 FROM challan_option_values v
+        WHERE v.kind = c.kind AND v.value_key = c.value_key
+    )
+    GROUP BY kind, value_key
+    ON CONFLICT (kind, value_key) DO NOTHING;
+    GET DIAGNOSTICS added = ROW_COUNT;
+
+    DELETE FROM challan_option_values v
+    WHERE NOT EXISTS (
+        SELECT 1 FROM challan_option_counts c
+        WHERE c.kind = v.kind AND c.value_key = v.value_key
+    );
+    GET DIAGNOSTICS removed = ROW_COUNT;
+
+    UPDATE challan_option_recounts SET
+        recounted_at = CURRENT_TIMESTAMP,
+        version = CASE WHEN removed > 0 THEN nextval('challan_option_version_seq') ELSE version END;
+    RETURN added + removed;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Removals also invalidate the options cache on every worker (see 0017)
+DROP TRIGGER IF EXISTS trg_challan_option_values_cache_delete ON challan_option_values;
+CREATE TRIGGER trg_challan_option_values_cache_delete
+    AFTER DELETE ON challan_option_values
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_clear('challan_options');
+
+-- Values hidden by the old reference counts are dropped now
+SELECT recount_challan_options();
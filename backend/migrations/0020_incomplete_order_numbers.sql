@@ -0,0 +1,6 @@
+-- Incomplete orders (placeholder rows without items: product_id IS NULL, total_price = 0)
+-- whose DJ- numbers create_order / create_order_with_multiple_items reuse. The lowest one
+-- is claimed with an index scan instead of a LIKE scan over all orders.
+CREATE INDEX IF NOT EXISTS idx_orders_incomplete_number
+    ON orders (order_number)
+    WHERE product_id IS NULL AND total_price = 0;
@@ -0,0 +1,22 @@
+-- Tombstones for hard-deleted product_catalog rows. Deleting one changes the qr_code and
+-- catalog sizes of the products_master entries linked to it, but 0011 only recorded
+-- products_master and product_sizes deletes, and the sizes removed by the FK cascade
+-- can no longer reach their master through the deleted row (product_id came out NULL).
+-- Record every products_master id linked by external_id (or by name when the catalog
+-- row has no external_id), so delta sync and the catalog index reload them.
+CREATE OR REPLACE FUNCTION record_catalog_row_deletion() RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO catalog_deletions (table_name, row_id, product_id)
+    SELECT TG_TABLE_NAME, OLD.id, pm.id
+    FROM products_master pm
+    WHERE pm.external_id = OLD.external_id
+       OR (OLD.external_id IS NULL AND pm.name = OLD.name);
+    RETURN OLD;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_product_catalog_deletions ON product_catalog;
+CREATE TRIGGER trg_product_catalog_deletions
+    AFTER DELETE ON product_catalog
+    FOR EACH ROW EXECUTE FUNCTION record_catalog_row_deletion();
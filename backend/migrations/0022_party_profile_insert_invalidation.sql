@@ -0,0 +1,15 @@
+-- 0018 dropped stored party profiles on challan/order updates and deletes only, so a row
+-- inserted outside create_challan/create_order (imports, SQL, benchmarks) left the
+-- party's profile stale. Inserts drop it too; the app's create paths re-store it with
+-- refresh_party_profile() in the same transaction.
+DROP TRIGGER IF EXISTS trg_challans_party_profile ON challans;
+CREATE TRIGGER trg_challans_party_profile
+    AFTER INSERT OR DELETE OR UPDATE OF party_name, station_name, transport_name, price_category, created_at
+    ON challans
+    FOR EACH ROW EXECUTE FUNCTION forget_party_profile('party_name');
+
+DROP TRIGGER IF EXISTS trg_orders_party_profile ON orders;
+CREATE TRIGGER trg_orders_party_profile
+    AFTER INSERT OR DELETE OR UPDATE OF party_name, station, transport_name, price_category, customer_phone, created_at
+    ON orders
+    FOR EACH ROW EXECUTE FUNCTION forget_party_profile('party_name');
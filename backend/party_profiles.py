@@ -0,0 +1,261 @@
+"""
+Party auto-fill profiles (station, phone, price category, transport).
+
+A profile merges the latest parties, challans and orders rows for a party name
+(parties first, then challans, then orders; phone from orders; a transport equal to
+the station is dropped). resolve_party_profile() computes it in one query;
+party_profiles stores the result keyed by the normalized name so the party-data
+endpoint is a primary-key lookup. Challan and order writes call
+refresh_party_profile() in their own transaction.
+
+Backfill existing history with:
+    python party_profiles.py backfill
+"""
+import argparse
+import sys
+
+import psycopg  # type: ignore
+from psycopg.rows import dict_row  # type: ignore
+
+from config import get_db_connection_params
+
+_PARTY_COLUMNS_SQL = """
+    SELECT column_name
+    FROM information_schema.columns
+    WHERE table_name = 'parties'
+    AND column_name IN ('id', 'shop_name', 'price_category', 'station', 'transport', 'transport_name')
+"""
+# Latest parties / challans / orders row for a party in one round trip. Matching on
+# LOWER(TRIM(name)) uses the expression indexes from migrations/0013.
+_PARTY_PROFILE_SQL = """
+    SELECT
+        {parties_fields},
+        c.station_name AS c_station,
+        c.transport_name AS c_transport,
+        c.price_category AS c_price_category,
+        o.station AS o_station,
+        o.transport_name AS o_transport,
+        o.price_category AS o_price_category,
+        o.customer_phone AS o_phone
+    FROM (SELECT 1) AS one
+    {parties_join}
+    LEFT JOIN LATERAL (
+        SELECT station_name, transport_name, price_category
+        FROM challans
+        WHERE LOWER(TRIM(party_name)) = LOWER(TRIM(%(party)s))
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) c ON true
+    LEFT JOIN LATERAL (
+        SELECT station, transport_name, price_category, customer_phone
+        FROM orders
+        WHERE LOWER(TRIM(party_name)) = LOWER(TRIM(%(party)s))
+        ORDER BY created_at DESC
+        LIMIT 1
+    ) o ON true
+"""
+_PARTIES_PROFILE_JOIN = """
+    LEFT JOIN LATERAL (
+        SELECT *
+        FROM parties
+        WHERE LOWER(TRIM(shop_name)) = LOWER(TRIM(%(party)s))
+        {order_by}
+        LIMIT 1
+    ) p ON true
+"""
+_PARTY_PROFILE_LOOKUP_SQL = """
+    SELECT station, phone_number, price_category, transport_name
+    FROM party_profiles
+    WHERE name_key = %s
+"""
+_PARTY_PROFILE_UPSERT_SQL = """
+    INSERT INTO party_profiles (name_key, party_name, station, phone_number, price_category, transport_name)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (name_key) DO UPDATE SET
+        party_name = EXCLUDED.party_name,
+        station = EXCLUDED.station,
+        phone_number = EXCLUDED.phone_number,
+        price_category = EXCLUDED.price_category,
+        transport_name = EXCLUDED.transport_name,
+        updated_at = CURRENT_TIMESTAMP
+"""
+# Every party name with history (parties is added when it has shop_name)
+_PARTY_NAMES_SQL = """
+    SELECT DISTINCT ON (LOWER(TRIM(name))) TRIM(name) AS name
+    FROM (
+        SELECT party_name AS name FROM challans
+        UNION ALL
+        SELECT party_name FROM orders
+        {parties}
+    ) names
+    WHERE name IS NOT NULL AND TRIM(name) <> ''
+    ORDER BY LOWER(TRIM(name))
+"""
+# Built on first use from the parties columns present in this database
+_party_profile_sql = None
+
+
+def empty_party_data() -> dict:
+    return {"station": None, "phone_number": None, "price_category": None, "transport_name": None}
+
+
+def _build_party_profile_sql(parties_col_names) -> str:
+    """
+    _PARTY_PROFILE_SQL for the parties columns that exist (the parties table is managed
+    outside this app and differs between deployments); parties is skipped without shop_name,
+    and the latest row (by id) is only preferred where an id column exists.
+    """
+    if 'shop_name' not in parties_col_names:
+        fields = "NULL AS p_station, NULL AS p_transport, NULL AS p_price_category"
+        return _PARTY_PROFILE_SQL.format(parties_fields=fields, parties_join="")
+    # Try both transport and transport_name
+    transport = next((col for col in ('transport', 'transport_name') if col in parties_col_names), None)
+    fields = ", ".join([
+        "p.station AS p_station" if 'station' in parties_col_names else "NULL AS p_station",
+        f"p.{transport} AS p_transport" if transport else "NULL AS p_transport",
+        "p.price_category AS p_price_category" if 'price_category' in parties_col_names else "NULL AS p_price_category",
+    ])
+    order_by = "ORDER BY id DESC" if 'id' in parties_col_names else ""
+    parties_join = _PARTIES_PROFILE_JOIN.format(order_by=order_by)
+    return _PARTY_PROFILE_SQL.format(parties_fields=fields, parties_join=parties_join)
+
+
+def _party_profile_from_row(row) -> dict:
+    """Merge the sources in precedence order: parties, then challans, then orders (+ phone)."""
+    response_data = empty_party_data()
+    if row:
+        merge_party_source(response_data, row["p_station"], row["p_transport"], row["p_price_category"])
+        merge_party_source(response_data, row["c_station"], row["c_transport"], row["c_price_category"])
+        merge_party_source(
+            response_data, row["o_station"], row["o_transport"], row["o_price_category"], phone=row["o_phone"],
+        )
+    return response_data
+
+
+def resolve_party_profile(cursor, party_trimmed: str) -> dict:
+    """Station, phone, price category and transport for a party in one query."""
+    global _party_profile_sql
+    if _party_profile_sql is None:
+        cursor.execute(_PARTY_COLUMNS_SQL)
+        _party_profile_sql = _build_party_profile_sql([row["column_name"] for row in cursor.fetchall()])
+    cursor.execute(_party_profile_sql, {"party": party_trimmed})
+    return _party_profile_from_row(cursor.fetchone())
+
+
+def valid_transport(transport, station):
+    """
+    Transport name to use, or None if empty.
+    CRITICAL: Never use station as transport_name - a transport equal to the station is dropped.
+    """
+    transport_str = str(transport).strip() if transport else ""
+    if not transport_str:
+        return None
+    if station and transport_str.lower() == str(station).strip().lower():
+        print(f"  WARNING: transport='{transport}' matches station='{station}' - setting transport_name to None")
+        return None
+    return transport_str
+
+
+def merge_party_source(response_data: dict, station, transport, price_category, phone=None):
+    """Fill fields still missing from one source (parties, then challans, then orders take priority)."""
+    if not response_data["station"]:
+        response_data["station"] = station or None
+    if not response_data["price_category"]:
+        response_data["price_category"] = price_category or None
+    if not response_data["transport_name"]:
+        response_data["transport_name"] = valid_transport(transport, station)
+    if phone:
+        response_data["phone_number"] = phone
+
+
+def party_name_key(party_name: str) -> str:
+    """party_profiles primary key: the trimmed, lower-cased party name."""
+    return party_name.strip().lower()
+
+
+async def resolve_party_profile_async(cursor, party_trimmed: str) -> dict:
+    """resolve_party_profile() on an async cursor."""
+    global _party_profile_sql
+    if _party_profile_sql is None:
+        await cursor.execute(_PARTY_COLUMNS_SQL)
+        _party_profile_sql = _build_party_profile_sql([row["column_name"] for row in await cursor.fetchall()])
+    await cursor.execute(_party_profile_sql, {"party": party_trimmed})
+    return _party_profile_from_row(await cursor.fetchone())
+
+
+def lookup_party_profile(cursor, party_trimmed: str):
+    """Stored profile for a party (primary-key read), or None if there is none."""
+    cursor.execute(_PARTY_PROFILE_LOOKUP_SQL, (party_name_key(party_trimmed),))
+    row = cursor.fetchone()
+    return dict(row) if row else None
+
+
+async def lookup_party_profile_async(cursor, party_trimmed: str):
+    """lookup_party_profile() on an async cursor."""
+    await cursor.execute(_PARTY_PROFILE_LOOKUP_SQL, (party_name_key(party_trimmed),))
+    row = await cursor.fetchone()
+    return dict(row) if row else None
+
+
+def save_party_profile(cursor, party_trimmed: str, profile: dict):
+    cursor.execute(_PARTY_PROFILE_UPSERT_SQL, (
+        party_name_key(party_trimmed), party_trimmed, profile["station"], profile["phone_number"],
+        profile["price_category"], profile["transport_name"],
+    ))
+
+
+def refresh_party_profile(cursor, party_name: str):
+    """
+    Recompute and store a party's profile inside the caller's transaction (call after
+    writing the challan/order, before commit). Runs in a savepoint: a failure is logged
+    and never aborts the caller's write. Returns the profile, or None.
+    """
+    party_trimmed = party_name.strip() if party_name else ""
+    if not party_trimmed:
+        return None
+    cursor.execute("SAVEPOINT party_profile")
+    try:
+        profile = resolve_party_profile(cursor, party_trimmed)
+        save_party_profile(cursor, party_trimmed, profile)
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT party_profile")
+        print(f"Warning: Could not refresh party profile for '{party_trimmed}': {e}")
+        return None
+    cursor.execute("RELEASE SAVEPOINT party_profile")
+    return profile
+
+
+def backfill_party_profiles(conn, batch_size: int = 500) -> int:
+    """Rebuild party_profiles for every party name in parties, challans and orders."""
+    with conn.cursor(row_factory=dict_row) as cursor:
+        cursor.execute(_PARTY_COLUMNS_SQL)
+        has_parties = "shop_name" in [row["column_name"] for row in cursor.fetchall()]
+        parties = "UNION ALL SELECT shop_name FROM parties" if has_parties else ""
+        cursor.execute(_PARTY_NAMES_SQL.format(parties=parties))
+        names = [row["name"] for row in cursor.fetchall()]
+        for count, name in enumerate(names, start=1):
+            save_party_profile(cursor, name, resolve_party_profile(cursor, name))
+            if count % batch_size == 0:
+                conn.commit()
+                print(f"  {count}/{len(names)} party profiles")
+    conn.commit()
+    print(f"Backfilled {len(names)} party profiles")
+    return len(names)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the party_profiles table")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    conn = psycopg.connect(**get_db_connection_params())
+    try:
+        backfill_party_profiles(conn, batch_size=args.batch_size)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
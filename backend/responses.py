@@ -0,0 +1,74 @@
+"""
+Fast JSON responses (opt-in with API_FAST_JSON=1).
+
+encode_json() turns Decimal, datetime/date and other values into JSON while encoding
+with orjson (in requirements.txt), so payloads don't need a jsonable_encoder pass
+first. Handlers return FastJSONResponse directly to skip FastAPI's own encoding of the
+returned value. Without orjson the stdlib json module is used (slower; main logs a
+warning at startup). Both write NaN/Infinity as null.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal
+import json
+import math
+
+from fastapi.responses import JSONResponse  # type: ignore
+
+try:
+    import orjson  # type: ignore
+except ModuleNotFoundError:
+    orjson = None  # type: ignore
+
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value) if value.is_finite() else None
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    return str(value)
+
+
+def _finite(value):
+    """content with NaN/Infinity floats replaced by None (as orjson writes them)."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, Decimal):
+        return float(value) if value.is_finite() else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _stdlib_dumps(content) -> bytes:
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def encode_json(content) -> bytes:
+    """Compact UTF-8 JSON for content (Decimal as float, dates as ISO strings, NaN as null)."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    try:
+        return _stdlib_dumps(content)
+    except ValueError:
+        # Out-of-range floats: write them as null like orjson instead of failing the
+        # response (rare, so the extra walk only happens here)
+        return _stdlib_dumps(_finite(content))
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return encode_json(content)
@@ -0,0 +1,80 @@
+"""
+Schema readiness registry.
+
+Each schema component (products, challans, orders, labels) registers the migration
+version it needs (see migrate.py). The first ensure() in a process reads
+schema_migrations once and caches the result, so request handlers only pay for a
+dict lookup. ensure() never runs DDL: migrations are applied at startup
+(DB_AUTO_MIGRATE) or with `python migrate.py`.
+"""
+import threading
+
+from migrate import schema_version, schema_version_async
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+class SchemaRegistry:
+    def __init__(self):
+        self._components = {}  # name -> migration version the component needs
+        self._db_version = None  # applied migration version seen by this process
+        self._lock = threading.Lock()
+
+    def register(self, name: str, version: int):
+        """Register a component that requires migrations up to `version`."""
+        self._components[name] = version
+
+    def is_current(self, name: str) -> bool:
+        return self._db_version is not None and self._db_version >= self._components[name]
+
+    def ensure(self, name: str, cursor) -> bool:
+        """
+        Check (read-only) that the database has the migrations this component needs.
+        Raises SchemaOutOfDateError if it does not. Returns True if the database was queried.
+        """
+        if self.is_current(name):
+            return False
+        with self._lock:
+            if self.is_current(name):
+                return False
+            self._verify(name, schema_version(cursor))
+            return True
+
+    async def ensure_async(self, name: str, cursor) -> bool:
+        """ensure() for an async cursor (the version query runs outside the lock)."""
+        if self.is_current(name):
+            return False
+        version = await schema_version_async(cursor)
+        with self._lock:
+            self._verify(name, version)
+        return True
+
+    def _verify(self, name: str, db_version: int):
+        """Record the database version and check it against the component (lock held)."""
+        self._db_version = db_version
+        required = self._components[name]
+        if self._db_version < required:
+            raise SchemaOutOfDateError(
+                f"Schema component '{name}' needs migration {required}, database is at "
+                f"{self._db_version}. Run: python migrate.py"
+            )
+        print(f"Schema verified at migration {self._db_version}")
+
+    def ensure_all(self, cursor):
+        """Verify every registered component (in registration order)."""
+        for name in list(self._components):
+            self.ensure(name, cursor)
+
+    def status(self) -> dict:
+        return {
+            "database_version": self._db_version,
+            "components": {
+                name: {"required": version, "current": self.is_current(name)}
+                for name, version in self._components.items()
+            },
+        }
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Backend modules are flat top-level modules (run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,170 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from caches import TTLCache, approximate_size
+
+_names = itertools.count()
+
+
+def make_cache(**kwargs):
+    # Caches register by name; keep each test's cache separate
+    kwargs.setdefault("max_bytes", 1024 * 1024)
+    return TTLCache(f"test_{next(_names)}", kwargs.pop("ttl", 60), **kwargs)
+
+
+def run_concurrently(count, target):
+    results, errors = [], []
+
+    def worker():
+        try:
+            results.append(target())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results, errors
+
+
+def test_concurrent_get_or_load_runs_loader_once():
+    cache = make_cache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(timeout=5)
+        return {"value": 42}
+
+    threading.Timer(0.2, release.set).start()
+    results, errors = run_concurrently(8, lambda: cache.get_or_load("key", load))
+
+    assert errors == []
+    assert len(calls) == 1
+    assert results == [{"value": 42}] * 8
+    status = cache.status()
+    assert status["loads"] == 1
+    assert status["coalesced"] == 7
+    # Cached afterwards
+    assert cache.get_or_load("key", load) == {"value": 42}
+    assert len(calls) == 1
+
+
+def test_loader_error_reaches_every_waiter():
+    cache = make_cache()
+    calls = []
+    release = threading.Event()
+
+    def load():
+        calls.append(1)
+        release.wait(timeout=5)
+        raise RuntimeError("database down")
+
+    threading.Timer(0.2, release.set).start()
+    results, errors = run_concurrently(5, lambda: cache.get_or_load("key", load))
+
+    assert results == []
+    assert len(calls) == 1
+    assert len(errors) == 5
+    assert all(isinstance(e, RuntimeError) and str(e) == "database down" for e in errors)
+    # Failures are not cached: the next call loads again
+    assert cache.get_or_load("key", lambda: "ok") == "ok"
+
+
+def test_async_loader_runs_once_and_error_reaches_waiters():
+    cache = make_cache()
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "value"
+
+    async def failing_load():
+        await asyncio.sleep(0.05)
+        raise ValueError("bad row")
+
+    async def main():
+        values = await asyncio.gather(*(cache.get_or_load_async("a", load) for _ in range(6)))
+        errors = await asyncio.gather(
+            *(cache.get_or_load_async("b", failing_load) for _ in range(3)),
+            return_exceptions=True,
+        )
+        return values, errors
+
+    values, errors = asyncio.run(main())
+    assert values == ["value"] * 6
+    assert len(calls) == 1
+    assert [type(e) for e in errors] == [ValueError] * 3
+
+
+def test_invalidation_during_load_is_not_cached():
+    cache = make_cache()
+
+    def load():
+        cache.invalidate("key")  # a write lands while the value is being read
+        return "stale"
+
+    assert cache.get_or_load("key", load) == "stale"
+    assert cache.get("key") is None
+
+
+def test_evicts_least_recently_used_beyond_max_entries():
+    cache = make_cache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "b" is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.status()["evictions"] == 1
+
+
+def test_evicts_beyond_max_bytes():
+    value = "x" * 1000
+    size = approximate_size(value)
+    cache = make_cache(max_bytes=size * 2 + size // 2)
+    cache.set("a", value)
+    cache.set("b", value)
+    cache.set("c", value)
+
+    status = cache.status()
+    assert status["entries"] == 2
+    assert status["bytes"] <= status["max_bytes"]
+    assert status["evictions"] == 1
+    assert cache.get("a") is None
+    assert cache.get("c") == value
+
+
+def test_value_larger_than_max_bytes_is_not_stored():
+    cache = make_cache(max_bytes=100)
+    cache.set("small", 1)
+    cache.set("big", "x" * 1000)
+
+    assert cache.get("big") is None
+    assert cache.get("small") == 1
+
+
+def test_expired_entries_are_reloaded():
+    cache = make_cache(ttl=0.05)
+    cache.set("key", "old")
+    time.sleep(0.1)
+
+    assert cache.get_or_load("key", lambda: "new") == "new"
+    assert cache.status()["expired"] == 1
+
+
+@pytest.mark.parametrize("ttl", [0, -1])
+def test_non_positive_ttl_disables_caching(ttl):
+    cache = make_cache(ttl=ttl)
+    cache.set("key", "value")
+    assert cache.get("key") is None
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+from catalog import CatalogSnapshot, decode_cursor, encode_cursor
+
+
+def make_snapshot(names):
+    """Snapshot of products 1..n with the given names (None = no name)."""
+    by_id = {
+        product_id: SimpleNamespace(
+            id=product_id, name=name, qr_code=None, external_id=None, category_id=1, type="master",
+        )
+        for product_id, name in enumerate(names, start=1)
+    }
+    return CatalogSnapshot(by_id, watermark=None, version=1, loaded_at=0.0)
+
+
+def walk(snapshot, limit, remove_after_first_page=None):
+    """Every id reached by following next cursors (decoded as the API does)."""
+    seen, after = [], None
+    while True:
+        entries, has_more = snapshot.page(limit, after=after)
+        seen.extend(entry.id for entry in entries)
+        if not has_more:
+            return seen
+        after = decode_cursor(encode_cursor(entries[-1]))
+        if remove_after_first_page is not None:
+            snapshot = remove_after_first_page(snapshot)
+            remove_after_first_page = None
+
+
+def test_listing_order_puts_unnamed_products_last():
+    snapshot = make_snapshot(["b", None, "B", "a", "", None, "a"])
+    assert snapshot.order == [5, 3, 4, 7, 1, 2, 6]
+    assert walk(snapshot, 2) == snapshot.order
+
+
+def test_pages_cover_every_product_once_when_cursor_row_is_gone():
+    names = ["Zed", None, "alpha", "Alpha", "émeraude", "beta", None, "Beta"]
+    snapshot = make_snapshot(names)
+    first_page = [entry.id for entry in snapshot.page(3)[0]]
+
+    def drop_last_of_first_page(current):
+        by_id = {pid: entry for pid, entry in current.by_id.items() if pid != first_page[-1]}
+        return CatalogSnapshot(by_id, watermark=None, version=2, loaded_at=0.0)
+
+    seen = walk(snapshot, 3, remove_after_first_page=drop_last_of_first_page)
+    assert sorted(seen) == list(range(1, len(names) + 1))
+    assert len(seen) == len(set(seen))
+
+
+def test_cursor_for_renamed_product_seeks_by_key():
+    snapshot = make_snapshot(["a", "c", "e", None])
+    # Product 2 was "b" when the cursor was issued and is "c" now: continue after "b"
+    entries, _ = snapshot.page(10, after=("b", 2))
+    assert [entry.id for entry in entries] == [2, 3, 4]
+    entries, _ = snapshot.page(10, after=(None, 4))
+    assert entries == []
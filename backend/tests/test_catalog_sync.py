@@ -0,0 +1,180 @@
+import base64
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+from types import SimpleNamespace
+
+from fastapi import HTTPException  # type: ignore
+import pytest
+
+import catalog_sync
+from catalog_sync import (
+    SYNC_OVERLAP,
+    TOMBSTONE_RETENTION,
+    catalog_changes,
+    decode_sync_token,
+    encode_sync_token,
+)
+
+NOW = datetime(2026, 3, 1, 12, 0, 0)
+
+
+class FakeCursor:
+    """Answers the queries catalog_changes() runs: the sync time and changed ids."""
+
+    def __init__(self, changed_ids=()):
+        self.changed_ids = list(changed_ids)
+        self.executed = []
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        if "LOCALTIMESTAMP AS synced_at" in sql:
+            self._rows = [{"synced_at": NOW}]
+        else:
+            self._rows = [{"id": product_id} for product_id in self.changed_ids]
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def fetchall(self):
+        return self._rows
+
+
+@pytest.fixture
+def entries(monkeypatch):
+    """Active products 1-3; records which ids load_entries() was asked for."""
+    active = {pid: SimpleNamespace(master={"id": pid}) for pid in (1, 2, 3)}
+    requested = []
+
+    def load_entries(cursor, product_ids=None):
+        requested.append(product_ids)
+        if product_ids is None:
+            return dict(active)
+        return {pid: active[pid] for pid in product_ids if pid in active}
+
+    monkeypatch.setattr(catalog_sync, "load_entries", load_entries)
+    return requested
+
+
+def test_token_round_trip():
+    assert decode_sync_token(encode_sync_token(NOW)) == NOW
+
+
+@pytest.mark.parametrize("token", [
+    "not base64 !!",
+    base64.urlsafe_b64encode(b"v2|2026-03-01T12:00:00").decode("ascii"),
+    base64.urlsafe_b64encode(b"v1|yesterday").decode("ascii"),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode("ascii"),
+])
+def test_malformed_tokens_raise_value_error(token):
+    with pytest.raises(ValueError, match="Invalid sync token"):
+        decode_sync_token(token)
+
+
+def test_without_token_returns_full_catalog(entries):
+    result = catalog_changes(FakeCursor(), None)
+
+    assert result["full"] is True
+    assert [p["id"] for p in result["products"]] == [1, 2, 3]
+    assert result["removed"] == []
+    assert decode_sync_token(result["token"]) == NOW
+    assert entries == [None]
+
+
+def test_expired_token_falls_back_to_full_catalog(entries):
+    since = NOW - TOMBSTONE_RETENTION - timedelta(seconds=1)
+    result = catalog_changes(FakeCursor(changed_ids=[2]), since)
+
+    assert result["full"] is True
+    assert [p["id"] for p in result["products"]] == [1, 2, 3]
+    assert entries == [None]
+
+
+def test_delta_returns_changed_and_removed_products(entries):
+    since = NOW - timedelta(minutes=10)
+    cursor = FakeCursor(changed_ids=[2, 7])  # 7 was deleted or deactivated
+    result = catalog_changes(cursor, since)
+
+    assert result["full"] is False
+    assert [p["id"] for p in result["products"]] == [2]
+    assert result["removed"] == [7]
+    assert decode_sync_token(result["token"]) == NOW
+    # Changes are read from slightly before the token time
+    assert cursor.executed[-1][1] == {"since": since - SYNC_OVERLAP}
+
+
+def test_delta_without_changes_skips_loading(entries):
+    result = catalog_changes(FakeCursor(), NOW - timedelta(minutes=1))
+
+    assert result == {"token": result["token"], "full": False, "products": [], "removed": []}
+    assert entries == []
+
+
+def test_endpoint_rejects_malformed_token():
+    import main
+
+    with pytest.raises(HTTPException) as exc_info:
+        main.get_products_master_changes(token="garbage")
+    assert exc_info.value.status_code == 400
+
+
+# Trigger tests run against a real database when TEST_DATABASE_URL is set; everything
+# is created in a scratch schema inside a transaction that is rolled back.
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+
+@pytest.fixture
+def scratch_cursor():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    import psycopg  # type: ignore
+    from psycopg.rows import dict_row  # type: ignore
+
+    with psycopg.connect(TEST_DATABASE_URL, row_factory=dict_row) as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("CREATE SCHEMA test_catalog_sync")
+                cursor.execute("SET LOCAL search_path TO test_catalog_sync")
+                cursor.execute("""
+                    CREATE TABLE products_master (
+                        id SERIAL PRIMARY KEY, external_id INTEGER, name TEXT,
+                        is_active BOOLEAN DEFAULT TRUE,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                    CREATE TABLE product_catalog (
+                        id SERIAL PRIMARY KEY, external_id INTEGER, name TEXT, qr_code TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                    CREATE TABLE product_sizes (
+                        id SERIAL PRIMARY KEY,
+                        product_id INTEGER REFERENCES product_catalog(id) ON DELETE CASCADE,
+                        product_type VARCHAR(20) DEFAULT 'catalog',
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    );
+                """)
+                for name in ("0011_catalog_sync.sql", "0021_catalog_row_deletions.sql"):
+                    cursor.execute((MIGRATIONS_DIR / name).read_text())
+                yield cursor
+        finally:
+            conn.rollback()
+
+
+def test_catalog_row_delete_appears_in_changes(scratch_cursor, monkeypatch):
+    cursor = scratch_cursor
+    cursor.execute("INSERT INTO products_master (external_id, name) VALUES (501, 'Ring') RETURNING id")
+    master_id = cursor.fetchone()["id"]
+    cursor.execute("INSERT INTO product_catalog (external_id, name) VALUES (501, 'Ring') RETURNING id")
+    catalog_id = cursor.fetchone()["id"]
+    cursor.execute("INSERT INTO product_sizes (product_id) VALUES (%s)", (catalog_id,))
+    cursor.execute("SELECT LOCALTIMESTAMP - INTERVAL '1 minute' AS since")
+    since = cursor.fetchone()["since"]
+
+    cursor.execute("DELETE FROM product_catalog WHERE id = %s", (catalog_id,))
+
+    # The master is not reloaded here; being touched is what the client needs to see
+    monkeypatch.setattr(catalog_sync, "load_entries", lambda cursor, product_ids=None: {})
+    result = catalog_changes(cursor, since)
+    assert result["full"] is False
+    assert master_id in result["removed"]
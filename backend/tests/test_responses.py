@@ -0,0 +1,30 @@
+from datetime import date, datetime
+from decimal import Decimal
+import json
+
+import pytest
+
+import responses
+from responses import encode_json
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "orjson":
+        if responses.orjson is None:
+            pytest.skip("orjson not installed")
+    else:
+        monkeypatch.setattr(responses, "orjson", None)
+    return request.param
+
+
+def test_encodes_decimals_and_dates(backend):
+    payload = {"price": Decimal("12.50"), "day": date(2026, 3, 1), "at": datetime(2026, 3, 1, 9, 30)}
+    assert json.loads(encode_json(payload)) == {
+        "price": 12.5, "day": "2026-03-01", "at": "2026-03-01T09:30:00",
+    }
+
+
+def test_non_finite_numbers_become_null(backend):
+    payload = {"prices": [float("nan"), 1.5, float("inf")], "rate": Decimal("NaN"), "name": "ñ"}
+    assert json.loads(encode_json(payload)) == {"prices": [None, 1.5, None], "rate": None, "name": "ñ"}